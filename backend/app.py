@@ -1,22 +1,39 @@
 import os
 import time
 import uuid
+import hashlib
+import hmac
+import tempfile
 from datetime import datetime
 from pathlib import Path
 import json
 import logging
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-
-from utils.uploader import process_pdf_upload
-from utils.retriever import retrieve_top_k, load_chunks
+from starlette.routing import Match
+
+from utils.uploader import process_pdf_upload, link_existing_upload
+from utils.catalog import get_catalog, build_document_record, backfill_documents
+from utils.vector_store import delete_collection
+from utils.lexical_index import invalidate as invalidate_lexical_index
+from utils.retriever import retrieve_top_k
+from utils.sharding import (
+    SHARD_KEY_HEADER, SHARD_URLS, shard_for, local_search, scatter_gather, forward_upload, forward_delete, forward_request,
+)
+from utils.artifacts import load_chunks, document_version, invalidate as invalidate_artifacts
 from utils.naming import get_artifact_paths, safe_pdf_name, get_all_related_paths
 from utils.llm import generate_answer
 from utils.summarizer import summarize_from_chunks
 from utils.citation_verifier import verify_citations
+from utils.admission import AdmissionController, KeyLimits, Rejected, admission_enabled, parse_api_keys
+from utils.deadline import budget_bucket, current_deadline, end_deadline, start_deadline
+from utils.singleflight import SingleFlight, request_key
+from utils.tracing import span, start_trace, end_trace, current_trace, observe_request, render_prometheus
 
 load_dotenv()
 
@@ -24,6 +41,11 @@ logger = logging.getLogger("secrag")
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 SECRAG_API_KEY = os.getenv("SECRAG_API_KEY", "").strip()
+API_KEYS = parse_api_keys(os.getenv("SECRAG_API_KEYS", ""), SECRAG_API_KEY)
+SHARD_KEY = os.getenv("SECRAG_SHARD_KEY", "").strip()
+ADMISSION = admission_enabled(bool(API_KEYS))
+admission = AdmissionController(API_KEYS)
+SERVER_TIMING = os.getenv("SECRAG_SERVER_TIMING", "").strip().lower() in {"1", "true", "yes"}
 
 app = FastAPI()
 
@@ -35,6 +57,8 @@ def _parse_origins(val: str | None):
 ALLOWED_ORIGINS = _parse_origins(os.getenv("ALLOWED_ORIGINS"))
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "25"))
 MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
 
 app.add_middleware(
     CORSMiddleware,
@@ -45,8 +69,22 @@ app.add_middleware(
 )
 
 BASE_DIR = Path(__file__).resolve().parent
-DATA_DIR = (BASE_DIR / ".." / "data").resolve()
+DATA_DIR = Path(os.getenv("SECRAG_DATA_DIR") or BASE_DIR / ".." / "data").resolve()
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+CHROMA_DIR = str(DATA_DIR / "chroma")
+backfill_documents(get_catalog(DATA_DIR), DATA_DIR)
+
+def _route_label(request: Request) -> str:
+    """Route template for metrics labels; raw paths would give every client-chosen URL its own series."""
+    route = request.scope.get("route")
+    if route is None:
+        # Requests answered by the middleware itself have not been routed yet.
+        for candidate in app.router.routes:
+            if candidate.matches(request.scope)[0] != Match.NONE:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
 
 @app.middleware("http")
 async def log_and_auth(request: Request, call_next):
@@ -55,11 +93,16 @@ async def log_and_auth(request: Request, call_next):
 
     path = request.url.path
 
-    if SECRAG_API_KEY:
+    key_limits = None
+    # A coordinator presenting the shard key is authenticated and was already admitted on its side.
+    shard_trusted = bool(SHARD_KEY) and hmac.compare_digest(
+        request.headers.get(SHARD_KEY_HEADER, "").encode(), SHARD_KEY.encode()
+    )
+    if API_KEYS and not shard_trusted:
         allowlist = {"/health", "/docs", "/openapi.json"}
         if path not in allowlist:
-            incoming = request.headers.get("X-API-KEY", "")
-            if incoming != SECRAG_API_KEY:
+            key_limits = admission.authenticate(request.headers.get("X-API-KEY", ""))
+            if key_limits is None:
                 elapsed = time.time() - start
                 logger.info(json.dumps({
                     "request_id": request_id,
@@ -71,32 +114,93 @@ async def log_and_auth(request: Request, call_next):
                 }))
                 raise HTTPException(status_code=401, detail="Unauthorized")
 
+    if path == "/upload" and request.method == "POST":
+        declared = request.headers.get("content-length", "")
+        if declared.isdigit() and int(declared) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+            observe_request(_route_label(request), 413, (time.time() - start) * 1000)
+            logger.info(json.dumps({
+                "request_id": request_id,
+                "method": request.method,
+                "path": path,
+                "status": 413,
+                "ms": int((time.time() - start) * 1000),
+                "msg": "upload too large",
+            }))
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Max allowed is {MAX_UPLOAD_MB} MB."},
+                headers={"X-Request-ID": request_id, "Connection": "close"},
+            )
+
+    trace, trace_token = start_trace()
+    ticket = None
     try:
+        if ADMISSION and request.method != "OPTIONS":
+            if shard_trusted:
+                identity = "shard-coordinator"
+            elif key_limits is not None:
+                identity = key_limits.name
+            else:
+                # Admission was enabled without API keys: each client address gets the default per-key limits.
+                identity = f"ip:{request.client.host if request.client else '-'}"
+            try:
+                with span("admission_wait"):
+                    ticket = await admission.admit(identity, key_limits or KeyLimits(identity), path, trusted=shard_trusted)
+            except Rejected as e:
+                elapsed = time.time() - start
+                observe_request(_route_label(request), e.status, elapsed * 1000)
+                logger.info(json.dumps({
+                    "request_id": request_id,
+                    "method": request.method,
+                    "path": path,
+                    "status": e.status,
+                    "ms": int(elapsed * 1000),
+                    "msg": e.reason,
+                    "client": identity,
+                }))
+                detail = "Rate limit exceeded" if e.status == 429 else "Server overloaded"
+                return JSONResponse(
+                    status_code=e.status,
+                    content={"detail": f"{detail} ({e.reason}), retry later."},
+                    headers={"Retry-After": str(e.retry_after), "X-Request-ID": request_id},
+                )
         response = await call_next(request)
         status = response.status_code
     except Exception as e:
         elapsed = time.time() - start
+        observe_request(_route_label(request), 500, elapsed * 1000)
         logger.info(json.dumps({
             "request_id": request_id,
             "method": request.method,
             "path": path,
             "status": 500,
             "ms": int(elapsed * 1000),
+            "spans": trace.totals(),
             "error": str(e),
         }))
         raise
+    finally:
+        if ticket is not None:
+            ticket.release()
+        end_trace(trace_token)
 
     elapsed = time.time() - start
+    observe_request(_route_label(request), status, elapsed * 1000)
     logger.info(json.dumps({
         "request_id": request_id,
         "method": request.method,
         "path": path,
         "status": status,
         "ms": int(elapsed * 1000),
+        "spans": trace.totals(),
     }))
 
     response.headers["X-Request-ID"] = request_id
     response.headers["X-Process-Time"] = f"{elapsed:.4f}"
+    if SERVER_TIMING:
+        timing = trace.server_timing()
+        total = f"total;dur={elapsed * 1000:.2f}"
+        response.headers["Server-Timing"] = f"{timing}, {total}" if timing else total
     return response
 
 def normalize_pdf_filename(name: str) -> str:
@@ -108,39 +212,63 @@ def normalize_pdf_filename(name: str) -> str:
     return name
 
 
-def safe_file_write(path: Path, data: bytes):
-    path.parent.mkdir(parents=True, exist_ok=True)
-    path.write_bytes(data)
+async def stream_upload_to_file(upload: UploadFile, dest: Path, max_bytes: int) -> tuple[str, int]:
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = await upload.read(UPLOAD_CHUNK_BYTES)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File too large. Max allowed is {MAX_UPLOAD_MB} MB."
+                    )
+                digest.update(block)
+                out.write(block)
+        os.replace(tmp_name, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+    return digest.hexdigest(), size
 
 
 def artifact_stats_for_pdf(pdf_name: str):
-    chunk_path, emb_path = get_artifact_paths(pdf_name, DATA_DIR)
-
-    if not chunk_path.exists() or not emb_path.exists():
-        raise HTTPException(status_code=404, detail="Artifacts not found. Upload PDF first.")
-
-    chunks = load_chunks(chunk_path)
-    emb_size = emb_path.stat().st_size
-    chunk_size = chunk_path.stat().st_size
+    catalog = get_catalog(DATA_DIR)
+    doc = catalog.get_document(pdf_name)
+    if doc is None:
+        if not all(p.exists() for p in get_artifact_paths(pdf_name, DATA_DIR)):
+            raise HTTPException(status_code=404, detail="Artifacts not found. Upload PDF first.")
+        doc = build_document_record(pdf_name, DATA_DIR)
+        catalog.upsert_document(doc)
 
-    last_ingested_ts = max(chunk_path.stat().st_mtime, emb_path.stat().st_mtime)
-    last_ingested = datetime.fromtimestamp(last_ingested_ts).isoformat()
-
-    import numpy as np
-    emb = np.load(emb_path)
-    dim = int(emb.shape[1]) if emb.ndim == 2 else 0
+    chunk_path, emb_path = get_artifact_paths(pdf_name, DATA_DIR)
+    sizes = {a["name"]: a["bytes"] for a in doc["artifacts"]}
 
     return {
         "filename": pdf_name,
-        "total_chunks": len(chunks),
-        "embedding_dim": dim,
+        "total_chunks": doc["total_chunks"],
+        "embedding_dim": doc["embedding_dim"],
         "artifacts": {
             "chunks_path": str(chunk_path),
-            "chunks_bytes": int(chunk_size),
+            "chunks_bytes": int(sizes.get(chunk_path.name, 0)),
             "embedding_path": str(emb_path),
-            "embedding_bytes": int(emb_size),
+            "embedding_bytes": int(sizes.get(emb_path.name, 0)),
+            "all": doc["artifacts"],
         },
-        "last_ingested": last_ingested,
+        "last_ingested": datetime.fromtimestamp(doc["ingested_at"]).isoformat(),
+        "sha256": doc.get("sha256"),
+        "chunk_strategy": doc.get("chunk_strategy"),
+        "total_pages": doc.get("total_pages"),
+        "ingestion_timings_ms": doc.get("timings_ms", {}),
     }
 
 
@@ -149,10 +277,32 @@ def health_check():
     return {"status": "SecRAG backend is running", "allowed_origins": ALLOWED_ORIGINS}
 
 
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/list_docs")
-def list_docs():
-    pdfs = [f.name for f in DATA_DIR.glob("*.pdf")]
-    return {"documents": pdfs}
+def list_docs(limit: int = 100, cursor: str | None = None):
+    if limit <= 0 or limit > 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    catalog = get_catalog(DATA_DIR)
+    docs, next_cursor = catalog.list_documents(limit=limit, after=cursor)
+    return {
+        "documents": [d["filename"] for d in docs],
+        "items": [
+            {
+                "filename": d["filename"],
+                "total_chunks": d["total_chunks"],
+                "chunk_strategy": d["chunk_strategy"],
+                "size_bytes": d["size_bytes"],
+                "ingested_at": d["ingested_at"],
+            }
+            for d in docs
+        ],
+        "total": catalog.count_documents(),
+        "next_cursor": next_cursor,
+    }
 
 
 @app.get("/stats")
@@ -161,26 +311,114 @@ def stats(filename: str):
     return artifact_stats_for_pdf(pdf_name)
 
 
+def register_document(pdf_path: Path, sha256: str, size: int, chunk_strategy: str, chunk_size: int, stats: dict):
+    trace = current_trace()
+    record = build_document_record(
+        pdf_path.name,
+        DATA_DIR,
+        total_chunks=stats.get("total_chunks_raw"),
+        embedding_dim=stats.get("embedding_dim"),
+        sha256=sha256,
+        chunk_strategy=chunk_strategy,
+        chunk_size=chunk_size,
+        total_characters=stats.get("total_characters"),
+        total_pages=stats.get("total_pages"),
+        size_bytes=size,
+        timings_ms=trace.totals() if trace is not None else {},
+        ingested_at=time.time(),
+    )
+    get_catalog(DATA_DIR).upsert_document(record)
+
+
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), chunk_strategy: str = "sentence"):
+async def upload_file(file: UploadFile = File(...), chunk_strategy: str = "sentence", chunk_size: int = 500):
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported.")
 
-    contents = await file.read()
-
-    if len(contents) > MAX_UPLOAD_BYTES:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Max allowed is {MAX_UPLOAD_MB} MB."
-        )
+    if SHARD_URLS:
+        return await _route_upload(file, chunk_strategy, chunk_size)
 
     pdf_path = DATA_DIR / file.filename
 
+    with span("receive_upload"):
+        sha256, size = await stream_upload_to_file(file, pdf_path, MAX_UPLOAD_BYTES)
+
+    catalog = get_catalog(DATA_DIR)
+    existing = catalog.find_ingestion(sha256, chunk_strategy, chunk_size)
+    if existing is not None and all(p.exists() for p in get_artifact_paths(existing["filename"], DATA_DIR)):
+        try:
+            with span("link_existing"):
+                await run_in_threadpool(link_existing_upload, existing["filename"], str(pdf_path), str(DATA_DIR))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Upload processing failed: {e}")
+        catalog.record_ingestion(sha256, chunk_strategy, chunk_size, pdf_path.name,
+                                 {**existing["stats"], "filename": pdf_path.name})
+        register_document(pdf_path, sha256, size, chunk_strategy, chunk_size, existing["stats"])
+        return {
+            **existing["stats"],
+            "filename": pdf_path.name,
+            "sha256": sha256,
+            "size_bytes": size,
+            "deduplicated": True,
+            "source_document": existing["filename"],
+        }
+
     try:
-        safe_file_write(pdf_path, contents)
-        return process_pdf_upload(str(pdf_path), str(DATA_DIR), chunk_strategy=chunk_strategy)
+        result = await run_in_threadpool(
+            process_pdf_upload, str(pdf_path), str(DATA_DIR), chunk_strategy=chunk_strategy, chunk_size=chunk_size
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload processing failed: {e}")
+    catalog.record_ingestion(sha256, chunk_strategy, chunk_size, pdf_path.name, result)
+    register_document(pdf_path, sha256, size, chunk_strategy, chunk_size, result)
+    return {**result, "sha256": sha256, "size_bytes": size, "deduplicated": False}
+
+
+async def _route_upload(file: UploadFile, chunk_strategy: str, chunk_size: int) -> dict:
+    shard = shard_for(file.filename)
+    staged = DATA_DIR / "forward" / f"{uuid.uuid4().hex}.pdf"
+    with span("receive_upload"):
+        await stream_upload_to_file(file, staged, MAX_UPLOAD_BYTES)
+    try:
+        with span("forward_upload"):
+            status, body = await run_in_threadpool(
+                forward_upload, shard, staged, file.filename,
+                {"chunk_strategy": chunk_strategy, "chunk_size": chunk_size},
+            )
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Shard {shard} unavailable: {e}")
+    finally:
+        staged.unlink(missing_ok=True)
+    if status != 200:
+        raise HTTPException(status_code=status, detail=body.get("detail", body))
+    return {**body, "shard": shard}
+
+
+def _route_to_owner(path: str, req: BaseModel) -> dict:
+    """On a coordinator, documents live on shards: run the request on the shard that owns the file."""
+    shard = shard_for(normalize_pdf_filename(req.filename))
+    try:
+        with span("forward_request"):
+            status, body = forward_request(shard, path, req.model_dump(exclude_none=True))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Shard {shard} unavailable: {e}")
+    if status != 200:
+        raise HTTPException(status_code=status, detail=body.get("detail", body))
+    return {**body, "shard": shard}
+
+
+class RetrievalFilters(BaseModel):
+    page_start: int | None = None
+    page_end: int | None = None
+    char_start: int | None = None
+    char_end: int | None = None
+    chunk_strategy: str | list[str] | None = None
+    created_after: str | float | None = None
+    created_before: str | float | None = None
+
+
+def _filter_spec(filters: RetrievalFilters | None) -> dict | None:
+    return filters.model_dump(exclude_none=True) if filters is not None else None
 
 
 class RetrieveRequest(BaseModel):
@@ -190,10 +428,19 @@ class RetrieveRequest(BaseModel):
     min_score: float | None = None
     mode: str = "hybrid"
     alpha: float = 0.7
+    filters: RetrievalFilters | None = None
+
+
+# Identical concurrent requests (same normalised parameters, same document version) share one computation.
+_retrieve_flight = SingleFlight("retrieve")
+_answer_flight = SingleFlight("answer")
+_summarize_flight = SingleFlight("summarize")
 
 
 @app.post("/retrieve")
 def retrieve(req: RetrieveRequest):
+    if SHARD_URLS:
+        return _route_to_owner("/retrieve", req)
     pdf_name = normalize_pdf_filename(req.filename)
 
     chunk_path, emb_path = get_artifact_paths(pdf_name, DATA_DIR)
@@ -204,15 +451,20 @@ def retrieve(req: RetrieveRequest):
         raise HTTPException(status_code=404, detail="Embedding file not found. Upload PDF first.")
 
     try:
-        results = retrieve_top_k(
+        key = request_key(
+            document_version(chunk_path, emb_path), filename=pdf_name, query=req.query, top_k=req.top_k,
+            min_score=req.min_score, mode=req.mode, alpha=req.alpha, filters=_filter_spec(req.filters),
+        )
+        results, _ = _retrieve_flight.do(key, lambda: retrieve_top_k(
             chunks_path=chunk_path,
             embeddings_path=emb_path,
             query=req.query,
             top_k=req.top_k,
             min_score=req.min_score,
             mode=req.mode,
-            alpha=req.alpha
-        )
+            alpha=req.alpha,
+            filters=_filter_spec(req.filters),
+        ))
         return {"filename": pdf_name, "query": req.query, "top_k": req.top_k, "mode": req.mode, "results": results}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -220,6 +472,83 @@ def retrieve(req: RetrieveRequest):
         raise HTTPException(status_code=500, detail=f"Retrieval failed: {e}")
 
 
+class SearchRequest(BaseModel):
+    query: str
+    filenames: list[str] | None = None
+    top_k: int = 5
+    mode: str = "hybrid"
+    alpha: float = 0.7
+    filters: RetrievalFilters | None = None
+    use_reranker: bool = True
+    timeout_ms: float | None = None
+
+
+@app.post("/search")
+def search(req: SearchRequest):
+    filenames = [normalize_pdf_filename(f) for f in req.filenames] if req.filenames else None
+    try:
+        if SHARD_URLS:
+            results, shards = scatter_gather(
+                query=req.query,
+                top_k=req.top_k,
+                mode=req.mode,
+                alpha=req.alpha,
+                filters=_filter_spec(req.filters),
+                filenames=filenames,
+                use_reranker=req.use_reranker,
+                timeout_ms=req.timeout_ms,
+            )
+        else:
+            with span("local_search"):
+                candidates = local_search(
+                    req.query, DATA_DIR, filenames, top_k=req.top_k * 4, mode=req.mode, alpha=req.alpha,
+                    filters=_filter_spec(req.filters),
+                )
+            results, shards = candidates[:req.top_k], {}
+            if req.use_reranker and candidates:
+                try:
+                    from utils.reranker import rerank
+                    with span("rerank"):
+                        results = rerank(req.query, candidates, top_k=req.top_k)
+                except Exception as e:
+                    logger.warning(f"Reranker failed ({e}), using fusion order")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+    if shards and not any(s["status"] == "ok" for s in shards.values()):
+        raise HTTPException(status_code=503, detail={"message": "No shard answered in time", "shards": shards})
+    return {
+        "query": req.query,
+        "top_k": req.top_k,
+        "mode": req.mode,
+        "results": results,
+        "partial": any(s["status"] != "ok" for s in shards.values()),
+        "shards": shards,
+    }
+
+
+class ShardSearchRequest(BaseModel):
+    query: str
+    filenames: list[str] | None = None
+    top_k: int = 20
+    mode: str = "hybrid"
+    alpha: float = 0.7
+    filters: dict | None = None
+
+
+@app.post("/shard/search")
+def shard_search(req: ShardSearchRequest):
+    try:
+        results = local_search(
+            req.query, DATA_DIR, req.filenames, top_k=req.top_k, mode=req.mode, alpha=req.alpha, filters=req.filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
+
+
 class AnswerRequest(BaseModel):
     filename: str
     query: str
@@ -227,10 +556,68 @@ class AnswerRequest(BaseModel):
     min_score: float | None = None
     mode: str = "hybrid"
     alpha: float = 0.7
+    filters: RetrievalFilters | None = None
+    deadline_ms: float | None = None
+
+
+def _answer(req: AnswerRequest, pdf_name: str) -> dict:
+    retrieved = retrieve_top_k(
+        query=req.query,
+        pdf_name=pdf_name,
+        chroma_dir=CHROMA_DIR,
+        top_k=req.top_k,
+        min_score=req.min_score,
+        mode=req.mode,
+        use_reranker=True,
+        filters=_filter_spec(req.filters),
+    )
+
+    # The leader's degradations travel with the shared result, since they shaped it.
+    deadline = current_deadline()
+    if not retrieved:
+        return {
+            "filename": pdf_name,
+            "query": req.query,
+            "answer": "No relevant context found.",
+            "citations": [],
+            "degraded": list(deadline.degraded) if deadline is not None else [],
+        }
+
+    context_stats: dict = {}
+    with span("generate_answer"):
+        answer_text = generate_answer(req.query, retrieved, context_stats=context_stats)
+
+    with span("verify_citations"):
+        verification = verify_citations(answer_text, retrieved)
+
+    return {
+        "filename": pdf_name,
+        "query": req.query,
+        "top_k": req.top_k,
+        "mode": req.mode,
+        "answer": answer_text,
+        "verified_answer": verification["verified_answer"],
+        "citation_accuracy": verification["citation_accuracy"],
+        "citation_details": verification["citations"],
+        "verified_citations": verification["verified_citations"],
+        "context": context_stats,
+        "degraded": list(deadline.degraded) if deadline is not None else [],
+        "citations": [
+            {
+                "chunk_id": c["chunk_id"],
+                "score": c["score"],
+                "char_range": [c["metadata"]["char_start"], c["metadata"]["char_end"]],
+                "page_range": [c["metadata"].get("page_start"), c["metadata"].get("page_end")],
+            }
+            for c in retrieved
+        ],
+    }
 
 
 @app.post("/answer")
 def answer(req: AnswerRequest):
+    if SHARD_URLS:
+        return _route_to_owner("/answer", req)
     pdf_name = normalize_pdf_filename(req.filename)
 
     chunk_path, emb_path = get_artifact_paths(pdf_name, DATA_DIR)
@@ -238,47 +625,32 @@ def answer(req: AnswerRequest):
     if not chunk_path.exists() or not emb_path.exists():
         raise HTTPException(status_code=404, detail="Artifacts not found. Upload PDF first.")
 
+    # Later stages' estimated cost is held back while earlier stages size their work.
+    deadline, token = start_deadline(req.deadline_ms, reserve=("generate", "verify_nli"))
     try:
-        retrieved = retrieve_top_k(
-            query=req.query,
-            pdf_name=pdf_name,
-            top_k=req.top_k,
-            min_score=req.min_score,
-            mode=req.mode,
-            use_reranker=True,
+        key = request_key(
+            document_version(chunk_path, emb_path), filename=pdf_name, query=req.query, top_k=req.top_k,
+            min_score=req.min_score, mode=req.mode, filters=_filter_spec(req.filters),
+            # The leader's deadline decides how much work is done, so only similar budgets share a result.
+            deadline=budget_bucket(deadline),
         )
-
-        if not retrieved:
-            return {"filename": pdf_name, "query": req.query, "answer": "No relevant context found.", "citations": []}
-
-        answer_text = generate_answer(req.query, retrieved)
-
-        from utils.citation_verifier import verify_citations
-        verification = verify_citations(answer_text, retrieved)
-
-        return {
-            "filename": pdf_name,
-            "query": req.query,
-            "top_k": req.top_k,
-            "mode": req.mode,
-            "answer": answer_text,
-            "verified_answer": verification["verified_answer"],
-            "citation_accuracy": verification["citation_accuracy"],
-            "citation_details": verification["citations"],
-            "citations": [
-                {
-                    "chunk_id": c["chunk_id"],
-                    "score": c["score"],
-                    "char_range": [c["metadata"]["char_start"], c["metadata"]["char_end"]],
-                }
-                for c in retrieved
-            ],
-        }
-
+        wait_s = max(0.0, deadline.remaining_ms() / 1000.0) if deadline is not None else None
+        result, coalesced = _answer_flight.do(key, lambda: _answer(req, pdf_name), timeout=wait_s)
+        response = {**result, "query": req.query}
+        if deadline is not None:
+            response["deadline_ms"] = deadline.budget_ms
+        if coalesced:
+            response["coalesced"] = True
+        return response
+
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e) or "Deadline exceeded")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        end_deadline(token)
 
 
 class SummarizeRequest(BaseModel):
@@ -289,10 +661,106 @@ class SummarizeRequest(BaseModel):
     min_score: float | None = None
     mode: str = "hybrid"
     alpha: float = 0.7
+    filters: RetrievalFilters | None = None
+
+
+def _summarize(req: SummarizeRequest, pdf_name: str, chunk_path: Path, emb_path: Path) -> dict:
+    all_chunks = load_chunks(chunk_path)
+    intro = all_chunks[: req.intro_chunks]
+
+    retrieved = retrieve_top_k(
+        chunks_path=chunk_path,
+        embeddings_path=emb_path,
+        query="Summarize this document.",
+        top_k=req.top_k,
+        min_score=req.min_score,
+        mode=req.mode,
+        alpha=req.alpha,
+        filters=_filter_spec(req.filters),
+    )
+
+    merged = {}
+
+    for c in intro:
+        cid = c.get("chunk_id")
+        if cid is None:
+            continue
+        merged[cid] = {
+            "chunk_id": cid,
+            "content": c.get("content", ""),
+            "score": 0.0,
+            "metadata": {"char_start": c.get("char_start"), "char_end": c.get("char_end")},
+            "source": "intro"
+        }
+
+    for r in retrieved:
+        cid = r.get("chunk_id")
+        if cid is None:
+            continue
+        score = float(r.get("score", 0.0))
+        if cid in merged:
+            if score > float(merged[cid].get("score", 0.0)):
+                merged[cid]["score"] = score
+            merged[cid]["source"] = "hybrid"
+        else:
+            merged[cid] = {
+                "chunk_id": cid,
+                "content": r.get("content", ""),
+                "score": score,
+                "metadata": {
+                    "char_start": r.get("metadata", {}).get("char_start"),
+                    "char_end": r.get("metadata", {}).get("char_end"),
+                },
+                "source": "retrieved"
+            }
+
+    intro_ids = [c.get("chunk_id") for c in intro if c.get("chunk_id") is not None]
+    retrieved_ids_sorted = sorted(
+        [cid for cid in merged.keys() if cid not in intro_ids],
+        key=lambda cid: float(merged[cid].get("score", 0.0)),
+        reverse=True
+    )
+
+    final_ids = intro_ids + retrieved_ids_sorted
+    final_chunks = [merged[cid] for cid in final_ids if cid in merged]
+
+    if not final_chunks:
+        return {"filename": pdf_name, "summary": "I do not know.", "citations": []}
+
+    context_stats: dict = {}
+    with span("summarize"):
+        summary_text = summarize_from_chunks(
+            filename=pdf_name,
+            chunks=final_chunks,
+            max_output_tokens=req.max_output_tokens,
+            context_stats=context_stats,
+        )
+
+    citations = [
+        {
+            "chunk_id": c["chunk_id"],
+            "score": c.get("score", 0.0),
+            "source": c.get("source", ""),
+            "char_range": [c.get("metadata", {}).get("char_start"), c.get("metadata", {}).get("char_end")],
+        }
+        for c in final_chunks
+    ]
+
+    return {
+        "filename": pdf_name,
+        "intro_chunks": req.intro_chunks,
+        "top_k": req.top_k,
+        "mode": req.mode,
+        "summary": summary_text,
+        "citations": citations,
+        "context": context_stats,
+    }
 
 
 @app.post("/summarize")
 def summarize(req: SummarizeRequest):
+    if SHARD_URLS:
+        return _route_to_owner("/summarize", req)
     pdf_name = normalize_pdf_filename(req.filename)
 
     if req.intro_chunks <= 0 or req.intro_chunks > 10:
@@ -306,91 +774,13 @@ def summarize(req: SummarizeRequest):
         raise HTTPException(status_code=404, detail="Artifacts not found. Upload PDF first.")
 
     try:
-        all_chunks = load_chunks(chunk_path)
-        intro = all_chunks[: req.intro_chunks]
-
-        retrieved = retrieve_top_k(
-            chunks_path=chunk_path,
-            embeddings_path=emb_path,
-            query="Summarize this document.",
-            top_k=req.top_k,
-            min_score=req.min_score,
-            mode=req.mode,
-            alpha=req.alpha
+        key = request_key(
+            document_version(chunk_path, emb_path), filename=pdf_name, intro_chunks=req.intro_chunks,
+            top_k=req.top_k, max_output_tokens=req.max_output_tokens, min_score=req.min_score,
+            mode=req.mode, alpha=req.alpha, filters=_filter_spec(req.filters),
         )
-
-        merged = {}
-
-        for c in intro:
-            cid = c.get("chunk_id")
-            if cid is None:
-                continue
-            merged[cid] = {
-                "chunk_id": cid,
-                "content": c.get("content", ""),
-                "score": 0.0,
-                "metadata": {"char_start": c.get("char_start"), "char_end": c.get("char_end")},
-                "source": "intro"
-            }
-
-        for r in retrieved:
-            cid = r.get("chunk_id")
-            if cid is None:
-                continue
-            score = float(r.get("score", 0.0))
-            if cid in merged:
-                if score > float(merged[cid].get("score", 0.0)):
-                    merged[cid]["score"] = score
-                merged[cid]["source"] = "hybrid"
-            else:
-                merged[cid] = {
-                    "chunk_id": cid,
-                    "content": r.get("content", ""),
-                    "score": score,
-                    "metadata": {
-                        "char_start": r.get("metadata", {}).get("char_start"),
-                        "char_end": r.get("metadata", {}).get("char_end"),
-                    },
-                    "source": "retrieved"
-                }
-
-        intro_ids = [c.get("chunk_id") for c in intro if c.get("chunk_id") is not None]
-        retrieved_ids_sorted = sorted(
-            [cid for cid in merged.keys() if cid not in intro_ids],
-            key=lambda cid: float(merged[cid].get("score", 0.0)),
-            reverse=True
-        )
-
-        final_ids = intro_ids + retrieved_ids_sorted
-        final_chunks = [merged[cid] for cid in final_ids if cid in merged]
-
-        if not final_chunks:
-            return {"filename": pdf_name, "summary": "I do not know.", "citations": []}
-
-        summary_text = summarize_from_chunks(
-            filename=pdf_name,
-            chunks=final_chunks,
-            max_output_tokens=req.max_output_tokens
-        )
-
-        citations = [
-            {
-                "chunk_id": c["chunk_id"],
-                "score": c.get("score", 0.0),
-                "source": c.get("source", ""),
-                "char_range": [c.get("metadata", {}).get("char_start"), c.get("metadata", {}).get("char_end")],
-            }
-            for c in final_chunks
-        ]
-
-        return {
-            "filename": pdf_name,
-            "intro_chunks": req.intro_chunks,
-            "top_k": req.top_k,
-            "mode": req.mode,
-            "summary": summary_text,
-            "citations": citations
-        }
+        result, _ = _summarize_flight.do(key, lambda: _summarize(req, pdf_name, chunk_path, emb_path))
+        return result
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -401,7 +791,26 @@ def summarize(req: SummarizeRequest):
 def delete_document(filename: str):
     pdf_name = safe_pdf_name(filename)
 
-    paths = get_all_related_paths(pdf_name, DATA_DIR)
+    if SHARD_URLS:
+        shard = shard_for(pdf_name)
+        try:
+            status, body = forward_delete(shard, pdf_name)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Shard {shard} unavailable: {e}")
+        if status != 200:
+            raise HTTPException(status_code=status, detail=body.get("detail", body))
+        return {**body, "shard": shard}
+
+    doc = get_catalog(DATA_DIR).delete_document(pdf_name)
+    if doc is not None:
+        paths = [DATA_DIR / pdf_name] + [Path(a["path"]) for a in doc["artifacts"] if a["name"] != pdf_name]
+    else:
+        paths = get_all_related_paths(pdf_name, DATA_DIR)
+    # Files the catalog does not list (e.g. an index built by an older version) are removed too.
+    paths += [p for p in get_all_related_paths(pdf_name, DATA_DIR) if p not in paths and p.exists()]
+    invalidate_artifacts(get_artifact_paths(pdf_name, DATA_DIR)[0])
+    delete_collection(pdf_name, persist_dir=CHROMA_DIR)
+    invalidate_lexical_index(pdf_name, CHROMA_DIR)
 
     deleted = []
     missing = []
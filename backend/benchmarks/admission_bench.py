@@ -0,0 +1,162 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.admission import AdmissionController, KeyLimits, Rejected
+from utils.retrieval_metrics import latency_summary
+
+# Simulated service time (ms) per lane, drawn uniformly from this range.
+SERVICE_MS = {"cheap": (5.0, 20.0), "expensive": (150.0, 400.0)}
+PATHS = {"cheap": "/retrieve", "expensive": "/answer"}
+
+
+class Client:
+    def __init__(self, name: str, rate: float, expensive_share: float):
+        self.name = name
+        self.rate = rate
+        self.expensive_share = expensive_share
+        self.admitted: list[float] = []
+        self.rejected: list[float] = []
+        self.status: dict[str, int] = {}
+
+
+async def one_request(controller: AdmissionController, client: Client, limits: KeyLimits,
+                      lane: str, rng: random.Random):
+    t0 = time.perf_counter()
+    try:
+        ticket = await controller.admit(client.name, limits, PATHS[lane])
+    except Rejected as e:
+        client.rejected.append((time.perf_counter() - t0) * 1000.0)
+        key = f"{e.status}_{e.reason}"
+        client.status[key] = client.status.get(key, 0) + 1
+        return
+    try:
+        await asyncio.sleep(rng.uniform(*SERVICE_MS[lane]) / 1000.0)
+    finally:
+        ticket.release()
+    client.admitted.append((time.perf_counter() - t0) * 1000.0)
+    client.status["200"] = client.status.get("200", 0) + 1
+
+
+async def drive(controller: AdmissionController, client: Client, limits: KeyLimits,
+                duration_s: float, seed: int):
+    """Open-loop Poisson arrivals: requests are sent on schedule whether or not earlier ones finished."""
+    rng = random.Random(seed)
+    tasks = []
+    end = time.perf_counter() + duration_s
+    while time.perf_counter() < end:
+        lane = "expensive" if rng.random() < client.expensive_share else "cheap"
+        tasks.append(asyncio.ensure_future(one_request(controller, client, limits, lane, rng)))
+        await asyncio.sleep(rng.expovariate(client.rate))
+    await asyncio.gather(*tasks)
+
+
+def summarize(client: Client) -> dict:
+    total = len(client.admitted) + len(client.rejected)
+    return {
+        "requests": total,
+        "offered_rps": client.rate,
+        "success_rate": round(len(client.admitted) / max(1, total), 4),
+        "status": dict(sorted(client.status.items())),
+        "admitted_ms": latency_summary(client.admitted),
+        "rejected_ms": latency_summary(client.rejected),
+    }
+
+
+def scenarios(args) -> dict[str, list[Client]]:
+    return {
+        # One key far over its rate next to well-behaved keys: only the noisy key should be limited.
+        "noisy_key": [Client("noisy", args.key_rate * args.overload, args.expensive_share)]
+        + [Client(f"good{i}", args.good_rps, args.expensive_share) for i in range(args.good_keys)],
+        # Many keys, each within its rate, together exceeding the expensive lane's capacity: the
+        # excess is shed with 503s while cheap traffic in its own lane is unaffected.
+        "lane_overload": [Client(f"bulk{i}", args.bulk_rps, 1.0) for i in range(args.bulk_keys)]
+        + [Client("interactive", args.good_rps, 0.0)],
+    }
+
+
+async def run(args, clients: list[Client]) -> dict:
+    keys = {c.name: KeyLimits(c.name, args.key_rate, args.key_burst, args.key_concurrency) for c in clients}
+    controller = AdmissionController(
+        keys,
+        cheap=(args.cheap_concurrency, args.cheap_queue),
+        expensive=(args.expensive_concurrency, args.expensive_queue),
+        queue_timeout_ms=args.queue_timeout_ms,
+    )
+    await asyncio.gather(*(
+        drive(controller, c, keys[c.name], args.duration, seed=args.seed + i)
+        for i, c in enumerate(clients)
+    ))
+    return {c.name: summarize(c) for c in clients}
+
+
+def check(name: str, clients: dict, args) -> list[str]:
+    failures = []
+    max_reject_ms = args.max_reject_ms or args.queue_timeout_ms * 1.1
+    # Anything admitted waited at most the queue timeout before it ran.
+    max_admitted_ms = args.queue_timeout_ms + SERVICE_MS["expensive"][1] * 1.5
+    for client, c in clients.items():
+        if c["rejected_ms"]["count"] and c["rejected_ms"]["p99_ms"] > max_reject_ms:
+            failures.append(f"{name}/{client} rejection p99 {c['rejected_ms']['p99_ms']:.1f} ms > {max_reject_ms:.1f} ms")
+        if c["admitted_ms"]["count"] and c["admitted_ms"]["p99_ms"] > max_admitted_ms:
+            failures.append(f"{name}/{client} admitted p99 {c['admitted_ms']['p99_ms']:.1f} ms > {max_admitted_ms:.1f} ms")
+    protected = [k for k in clients if k.startswith("good") or k == "interactive"]
+    for client in protected:
+        if clients[client]["success_rate"] < args.min_good_success:
+            failures.append(f"{name}/{client} success {clients[client]['success_rate']:.4f} < {args.min_good_success}")
+    shed = [k for k in clients if k not in protected]
+    if not any(clients[k]["success_rate"] < 1.0 for k in shed):
+        failures.append(f"{name}: overload was never shed")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Synthetic overload against the admission controller: a key over its rate, then a saturated expensive lane."
+    )
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--good-keys", type=int, default=3)
+    parser.add_argument("--good-rps", type=float, default=4.0, help="Offered load per well-behaved key.")
+    parser.add_argument("--overload", type=float, default=10.0, help="Noisy key's offered load as a multiple of its rate.")
+    parser.add_argument("--expensive-share", type=float, default=0.3)
+    parser.add_argument("--bulk-keys", type=int, default=12)
+    parser.add_argument("--bulk-rps", type=float, default=3.0,
+                        help="Expensive-only load per key in the lane_overload scenario.")
+    parser.add_argument("--key-rate", type=float, default=20.0)
+    parser.add_argument("--key-burst", type=float, default=40.0)
+    parser.add_argument("--key-concurrency", type=int, default=16)
+    parser.add_argument("--cheap-concurrency", type=int, default=64)
+    parser.add_argument("--cheap-queue", type=int, default=256)
+    parser.add_argument("--expensive-concurrency", type=int, default=8)
+    parser.add_argument("--expensive-queue", type=int, default=16)
+    parser.add_argument("--queue-timeout-ms", type=float, default=2000.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--min-good-success", type=float, default=0.95,
+                        help="Fail if a well-behaved or cheap-lane key sees fewer successful requests.")
+    parser.add_argument("--max-reject-ms", type=float, default=None,
+                        help="Fail if rejections p99 exceeds this (default: the queue timeout plus 10%%).")
+    args = parser.parse_args()
+
+    report = {"duration_s": args.duration, "scenarios": {}}
+    failures = []
+    for name, clients in scenarios(args).items():
+        offered = sum(c.rate for c in clients)
+        print(f"{name}: {len(clients)} keys, {offered:.0f} rps offered for {args.duration:.0f}s", file=sys.stderr)
+        result = asyncio.run(run(args, clients))
+        report["scenarios"][name] = result
+        failures += check(name, result, args)
+    print(json.dumps(report, indent=2))
+    for f in failures:
+        print(f"FAIL: {f}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
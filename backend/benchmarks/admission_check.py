@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import admission as adm
+from utils.admission import AdmissionController, KeyLimits, Lane, Rejected, TokenBucket
+
+
+class Clock:
+    """Stands in for utils.admission's clock, so bucket refills depend only on `advance`.
+
+    Only that module's `time` is replaced; the event loop keeps the real
+    clock, so queue timeouts still fire.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+async def _rejection(coro) -> Rejected | None:
+    try:
+        await coro
+    except Rejected as e:
+        return e
+    return None
+
+
+def _expect(failures: list[str], name: str, ok: bool, detail):
+    if not ok:
+        failures.append(f"{name}: {detail}")
+
+
+def check_bucket(clock: Clock, failures: list[str]) -> dict:
+    bucket = TokenBucket(rate=2.0, burst=4.0)
+    waits = [bucket.take(1.0) for _ in range(5)]
+    _expect(failures, "bucket_burst", waits[:4] == [0.0] * 4 and abs(waits[4] - 0.5) < 1e-9, waits)
+    clock.advance(0.5)
+    refilled = bucket.take(1.0)
+    _expect(failures, "bucket_refill", refilled == 0.0, refilled)
+    # A cost above the burst is capped, so it waits for a full bucket instead of forever.
+    oversized = bucket.take(100.0)
+    _expect(failures, "bucket_cost_capped", abs(oversized - 2.0) < 1e-9, oversized)
+    stopped = TokenBucket(rate=0.0, burst=1.0)
+    stopped.take(1.0)
+    _expect(failures, "bucket_zero_rate", stopped.take(1.0) == 60.0, "expected a 60 s retry")
+    return {"waits_s": waits, "after_refill_s": refilled, "oversized_s": oversized}
+
+
+async def check_key_limits(clock: Clock, failures: list[str]) -> dict:
+    controller = AdmissionController(cheap=(8, 8), expensive=(8, 8), queue_timeout_ms=50)
+    limits = KeyLimits("k", rate=1.0, burst=5.0, concurrency=2)
+
+    first = await controller.admit("k", limits, "/answer")
+    rate = await _rejection(controller.admit("k", limits, "/retrieve"))
+    _expect(failures, "rate_limited", rate is not None and (rate.status, rate.reason) == (429, "rate_limited"), rate)
+    # Five tokens went on /answer; one more arrives after a second, so Retry-After rounds up to 1.
+    _expect(failures, "rate_limited_retry_after", rate is not None and rate.retry_after == 1, rate and rate.retry_after)
+
+    clock.advance(10.0)
+    second = await controller.admit("k", limits, "/retrieve")
+    busy = await _rejection(controller.admit("k", limits, "/retrieve"))
+    _expect(failures, "concurrency_limited",
+            busy is not None and (busy.status, busy.reason) == (429, "concurrency_limited"), busy)
+    first.release()
+    second.release()
+    _expect(failures, "in_flight_released", not controller._in_flight, controller._in_flight)
+    _expect(failures, "exempt_path", await controller.admit("k", limits, "/health") is None, "ticket for /health")
+    _expect(failures, "shard_lane", controller.lane_for("/shard/search") == "cheap", controller.lane_for("/shard/search"))
+
+    # Trusted coordinator traffic skips the bucket and the per-key cap, but still holds a lane slot.
+    tight = KeyLimits("coordinator", rate=0.0, burst=0.0, concurrency=0)
+    trusted = [await controller.admit("coordinator", tight, "/shard/search", trusted=True) for _ in range(3)]
+    _expect(failures, "trusted_lane_slots", controller.lanes["cheap"].active == 3, controller.snapshot())
+    for t in trusted:
+        t.release()
+    _expect(failures, "trusted_released", controller.lanes["cheap"].active == 0, controller.snapshot())
+    return {
+        "rate_limited": {"status": rate and rate.status, "retry_after": rate and rate.retry_after},
+        "concurrency_limited": {"status": busy and busy.status, "retry_after": busy and busy.retry_after},
+    }
+
+
+async def check_lane(failures: list[str]) -> dict:
+    lane = Lane("expensive", concurrency=1, max_queue=1, timeout_ms=50)
+    lane.service_s = 0.8
+    await lane.acquire()
+    waiter = asyncio.ensure_future(lane.acquire())
+    await asyncio.sleep(0)
+    full = await _rejection(lane.acquire())
+    _expect(failures, "queue_full", full is not None and (full.status, full.reason) == (503, "queue_full"), full)
+    # One waiter ahead on one slot: 0.8 s x 2 / 1, rounded up.
+    _expect(failures, "queue_full_retry_after", full is not None and full.retry_after == 2, full and full.retry_after)
+
+    timed_out = await _rejection(waiter)
+    _expect(failures, "queue_timeout",
+            timed_out is not None and (timed_out.status, timed_out.reason) == (503, "queue_timeout"), timed_out)
+    _expect(failures, "queue_timeout_discarded", not lane.waiters and lane.active == 1,
+            {"active": lane.active, "queued": len(lane.waiters)})
+    lane.release()
+    _expect(failures, "slot_freed", lane.active == 0, lane.active)
+
+    # A waiter cancelled in the queue leaves it without taking the slot.
+    await lane.acquire()
+    waiter = asyncio.ensure_future(lane.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+    _expect(failures, "cancelled_waiter_discarded", not lane.waiters and lane.active == 1,
+            {"active": lane.active, "queued": len(lane.waiters)})
+    lane.release()
+    _expect(failures, "cancelled_waiter_slot", lane.active == 0, lane.active)
+    return {"queue_full": {"status": full and full.status, "retry_after": full and full.retry_after},
+            "queue_timeout": {"status": timed_out and timed_out.status,
+                              "retry_after": timed_out and timed_out.retry_after}}
+
+
+async def check_handoff(failures: list[str]) -> dict:
+    """The slot is handed to a waiter in the same tick its wait expires, or it is cancelled."""
+    real_wait_for = asyncio.wait_for
+    outcome = {}
+    for name, exc in (("timeout", asyncio.TimeoutError), ("cancel", asyncio.CancelledError)):
+        lane = Lane("expensive", concurrency=1, max_queue=4, timeout_ms=50)
+        await lane.acquire()
+
+        async def handed_over_then(aw, timeout, exc=exc, lane=lane):
+            lane.release()
+            await asyncio.sleep(0)
+            raise exc()
+
+        asyncio.wait_for = handed_over_then
+        try:
+            result = await asyncio.gather(lane.acquire(), return_exceptions=True)
+        finally:
+            asyncio.wait_for = real_wait_for
+        outcome[name] = {"active": lane.active, "queued": len(lane.waiters), "raised": type(result[0]).__name__}
+        if exc is asyncio.TimeoutError:
+            # The waiter got the slot, so it is admitted, not rejected, and now holds it.
+            _expect(failures, "handoff_at_timeout", result[0] is None and lane.active == 1, outcome[name])
+        else:
+            # The cancelled waiter had already been handed the slot; it must pass it on.
+            _expect(failures, "handoff_then_cancel",
+                    isinstance(result[0], asyncio.CancelledError) and lane.active == 0, outcome[name])
+    return outcome
+
+
+async def check_all(clock: Clock, failures: list[str]) -> dict:
+    return {
+        "bucket": check_bucket(clock, failures),
+        "key_limits": await check_key_limits(clock, failures),
+        "lane": await check_lane(failures),
+        "handoff": await check_handoff(failures),
+    }
+
+
+def main():
+    argparse.ArgumentParser(
+        description="Deterministic checks of TokenBucket, Lane and AdmissionController: status codes, Retry-After, "
+                    "queue timeouts and slot hand-off. Runs in well under a second; see admission_bench.py for load."
+    ).parse_args()
+
+    clock = Clock()
+    real_time = adm.time
+    adm.time = types.SimpleNamespace(monotonic=clock)
+    failures: list[str] = []
+    try:
+        report = asyncio.run(check_all(clock, failures))
+    finally:
+        adm.time = real_time
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    for f in failures:
+        print(f"FAIL: {f}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
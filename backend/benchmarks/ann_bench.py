@@ -0,0 +1,92 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.ann import IVFIndex
+from utils.retrieval_metrics import latency_summary
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    block = 100_000
+    for start in range(0, n, block):
+        m = min(block, n - start)
+        labels = rng.integers(0, clusters, size=m)
+        out[start:start + m] = centers[labels] + 0.6 * rng.standard_normal((m, dim)).astype(np.float32)
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    return out
+
+
+def brute_force(vectors: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ q
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def run(n: int, dim: int, num_queries: int, k: int, nprobes: list[int], work_dir: Path) -> dict:
+    vectors = clustered_vectors(n, dim, clusters=max(16, n // 2000))
+    rng = np.random.default_rng(1)
+    picks = rng.choice(n, size=num_queries, replace=False)
+    queries = vectors[picks] + 0.3 * rng.standard_normal((num_queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    emb_path = work_dir / f"bench{n}_embedding.npy"
+    np.save(emb_path, vectors)
+    mm = np.load(emb_path, mmap_mode="r")
+
+    truth, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        truth.append(set(brute_force(mm, q, k).tolist()))
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    report = {"rows": n, "dim": dim, "brute_force": latency_summary(lat)}
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(mm)
+    report["build_seconds"] = round(time.perf_counter() - t0, 2)
+    report["nlist"] = index.nlist
+    report["index_bytes"] = int(index.centroids.nbytes + index.offsets.nbytes + index.ids.nbytes)
+
+    report["ivf"] = {}
+    for nprobe in nprobes:
+        lat, recall = [], 0.0
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            idx, _ = index.search(mm, q, k, nprobe=nprobe)
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            recall += len(expected & set(idx[0].tolist())) / k
+        report["ivf"][str(nprobe)] = {"recall@k": round(recall / len(queries), 4), **latency_summary(lat)}
+        print(f"n={n} nprobe={nprobe} {report['ivf'][str(nprobe)]}", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF ANN vs brute-force recall/latency benchmark.")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,8,16,32,64")
+    args = parser.parse_args()
+
+    nprobes = [int(x) for x in args.nprobe.split(",")]
+    with tempfile.TemporaryDirectory() as tmp:
+        report = [
+            run(int(s), args.dim, args.queries, args.k, nprobes, Path(tmp))
+            for s in args.sizes.split(",") if s.strip()
+        ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
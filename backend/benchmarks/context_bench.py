@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import HashingEncoder, build_corpus
+from utils import context, embeddings
+from utils.chunking_strategies import chunk_sentence
+from utils.retrieval_metrics import latency_summary
+
+
+def build_document(num_facts: int, num_queries: int, chunk_size: int) -> tuple[list[dict], list[dict]]:
+    """Synthetic facts laid out as one document, sentence-chunked with one sentence of overlap."""
+    facts, queries, qrels = build_corpus(num_facts, num_queries=num_queries)
+    text = " ".join(c["content"] for c in facts)
+    chunks = [
+        {"chunk_id": i, "filename": "synthetic.pdf", "content": body,
+         "metadata": {"char_start": start, "char_end": end}}
+        for i, (start, end, body, _) in enumerate(chunk_sentence(text, chunk_size, overlap_sentences=1))
+    ]
+    for q in queries:
+        # The sentence that answers the query: the first sentence of its fact.
+        fact = facts[int(next(iter(qrels[q["id"]])))]["content"]
+        q["answer"] = fact.split(". ")[0].rstrip(".")
+    return chunks, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt tokens saved by context assembly, and answer sentences kept.")
+    parser.add_argument("--facts", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=context.CONTEXT_TOKEN_BUDGET,
+                        help="Token cap on the assembled context (0 = none, the server default).")
+    parser.add_argument("--prune", action="store_true", default=context.CONTEXT_PRUNE,
+                        help="Drop sentences below SECRAG_CONTEXT_MIN_RELEVANCE, as SECRAG_CONTEXT_PRUNE=1 does.")
+    parser.add_argument("--embedder", choices=["minilm", "hash"], default="minilm",
+                        help="'hash' uses a deterministic feature-hashing encoder and needs no model download.")
+    parser.add_argument("--min-retention", type=float, default=0.95,
+                        help="Fail if fewer retrieved answer sentences survive assembly.")
+    args = parser.parse_args()
+
+    if args.embedder == "hash":
+        embeddings._model = HashingEncoder()
+    context.CONTEXT_PRUNE = args.prune
+
+    chunks, queries = build_document(args.facts, args.queries, args.chunk_size)
+    vectors = embeddings.embed_texts([c["content"] for c in chunks])
+    before, after, latencies = [], [], []
+    retrieved_answers = kept_answers = 0
+    for q in queries:
+        scores = vectors @ embeddings.embed_query(q["query"])
+        top = [chunks[int(i)] for i in np.argsort(-scores)[:args.top_k]]
+        stats = {}
+        t0 = time.perf_counter()
+        text = context.assemble_context(top, query=q["query"], budget=args.budget, stats=stats)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        before.append(stats["tokens_before"])
+        after.append(stats["tokens_after"])
+        if any(q["answer"] in c["content"] for c in top):
+            retrieved_answers += 1
+            kept_answers += q["answer"] in text
+
+    retention = kept_answers / retrieved_answers if retrieved_answers else 1.0
+    report = {
+        "queries": len(queries),
+        "chunks": len(chunks),
+        "tokenizer": context.tokenizer_name(),
+        "embedder": args.embedder,
+        "budget": args.budget,
+        "prune": args.prune,
+        "tokens_before_mean": round(float(np.mean(before)), 1),
+        "tokens_after_mean": round(float(np.mean(after)), 1),
+        "tokens_saved_ratio": round(1.0 - sum(after) / max(1, sum(before)), 4),
+        "answer_retention": round(retention, 4),
+        "assembly": latency_summary(latencies),
+    }
+    print(json.dumps(report, indent=2))
+    if retention < args.min_retention:
+        print(f"RETENTION: {retention:.4f} < {args.min_retention}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import build_corpus
+from utils import embeddings
+
+
+def ingestion_texts(n: int, chunk_size: int, seed: int = 7) -> list[str]:
+    """Chunk-like texts from a few words up to 1.5 x chunk_size characters, in document order."""
+    rng = random.Random(seed)
+    sentences = [c["content"] for c in build_corpus(max(200, n), num_queries=0)[0]]
+    texts = []
+    for _ in range(n):
+        target = rng.choice([rng.randint(20, 120), rng.randint(chunk_size // 2, chunk_size),
+                             rng.randint(chunk_size, int(chunk_size * 1.5))])
+        parts, size = [], 0
+        while size < target:
+            s = rng.choice(sentences)
+            parts.append(s)
+            size += len(s) + 1
+        texts.append(" ".join(parts)[:target])
+    return texts
+
+
+def fixed_batches(order: np.ndarray, size: int) -> list[np.ndarray]:
+    return [order[i:i + size] for i in range(0, len(order), size)]
+
+
+def padding_report(lengths: np.ndarray, batches: list[np.ndarray]) -> dict:
+    padded = sum(len(b) * int(lengths[b].max()) for b in batches)
+    return {
+        "batches": len(batches),
+        "padded_tokens": int(padded),
+        "padding_overhead": round(padded / max(1, int(lengths.sum())) - 1.0, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Padding waste and throughput of fixed-count vs token-budget embedding batches.")
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=32, help="Fixed batch size of the old path.")
+    parser.add_argument("--budget", type=int, default=embeddings.EMBED_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    texts = ingestion_texts(args.texts, args.chunk_size)
+    have_model = importlib.util.find_spec("sentence_transformers") is not None
+    model = embeddings.get_model() if have_model else None
+    lengths = embeddings.token_lengths(texts, model)
+
+    plans = {
+        "document_order": fixed_batches(np.arange(len(texts)), args.batch),
+        "char_sorted": fixed_batches(np.argsort([-len(t) for t in texts], kind="stable"), args.batch),
+        "token_budget": embeddings.token_batches(lengths, budget=args.budget),
+    }
+    report = {
+        "texts": len(texts),
+        "tokens": int(lengths.sum()),
+        "token_counts": "tokenizer" if model is not None else "estimated",
+        "plans": {name: padding_report(lengths, b) for name, b in plans.items()},
+        "skipped": [],
+    }
+
+    if model is None:
+        report["skipped"].append("throughput: sentence_transformers not installed")
+    else:
+        for name, batches in plans.items():
+            t0 = time.perf_counter()
+            for b in batches:
+                model.encode([texts[i] for i in b], batch_size=len(b), normalize_embeddings=True)
+            seconds = time.perf_counter() - t0
+            report["plans"][name]["seconds"] = round(seconds, 3)
+            report["plans"][name]["tokens_per_s"] = round(int(lengths.sum()) / seconds, 1)
+            print(f"{name} {report['plans'][name]}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import build_corpus
+from utils.retrieval_metrics import latency_summary
+
+BACKENDS = ("onnx", "onnx-int8")
+RERANK_CANDIDATES = 20
+
+
+def _missing_deps() -> list[str]:
+    return [m for m in ("sentence_transformers", "transformers", "torch", "onnxruntime", "onnx")
+            if importlib.util.find_spec(m) is None]
+
+
+def _top(vectors: np.ndarray, q: np.ndarray, k: int) -> np.ndarray:
+    scores = vectors @ q
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def _spearman(a: np.ndarray, b: np.ndarray) -> float:
+    ra, rb = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return float(np.corrcoef(ra, rb)[0, 1]) if len(a) > 1 else 1.0
+
+
+def _timed(fn, *args, repeat: int = 1) -> tuple[object, list[float]]:
+    lat, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args)
+        lat.append((time.perf_counter() - t0) * 1000.0)
+    return out, lat
+
+
+class _ToyEncoder:
+    """Deterministic stand-in for an ONNX session and tokenizer, so the pooling, activation and batching
+    code around them can be checked without downloading a model.
+
+    Token states come from a fixed random table; padded positions hold large
+    garbage values, so any pooling that fails to apply the mask shows up.
+    """
+
+    VOCAB, DIM = 97, 8
+
+    def __init__(self, task: str, max_length: int = 24):
+        rng = np.random.default_rng(0)
+        self.table = rng.normal(size=(self.VOCAB, self.DIM)).astype(np.float32)
+        self.head = (rng.normal(size=self.DIM) * 8.0).astype(np.float32)
+        self.task = task
+        self.max_length = max_length
+
+    def tokens(self, first: str, second: str | None = None) -> list[int]:
+        ids = [101] + [sum(map(ord, w)) for w in first.split()] + [102]
+        if second is not None:
+            ids += [sum(map(ord, w)) for w in second.split()] + [102]
+        return [i % self.VOCAB for i in ids[:self.max_length]]
+
+    def states(self, ids: list[int]) -> np.ndarray:
+        return self.table[ids] + 0.01 * np.arange(len(ids), dtype=np.float32)[:, None]
+
+    def _run(self, first: list[str], second: list[str] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        toks = [self.tokens(a, b) for a, b in zip(first, second or [None] * len(first))]
+        width = max(len(t) for t in toks)
+        hidden = np.full((len(toks), width, self.DIM), 1e3, dtype=np.float32)
+        mask = np.zeros((len(toks), width), dtype=np.int64)
+        for i, t in enumerate(toks):
+            hidden[i, :len(t)] = self.states(t)
+            mask[i, :len(t)] = 1
+        if self.task == "rerank":
+            pooled = (hidden * mask[..., None]).sum(axis=1) / mask.sum(axis=1, keepdims=True)
+            return (pooled @ self.head)[:, None], mask
+        return hidden, mask
+
+
+def synthetic_parity(tolerance: float = 1e-5) -> tuple[dict, list[str]]:
+    """Model-free check of mean pooling, normalisation, sigmoid and batch-order restoration.
+
+    Each output is compared with a per-text reference computed one item at a
+    time, across batch sizes, so length sorting and padding cannot change a
+    result.
+    """
+    from utils.onnx_models import OnnxCrossEncoder, OnnxEmbedder, sigmoid
+
+    class ToyEmbedder(_ToyEncoder, OnnxEmbedder):
+        pass
+
+    class ToyCrossEncoder(_ToyEncoder, OnnxCrossEncoder):
+        pass
+
+    rng = np.random.default_rng(1)
+    words = ["retrieval", "rank", "fusion", "chunk", "token", "vector", "index", "query", "model", "page"]
+    texts = [" ".join(rng.choice(words, size=int(rng.integers(1, 30)))) for _ in range(40)]
+    pairs = [(texts[i], texts[-i - 1]) for i in range(len(texts))]
+
+    emb, ce = ToyEmbedder("embed"), ToyCrossEncoder("rerank")
+    ref_vecs = np.stack([emb.states(emb.tokens(t)).mean(axis=0) for t in texts])
+    ref_vecs /= np.linalg.norm(ref_vecs, axis=1, keepdims=True)
+    ref_logits = [float(ce.states(ce.tokens(q, d)).mean(axis=0) @ ce.head) for q, d in pairs]
+    ref_probs = np.array([1.0 / (1.0 + np.exp(-x)) if x >= 0 else np.exp(x) / (1.0 + np.exp(x)) for x in ref_logits])
+
+    report, failures = {}, []
+    for batch in (1, 3, 32):
+        embed_err = float(np.abs(emb.encode(texts, batch_size=batch) - ref_vecs).max())
+        rerank_err = float(np.abs(ce.predict(pairs, batch_size=batch) - ref_probs).max())
+        report[f"batch_{batch}"] = {"embed_max_abs_err": embed_err, "rerank_max_abs_err": rerank_err}
+        if embed_err > tolerance or rerank_err > tolerance:
+            failures.append(f"synthetic parity at batch {batch}: embed {embed_err:.2e}, rerank {rerank_err:.2e}")
+
+    extremes = np.array([-1000.0, -50.0, 0.0, 50.0, 1000.0])
+    with np.errstate(over="raise", invalid="raise"):
+        probs = sigmoid(extremes)
+    expected = np.array([0.0, np.exp(-50.0), 0.5, 1.0, 1.0])
+    report["sigmoid_extremes_ok"] = bool(np.allclose(probs, expected, rtol=1e-6, atol=0.0))
+    if not report["sigmoid_extremes_ok"]:
+        failures.append(f"sigmoid at extreme logits: {probs.tolist()}")
+
+    if importlib.util.find_spec("torch") is not None:
+        import torch
+
+        from utils.onnx_models import mean_pool
+
+        hidden, mask = emb._run(texts[:8])
+        t_hidden, t_mask = torch.from_numpy(hidden), torch.from_numpy(mask)
+        # sentence-transformers' Pooling(mode="mean") and CrossEncoder's Sigmoid, verbatim.
+        expanded = t_mask.unsqueeze(-1).expand(t_hidden.size()).float()
+        torch_pool = (torch.sum(t_hidden * expanded, 1) / torch.clamp(expanded.sum(1), min=1e-9)).numpy()
+        logits = np.linspace(-30, 30, 61, dtype=np.float32)
+        report["torch_pool_max_abs_err"] = float(np.abs(mean_pool(hidden, mask) - torch_pool).max())
+        report["torch_sigmoid_max_abs_err"] = float(np.abs(sigmoid(logits) - torch.sigmoid(torch.from_numpy(logits)).numpy()).max())
+        if max(report["torch_pool_max_abs_err"], report["torch_sigmoid_max_abs_err"]) > tolerance:
+            failures.append("pooling or sigmoid differs from the torch reference")
+    return report, failures
+
+
+def run(texts: list[str], queries: list[str], k: int, batch: int, onnx_root: Path) -> dict:
+    from sentence_transformers import CrossEncoder, SentenceTransformer
+    from utils.onnx_models import OnnxCrossEncoder, OnnxEmbedder
+
+    st = SentenceTransformer("all-MiniLM-L6-v2")
+    ce = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    ref_corpus, ref_bulk = _timed(lambda: st.encode(texts, batch_size=batch, normalize_embeddings=True))
+    ref_queries = st.encode(queries, normalize_embeddings=True)
+    _, ref_single = _timed(lambda: st.encode(queries[:1], normalize_embeddings=True), repeat=len(queries))
+    pairs = [[(q, texts[i]) for i in _top(ref_corpus, qv, RERANK_CANDIDATES)] for q, qv in zip(queries, ref_queries)]
+    ref_ce, ref_ce_lat = [], []
+    for p in pairs:
+        scores, lat = _timed(ce.predict, p)
+        ref_ce.append(np.asarray(scores, dtype=np.float32))
+        ref_ce_lat += lat
+
+    report = {"torch": {
+        "embed_bulk_texts_per_s": round(len(texts) / (ref_bulk[0] / 1000.0), 1),
+        "embed_single": latency_summary(ref_single),
+        "rerank_20_pairs": latency_summary(ref_ce_lat),
+    }}
+    for backend in BACKENDS:
+        quantize = backend == "onnx-int8"
+        emb = OnnxEmbedder(quantize=quantize, root=onnx_root)
+        cross = OnnxCrossEncoder(quantize=quantize, root=onnx_root)
+        corpus, bulk = _timed(lambda: emb.encode(texts, batch_size=batch))
+        qvecs = emb.encode(queries)
+        _, single = _timed(lambda: emb.encode(queries[:1]), repeat=len(queries))
+        cosine = np.concatenate([(corpus * ref_corpus).sum(axis=1), (qvecs * ref_queries).sum(axis=1)])
+        overlap = np.mean([
+            len(set(_top(ref_corpus, rq, k).tolist()) & set(_top(corpus, q, k).tolist())) / k
+            for rq, q in zip(ref_queries, qvecs)
+        ])
+        ce_overlap, ce_rho, ce_lat = [], [], []
+        for p, ref_scores in zip(pairs, ref_ce):
+            scores, lat = _timed(cross.predict, p)
+            ce_lat += lat
+            top = min(5, len(p))
+            ce_overlap.append(len(set(np.argsort(-ref_scores)[:top]) & set(np.argsort(-scores)[:top])) / top)
+            ce_rho.append(_spearman(ref_scores, scores))
+        report[backend] = {
+            "embed_cosine_mean": round(float(cosine.mean()), 5),
+            "embed_cosine_min": round(float(cosine.min()), 5),
+            f"retrieval_overlap@{k}": round(float(overlap), 4),
+            "rerank_top5_overlap": round(float(np.mean(ce_overlap)), 4),
+            "rerank_spearman": round(float(np.mean(ce_rho)), 4),
+            "embed_bulk_texts_per_s": round(len(texts) / (bulk[0] / 1000.0), 1),
+            "embed_bulk_speedup": round(ref_bulk[0] / bulk[0], 2),
+            "embed_single": latency_summary(single),
+            "rerank_20_pairs": latency_summary(ce_lat),
+            "rerank_speedup": round(float(np.median(ref_ce_lat) / np.median(ce_lat)), 2),
+        }
+        print(f"{backend} {report[backend]}", file=sys.stderr)
+    return report
+
+
+def parity_failures(report: dict, min_cosine: float, min_overlap: float) -> list[str]:
+    failures = []
+    for backend in BACKENDS:
+        r = report.get(backend)
+        if r is None:
+            continue
+        if r["embed_cosine_min"] < min_cosine:
+            failures.append(f"{backend}: embedding cosine {r['embed_cosine_min']} < {min_cosine}")
+        for key in [k for k in r if k.startswith("retrieval_overlap")] + ["rerank_top5_overlap"]:
+            if r[key] < min_overlap:
+                failures.append(f"{backend}: {key} {r[key]} < {min_overlap}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX / int8 vs PyTorch parity and speed for the embedder and cross-encoder.")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--onnx-dir", default=None, help="Reuse exported models from here (default: fresh temp dir).")
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    args = parser.parse_args()
+
+    synthetic, failures = synthetic_parity()
+    missing = _missing_deps()
+    if missing:
+        report = {"synthetic_parity": synthetic, "skipped": [f"missing: {', '.join(missing)}"]}
+    else:
+        chunks, queries, _ = build_corpus(args.texts, num_queries=args.queries)
+        texts = [c["content"] for c in chunks]
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(args.onnx_dir) if args.onnx_dir else Path(tmp)
+            report = run(texts, [q["query"] for q in queries], args.k, args.batch, root)
+        report["synthetic_parity"] = synthetic
+        failures += parity_failures(report, args.min_cosine, args.min_overlap)
+    print(json.dumps(report, indent=2))
+
+    for msg in failures:
+        print(f"PARITY: {msg}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
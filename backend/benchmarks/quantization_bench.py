@@ -0,0 +1,82 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.ann_bench import clustered_vectors
+from utils.quantization import QuantizedEmbeddings, quantize_int8, rescore
+from utils.retrieval_metrics import latency_summary
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+def _store(mode: str, vectors: np.ndarray):
+    if mode == "float32":
+        return None
+    if mode == "float16":
+        return QuantizedEmbeddings("float16", vectors.astype(np.float16))
+    codes, scales = quantize_int8(vectors)
+    return QuantizedEmbeddings("int8", codes, scales)
+
+
+def run(n: int, dim: int, num_queries: int, k: int, rescore_mult: int) -> dict:
+    vectors = clustered_vectors(n, dim, clusters=max(16, n // 2000))
+    rng = np.random.default_rng(3)
+    queries = vectors[rng.choice(n, size=num_queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(_top(vectors @ q, k).tolist()) for q in queries]
+
+    report = {"rows": n, "dim": dim, "modes": {}}
+    for mode in ("float32", "float16", "int8"):
+        store = _store(mode, vectors)
+        lat, recall_raw, recall_rescored = [], 0.0, 0.0
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            if store is None:
+                top = _top(vectors @ q, k)
+                raw = top
+            else:
+                approx = store.score(q)
+                raw = _top(approx, k)
+                cand = _top(approx, k * rescore_mult)
+                exact = rescore(vectors, cand, q)
+                top = cand[np.argsort(-exact)[:k]]
+            lat.append((time.perf_counter() - t0) * 1000.0)
+            recall_raw += len(expected & set(raw.tolist())) / k
+            recall_rescored += len(expected & set(top.tolist())) / k
+        report["modes"][mode] = {
+            "resident_bytes": int(vectors.nbytes if store is None else store.nbytes()),
+            "recall@k_no_rescore": round(recall_raw / num_queries, 4),
+            "recall@k_rescored": round(recall_rescored / num_queries, 4),
+            **latency_summary(lat),
+        }
+        print(f"n={n} {mode} {report['modes'][mode]}", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="float32 vs float16 vs int8 embedding storage benchmark.")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-mult", type=int, default=4)
+    args = parser.parse_args()
+    report = [
+        run(int(s), args.dim, args.queries, args.k, args.rescore_mult)
+        for s in args.sizes.split(",") if s.strip()
+    ]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import HashingEncoder, build_corpus, write_artifacts
+from utils import embeddings
+from utils.retriever import retrieve_top_k
+from utils.retrieval_metrics import latency_summary, score_run
+from utils.tracing import event_counts
+
+MODES = ("semantic", "bm25", "hybrid", "reranked", "cascade")
+RERANK_MODES = ("reranked", "cascade")
+EVAL_K = 10
+RERANK_CANDIDATES = 40
+
+
+def _reranker_available() -> bool:
+    from utils.reranker import _get_cross_encoder
+    return _get_cross_encoder() is not None
+
+
+def _run_mode(mode: str, queries: list[dict], chunk_path: Path, emb_path: Path) -> tuple[dict, list[float], float]:
+    runs: dict[str, list] = {}
+    latencies: list[float] = []
+    started = time.perf_counter()
+    if mode in RERANK_MODES:
+        from utils import reranker
+        reranker.CASCADE = mode == "cascade"
+    for q in queries:
+        t0 = time.perf_counter()
+        if mode in RERANK_MODES:
+            from utils.reranker import rerank
+            candidates = retrieve_top_k(
+                query=q["query"], chunks_path=chunk_path, embeddings_path=emb_path,
+                top_k=RERANK_CANDIDATES, mode="hybrid",
+            )
+            results = rerank(q["query"], candidates, top_k=EVAL_K)
+        else:
+            results = retrieve_top_k(
+                query=q["query"], chunks_path=chunk_path, embeddings_path=emb_path,
+                top_k=EVAL_K, mode=mode,
+            )
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        runs[q["id"]] = [str(r["chunk_id"]) for r in results]
+    return runs, latencies, time.perf_counter() - started
+
+
+def run_benchmark(sizes: list[int], num_queries: int, modes: tuple, work_dir: Path) -> dict:
+    report = {"quality": {}, "latency": {}, "skipped": []}
+    if any(m in RERANK_MODES for m in modes) and not _reranker_available():
+        report["skipped"] += [f"{m}: cross-encoder unavailable" for m in modes if m in RERANK_MODES]
+        modes = tuple(m for m in modes if m not in RERANK_MODES)
+
+    for i, size in enumerate(sizes):
+        chunks, queries, qrels = build_corpus(size, num_queries=num_queries)
+        vectors = embeddings.embed_texts([c["content"] for c in chunks])
+        chunk_path, emb_path = write_artifacts(chunks, vectors, work_dir / str(size))
+
+        report["latency"][str(size)] = {}
+        for mode in modes:
+            before = event_counts("rerank_")
+            runs, latencies, wall = _run_mode(mode, queries, chunk_path, emb_path)
+            report["latency"][str(size)][mode] = latency_summary(latencies, wall)
+            if i == 0:
+                report["quality"][mode] = score_run(runs, qrels)
+            if mode == "cascade":
+                after = event_counts("rerank_")
+                report.setdefault("rerank_tiers", {})[str(size)] = {
+                    k: v - before.get(k, 0.0) for k, v in after.items() if v != before.get(k, 0.0)
+                }
+            print(f"size={size} mode={mode} {report['latency'][str(size)][mode]}", file=sys.stderr)
+
+    return report
+
+
+def compare_to_baseline(report: dict, baseline: dict, quality_tol: float, latency_tol: float) -> list[str]:
+    failures = []
+    for mode, metrics in baseline.get("quality", {}).items():
+        for name, base in metrics.items():
+            cur = report["quality"].get(mode, {}).get(name)
+            if cur is not None and cur < base - quality_tol:
+                failures.append(f"{mode} {name}: {cur} < baseline {base}")
+    for size, per_mode in baseline.get("latency", {}).items():
+        for mode, stats in per_mode.items():
+            cur = report["latency"].get(size, {}).get(mode)
+            if cur and cur["p95_ms"] > stats["p95_ms"] * (1.0 + latency_tol):
+                failures.append(f"{mode}@{size} p95 {cur['p95_ms']}ms > baseline {stats['p95_ms']}ms")
+    return failures
+
+
+def cascade_failures(report: dict, tolerance: float) -> list[str]:
+    """The cascade must match always-reranking on every quality metric, within `tolerance`."""
+    full, cascade = report["quality"].get("reranked"), report["quality"].get("cascade")
+    if not full or not cascade:
+        return []
+    return [
+        f"cascade {name}: {cascade[name]} < reranked {base}"
+        for name, base in full.items() if cascade.get(name, 0.0) < base - tolerance
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval quality and latency benchmark.")
+    parser.add_argument("--sizes", default="400,2000,10000", help="Comma-separated corpus sizes (chunks).")
+    parser.add_argument("--queries", type=int, default=160)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--embedder", choices=["minilm", "hash"], default="minilm",
+                        help="'hash' uses a deterministic feature-hashing encoder and needs no model download.")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--baseline", default=None, help="Previous report to gate against.")
+    parser.add_argument("--quality-tolerance", type=float, default=0.02)
+    parser.add_argument("--latency-tolerance", type=float, default=0.5)
+    parser.add_argument("--cascade-tolerance", type=float, default=0.005,
+                        help="Fail if the cascade loses more than this on any quality metric against full reranking.")
+    args = parser.parse_args()
+
+    if args.embedder == "hash":
+        embeddings._model = HashingEncoder()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    modes = tuple(m.strip() for m in args.modes.split(",") if m.strip() in MODES)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = run_benchmark(sizes, args.queries, modes, Path(tmp))
+    report["config"] = {"sizes": sizes, "queries": args.queries, "embedder": args.embedder, "k": EVAL_K}
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+    failures = cascade_failures(report, args.cascade_tolerance)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        failures += compare_to_baseline(report, baseline, args.quality_tolerance, args.latency_tolerance)
+    for msg in failures:
+        print(f"REGRESSION: {msg}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+
+import numpy as np
+
+_SYLLABLES = ["zor", "ka", "lin", "vex", "tra", "mon", "qui", "dal", "ber", "sy", "nor", "phe", "lux", "ga", "ren", "tor"]
+_ORGS = ["Northwind Labs", "Helix Research", "Bluefield AI", "Orchid Institute", "Granite Systems", "Kestrel Group"]
+_CORPORA = ["WebText-Lite", "ArxivDump", "NewsCrawl", "BookShelf", "CodeStack", "WikiSlice"]
+_TASKS = ["SQuAD", "GLUE", "SWAG", "MNLI", "CoNLL", "TriviaQA"]
+_FILLER = [
+    "The authors note that further ablations are left for future work.",
+    "Training was performed with mixed precision on commodity accelerators.",
+    "Hyperparameters were selected on a held-out development split.",
+    "Results are averaged over five random seeds.",
+    "The implementation is released under a permissive license.",
+    "Qualitative examples are provided in the appendix.",
+]
+
+_FACETS = {
+    "layers": (
+        "{name} stacks {layers} transformer layers with a hidden size of {hidden}.",
+        "How many layers does {name} have?",
+    ),
+    "corpus": (
+        "{name} was pre-trained on the {corpus} corpus for {steps} thousand steps.",
+        "Which dataset was {name} trained on?",
+    ),
+    "task": (
+        "On the {task} benchmark, {name} reaches an accuracy of {acc} percent.",
+        "What score does {name} get on {task}?",
+    ),
+    "origin": (
+        "{name} was introduced by researchers at {org} in {year}.",
+        "Who developed {name} and when?",
+    ),
+}
+
+
+def _entity_name(rng: random.Random, used: set) -> str:
+    while True:
+        name = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        name = f"{name}-{rng.randint(1, 99)}"
+        if name not in used:
+            used.add(name)
+            return name
+
+
+def build_corpus(num_chunks: int, num_queries: int = 160, seed: int = 13) -> tuple[list[dict], list[dict], dict]:
+    rng = random.Random(seed)
+    used: set = set()
+    chunks: list[dict] = []
+    queries: list[dict] = []
+    qrels: dict[str, dict] = {}
+    pos = 0
+
+    num_entities = max(1, -(-num_chunks // len(_FACETS)))
+    for e in range(num_entities):
+        attrs = {
+            "name": _entity_name(rng, used),
+            "layers": rng.choice([6, 12, 24, 36, 48]),
+            "hidden": rng.choice([384, 768, 1024, 2048]),
+            "corpus": rng.choice(_CORPORA),
+            "steps": rng.randint(50, 900),
+            "task": rng.choice(_TASKS),
+            "acc": round(rng.uniform(60, 95), 1),
+            "org": rng.choice(_ORGS),
+            "year": rng.randint(2015, 2025),
+        }
+        for facet, (template, question) in _FACETS.items():
+            if len(chunks) >= num_chunks:
+                break
+            content = f"{template.format(**attrs)} {rng.choice(_FILLER)}"
+            cid = len(chunks)
+            chunks.append({
+                "chunk_id": cid,
+                "filename": "synthetic.pdf",
+                "source_path": "synthetic",
+                "created_at": "2025-01-01T00:00:00",
+                "char_start": pos,
+                "char_end": pos + len(content),
+                "content": content,
+                "chunk_strategy": "synthetic",
+            })
+            pos += len(content) + 1
+            if len(queries) < num_queries:
+                qid = f"q{len(queries)}"
+                queries.append({"id": qid, "query": question.format(**attrs)})
+                qrels[qid] = {str(cid): 2}
+
+    return chunks, queries, qrels
+
+
+class HashingEncoder:
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self._token_re = re.compile(r"[a-z0-9]+")
+
+    def _features(self, text: str) -> list[str]:
+        toks = self._token_re.findall(text.lower())
+        grams = [t[i:i + 3] for t in toks for i in range(max(1, len(t) - 2))]
+        return toks + grams
+
+    def encode(self, texts, normalize_embeddings: bool = True, **kwargs):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feat.encode(), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) else -1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(out, axis=1, keepdims=True)
+            out /= np.maximum(norms, 1e-9)
+        return out
+
+
+def write_artifacts(chunks: list[dict], vectors: np.ndarray, out_dir: Path, stem: str = "synthetic") -> tuple[Path, Path]:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chunk_path = out_dir / f"{stem}_chunks.json"
+    emb_path = out_dir / f"{stem}_embedding.npy"
+    with open(chunk_path, "w", encoding="utf-8") as f:
+        json.dump(chunks, f)
+    np.save(str(emb_path), vectors.astype(np.float32))
+    return chunk_path, emb_path
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import build_corpus
+from utils.bm25 import BM25Index
+from utils.retrieval_metrics import latency_summary
+from utils.tokenizer import Tokenizer
+
+
+def _split_tokenize(text: str):
+    return [t for t in text.lower().split() if t.strip()]
+
+
+def _list_index_bytes(tokenized: list[list[str]]) -> int:
+    seen = set()
+    total = 0
+    for toks in tokenized:
+        total += sys.getsizeof(toks)
+        for t in toks:
+            if id(t) not in seen:
+                seen.add(id(t))
+                total += sys.getsizeof(t)
+    return total
+
+
+def _throughput(fn, texts: list[str]) -> dict:
+    t0 = time.perf_counter()
+    n_tokens = 0
+    for text in texts:
+        n_tokens += len(fn(text))
+    elapsed = time.perf_counter() - t0
+    n_bytes = sum(len(t) for t in texts)
+    return {
+        "seconds": round(elapsed, 3),
+        "docs_per_s": round(len(texts) / elapsed, 1),
+        "mb_per_s": round(n_bytes / elapsed / 1e6, 2),
+        "tokens_per_s": round(n_tokens / elapsed, 1),
+        "tokens": n_tokens,
+    }
+
+
+def run(size: int, num_queries: int) -> dict:
+    chunks, queries, _ = build_corpus(size, num_queries=num_queries)
+    texts = [c["content"] for c in chunks]
+    tokenizer = Tokenizer()
+    out = {
+        "size": size,
+        "skipped": [],
+        "tokenize": {
+            "whitespace_split": _throughput(_split_tokenize, texts),
+            "regex_plain": _throughput(Tokenizer(use_stemming=False, remove_stopwords=False).tokenize, texts),
+            "regex_stem_stop": _throughput(tokenizer.tokenize, texts),
+        },
+    }
+
+    t0 = time.perf_counter()
+    index = BM25Index(tokenizer=tokenizer).fit(texts)
+    build_s = time.perf_counter() - t0
+    latencies = []
+    for q in queries:
+        t1 = time.perf_counter()
+        index.get_scores(q["query"])
+        latencies.append((time.perf_counter() - t1) * 1000.0)
+    out["int_index"] = {
+        "build_seconds": round(build_s, 3),
+        "index_bytes": index.nbytes(),
+        "vocab_size": len(index.vocab),
+        "postings": int(len(index.post_docs)),
+        "query": latency_summary(latencies),
+    }
+
+    tokenized = [_split_tokenize(t) for t in texts]
+    out["string_lists_bytes"] = _list_index_bytes(tokenized)
+
+    # rank-bm25 is no longer a runtime dependency; it is only the reference implementation here.
+    try:
+        from rank_bm25 import BM25Okapi
+    except ImportError:
+        out["skipped"].append("rank_bm25: not installed (pip install rank-bm25 to compare against it)")
+        return out
+    t0 = time.perf_counter()
+    ref = BM25Okapi(tokenized)
+    ref_build = time.perf_counter() - t0
+    latencies = []
+    for q in queries:
+        t1 = time.perf_counter()
+        ref.get_scores(_split_tokenize(q["query"]))
+        latencies.append((time.perf_counter() - t1) * 1000.0)
+    out["rank_bm25"] = {"build_seconds": round(ref_build, 3), "query": latency_summary(latencies)}
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokenizer and BM25 index throughput benchmark.")
+    parser.add_argument("--sizes", default="10000,100000")
+    parser.add_argument("--queries", type=int, default=100)
+    args = parser.parse_args()
+    report = [run(int(s), args.queries) for s in args.sizes.split(",") if s.strip()]
+    for msg in sorted({m for r in report for m in r["skipped"]}):
+        print(f"skipped {msg}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.ann_bench import clustered_vectors
+from utils.retrieval_metrics import latency_summary
+from utils.vector_store import VECTOR_BACKENDS, get_store
+
+
+def _backend_available(backend: str) -> bool:
+    return backend != "chroma" or importlib.util.find_spec("chromadb") is not None
+
+
+def run(backend: str, n: int, dim: int, num_queries: int, k: int, batch: int) -> dict:
+    vectors = clustered_vectors(n, dim, clusters=max(16, n // 2000))
+    rng = np.random.default_rng(5)
+    queries = vectors[rng.choice(n, size=num_queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = [set(np.argsort(-(vectors @ q))[:k].tolist()) for q in queries]
+
+    work_dir = tempfile.mkdtemp(prefix=f"vsbench_{backend}_")
+    try:
+        store = get_store(work_dir, backend=backend)
+        ids = [str(i) for i in range(n)]
+        metas = [{"page_start": i % 50 + 1} for i in range(n)]
+        t0 = time.perf_counter()
+        for start in range(0, n, 5000):
+            end = min(start + 5000, n)
+            store.upsert("bench", ids[start:end], vectors[start:end], ids[start:end], metas[start:end])
+        upsert_s = time.perf_counter() - t0
+
+        single, recall = [], 0.0
+        for q, expected in zip(queries, truth):
+            t0 = time.perf_counter()
+            hits = store.query("bench", q, k)[0]
+            single.append((time.perf_counter() - t0) * 1000.0)
+            recall += len(expected & {int(h[0]) for h in hits}) / k
+
+        batched = []
+        for start in range(0, num_queries, batch):
+            t0 = time.perf_counter()
+            store.query("bench", queries[start:start + batch], k)
+            batched.append((time.perf_counter() - t0) * 1000.0 / len(queries[start:start + batch]))
+
+        filtered = []
+        for q in queries:
+            t0 = time.perf_counter()
+            store.query("bench", q, k, where={"page_start": {"$lte": 5}})
+            filtered.append((time.perf_counter() - t0) * 1000.0)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "backend": backend,
+        "rows": n,
+        "dim": dim,
+        "upsert_seconds": round(upsert_s, 3),
+        "recall@k": round(recall / num_queries, 4),
+        "single_query": latency_summary(single),
+        "batched_query_per_item": latency_summary(batched),
+        "filtered_query": latency_summary(filtered),
+    }
+    print(f"{backend} n={n} {report}", file=sys.stderr)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector-store backend benchmark: upsert, query latency, recall.")
+    parser.add_argument("--backends", default=",".join(VECTOR_BACKENDS))
+    parser.add_argument("--sizes", default="10000,50000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=16)
+    args = parser.parse_args()
+
+    report = {"results": [], "skipped": []}
+    for backend in (b.strip() for b in args.backends.split(",") if b.strip()):
+        if not _backend_available(backend):
+            report["skipped"].append(f"{backend}: chromadb not installed")
+            continue
+        for s in args.sizes.split(","):
+            if s.strip():
+                report["results"].append(run(backend, int(s), args.dim, args.queries, args.k, args.batch))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
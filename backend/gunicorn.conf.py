@@ -0,0 +1,26 @@
+import multiprocessing
+import os
+
+bind = os.getenv("SECRAG_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("SECRAG_WORKER_TIMEOUT", "120"))
+
+# Import app.py (and everything it pulls in) once in the master so models and
+# indexes are shared copy-on-write with the forked workers.
+preload_app = True
+
+_torch_threads = int(os.getenv("SECRAG_TORCH_THREADS", "0")) or max(1, multiprocessing.cpu_count() // workers)
+
+
+def when_ready(server):
+    from app import CHROMA_DIR, DATA_DIR
+    from utils.prefork import warm_parent
+
+    warm_parent(DATA_DIR, CHROMA_DIR)
+
+
+def post_fork(server, worker):
+    from utils.prefork import init_worker
+
+    init_worker(_torch_threads)
@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.retrieval_metrics import percentile
+
+DEFAULT_QUERIES = [
+    "What is the main contribution of the paper?",
+    "How was the model pre-trained?",
+    "Which datasets were used for evaluation?",
+    "What are the limitations discussed by the authors?",
+    "How does the model compare to previous work?",
+    "What hyperparameters were used for fine-tuning?",
+]
+
+
+ENDPOINTS = ("retrieve", "answer", "summarize", "list_docs", "upload")
+
+
+class Workload:
+    def __init__(self, mix: dict[str, float], doc: str, queries: list[str], pdf_bytes: bytes | None,
+                 deadline_ms: float | None = None):
+        self.endpoints = [e for e, w in mix.items() if w > 0]
+        self.weights = [mix[e] for e in self.endpoints]
+        self.doc = doc
+        self.queries = queries
+        self.pdf_bytes = pdf_bytes
+        self.deadline_ms = deadline_ms
+        if "upload" in self.endpoints and pdf_bytes is None:
+            raise ValueError("upload in the mix requires --pdf")
+
+    def next_request(self) -> tuple[str, dict]:
+        endpoint = random.choices(self.endpoints, weights=self.weights, k=1)[0]
+        query = random.choice(self.queries)
+        if endpoint == "retrieve":
+            return endpoint, {"method": "POST", "url": "/retrieve", "json": {"filename": self.doc, "query": query}}
+        if endpoint == "answer":
+            body = {"filename": self.doc, "query": query}
+            if self.deadline_ms:
+                body["deadline_ms"] = self.deadline_ms
+            return endpoint, {"method": "POST", "url": "/answer", "json": body}
+        if endpoint == "summarize":
+            return endpoint, {"method": "POST", "url": "/summarize", "json": {"filename": self.doc}}
+        if endpoint == "list_docs":
+            return endpoint, {"method": "GET", "url": "/list_docs"}
+        if endpoint != "upload":
+            raise ValueError(f"Unknown endpoint in mix: {endpoint}")
+        name = f"loadtest_{uuid.uuid4().hex[:8]}.pdf"
+        return endpoint, {
+            "method": "POST",
+            "url": "/upload",
+            "files": {"file": (name, self.pdf_bytes, "application/pdf")},
+        }
+
+
+async def _fire(client: httpx.AsyncClient, endpoint: str, req: dict, samples: list, timeout: float):
+    t0 = time.perf_counter()
+    status = 0
+    degraded: list[str] = []
+    try:
+        resp = await client.request(timeout=timeout, **req)
+        status = resp.status_code
+        if endpoint == "answer" and status == 200:
+            degraded = resp.json().get("degraded") or []
+    except httpx.TimeoutException:
+        status = -1
+    except httpx.HTTPError:
+        status = -2
+    samples.append((endpoint, status, (time.perf_counter() - t0) * 1000.0, degraded))
+
+
+async def run_step(client: httpx.AsyncClient, workload: Workload, rps: float, duration: float,
+                   timeout: float, max_inflight: int) -> dict:
+    samples: list = []
+    tasks: set = set()
+    dropped = 0
+    start = time.perf_counter()
+    next_at = start
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration:
+            break
+        if now < next_at:
+            await asyncio.sleep(next_at - now)
+        next_at += random.expovariate(rps)
+        if len(tasks) >= max_inflight:
+            dropped += 1
+            continue
+        endpoint, req = workload.next_request()
+        task = asyncio.create_task(_fire(client, endpoint, req, samples, timeout))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(tasks)
+    elapsed = time.perf_counter() - start
+    return summarize_step(rps, samples, elapsed, dropped)
+
+
+def summarize_step(rps: float, samples: list, elapsed: float, dropped: int) -> dict:
+    per_endpoint: dict[str, dict] = {}
+    by_ep: dict[str, list] = {}
+    for endpoint, status, ms, degraded in samples:
+        by_ep.setdefault(endpoint, []).append((status, ms, degraded))
+    for endpoint, rows in sorted(by_ep.items()):
+        lat = [ms for status, ms, _ in rows if 200 <= status < 300]
+        errors = sum(1 for status, _, _ in rows if not 200 <= status < 300)
+        per_endpoint[endpoint] = {
+            "requests": len(rows),
+            "error_rate": round(errors / len(rows), 4),
+            "status_counts": _status_counts(rows),
+            "p50_ms": round(percentile(lat, 50), 1),
+            "p95_ms": round(percentile(lat, 95), 1),
+            "p99_ms": round(percentile(lat, 99), 1),
+        }
+        degradations: dict[str, int] = {}
+        for _, _, degraded in rows:
+            for name in degraded:
+                degradations[name] = degradations.get(name, 0) + 1
+        if degradations:
+            per_endpoint[endpoint]["degraded"] = dict(sorted(degradations.items()))
+    ok = [ms for _, status, ms, _ in samples if 200 <= status < 300]
+    return {
+        "target_rps": rps,
+        "achieved_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else 0.0,
+        "requests": len(samples),
+        "client_dropped": dropped,
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "p50_ms": round(percentile(ok, 50), 1),
+        "p95_ms": round(percentile(ok, 95), 1),
+        "p99_ms": round(percentile(ok, 99), 1),
+        "endpoints": per_endpoint,
+    }
+
+
+def _status_counts(rows: list) -> dict:
+    counts: dict[str, int] = {}
+    for status, _, _ in rows:
+        key = {-1: "timeout", -2: "conn_error"}.get(status, str(status))
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def find_saturation(steps: list[dict], p99_slo_ms: float, max_error_rate: float) -> float | None:
+    for step in steps:
+        if step["p99_ms"] > p99_slo_ms or step["error_rate"] > max_error_rate:
+            return step["target_rps"]
+    return None
+
+
+def _parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}' in --mix; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def main_async(args):
+    headers = {"X-API-KEY": args.api_key} if args.api_key else {}
+    pdf_bytes = Path(args.pdf).read_bytes() if args.pdf else None
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [q if isinstance(q, str) else q["question"] for q in json.load(f)]
+
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(base_url=args.base_url, headers=headers, limits=limits) as client:
+        if pdf_bytes is not None and not args.skip_setup:
+            resp = await client.post(
+                "/upload", files={"file": (args.doc, pdf_bytes, "application/pdf")}, timeout=600
+            )
+            resp.raise_for_status()
+
+        workload = Workload(_parse_mix(args.mix), args.doc, queries, pdf_bytes, args.deadline_ms)
+        steps = []
+        for rps in [float(r) for r in args.rps.split(",")]:
+            step = await run_step(client, workload, rps, args.duration, args.timeout, args.max_inflight)
+            steps.append(step)
+            print(
+                f"rps={rps:>6} achieved={step['achieved_rps']:>7} err={step['error_rate']:.3f} "
+                f"p50={step['p50_ms']}ms p95={step['p95_ms']}ms p99={step['p99_ms']}ms",
+                file=sys.stderr,
+            )
+            if args.stop_on_saturation and find_saturation([step], args.p99_slo_ms, args.max_error_rate):
+                break
+
+    return {
+        "base_url": args.base_url,
+        "mix": _parse_mix(args.mix),
+        "deadline_ms": args.deadline_ms,
+        "duration_s": args.duration,
+        "saturation_rps": find_saturation(steps, args.p99_slo_ms, args.max_error_rate),
+        "slo": {"p99_ms": args.p99_slo_ms, "max_error_rate": args.max_error_rate},
+        "steps": steps,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a mixed workload against the SecRAG API at stepped RPS.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", default=os.getenv("SECRAG_API_KEY", ""))
+    parser.add_argument("--doc", default="loadtest.pdf", help="Document name queried by retrieve/answer.")
+    parser.add_argument("--pdf", default=None, help="PDF uploaded once as --doc and replayed for upload requests.")
+    parser.add_argument("--skip-setup", action="store_true")
+    parser.add_argument("--queries", default=None, help="JSON list of questions (e.g. a golden dataset).")
+    parser.add_argument("--mix", default=None,
+                        help="Weighted endpoints, e.g. retrieve=6,answer=3 (default adds upload=1 when --pdf is given).")
+    parser.add_argument("--rps", default="1,2,4,8,16", help="Comma-separated target rates, one step each.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step.")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-inflight", type=int, default=512)
+    parser.add_argument("--deadline-ms", type=float, default=None, help="Latency budget sent with /answer requests.")
+    parser.add_argument("--p99-slo-ms", type=float, default=5000.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--stop-on-saturation", action="store_true")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    if args.mix is None:
+        args.mix = "retrieve=6,answer=3,upload=1" if args.pdf else "retrieve=6,answer=3"
+    try:
+        mix = _parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if mix.get("upload", 0) > 0 and not args.pdf:
+        parser.error("upload in the mix requires --pdf")
+
+    report = asyncio.run(main_async(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
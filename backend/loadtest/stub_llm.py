@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+
+LATENCY = {"mean_ms": 500.0, "jitter_ms": 100.0, "per_inflight_ms": 0.0}
+_CHUNK_RE = re.compile(r"\[Chunk (\d+)")
+_inflight = 0
+
+
+async def _sleep():
+    # Like a real provider under load, latency grows with the number of concurrent calls.
+    global _inflight
+    _inflight += 1
+    try:
+        ms = max(0.0, random.gauss(LATENCY["mean_ms"], LATENCY["jitter_ms"]))
+        await asyncio.sleep((ms + LATENCY["per_inflight_ms"] * (_inflight - 1)) / 1000.0)
+    finally:
+        _inflight -= 1
+
+
+def _flatten(value) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(_flatten(v) for v in value)
+    if isinstance(value, dict):
+        return _flatten(value.get("content", ""))
+    return ""
+
+
+def _chat_reply(prompt: str) -> str:
+    if '"supported"' in prompt:
+        return json.dumps({"supported": True, "confidence": 0.9, "reason": "stub verifier"})
+    if '"score"' in prompt:
+        return json.dumps({"score": 4, "reasoning": "stub judge"})
+    if "JSON array of integers" in prompt:
+        n = len(re.findall(r"^\[\d+\]", prompt, flags=re.MULTILINE))
+        return json.dumps([random.randint(1, 10) for _ in range(n)])
+    return "stub"
+
+
+def _answer_reply(prompt: str) -> str:
+    if "JSON array of strings" in prompt:
+        return json.dumps([f"Stub question {i}?" for i in range(1, 7)])
+    context = prompt.split("Context:", 1)[-1]
+    ids = _CHUNK_RE.findall(context)[:3] or ["0"]
+    return " ".join(f"Stub claim drawn from the context [Chunk {cid}]." for cid in ids)
+
+
+def _usage(prompt: str, completion: str) -> dict:
+    p, c = len(prompt) // 4, len(completion) // 4
+    return {"prompt_tokens": p, "completion_tokens": c, "total_tokens": p + c}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    prompt = _flatten(body.get("messages", []))
+    await _sleep()
+    text = _chat_reply(prompt)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": text},
+            "finish_reason": "stop",
+        }],
+        "usage": _usage(prompt, text),
+    }
+
+
+@app.post("/v1/responses")
+async def responses(request: Request):
+    body = await request.json()
+    prompt = _flatten(body.get("input", ""))
+    await _sleep()
+    text = _answer_reply(prompt)
+    usage = _usage(prompt, text)
+    return {
+        "id": f"resp_{uuid.uuid4().hex[:12]}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": body.get("model", "stub"),
+        "status": "completed",
+        "output": [{
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        }],
+        "usage": {
+            "input_tokens": usage["prompt_tokens"],
+            "output_tokens": usage["completion_tokens"],
+            "total_tokens": usage["total_tokens"],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=500.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--per-inflight-ms", type=float, default=0.0,
+                        help="Extra latency per concurrent call, to model a provider slowing down under load.")
+    args = parser.parse_args()
+
+    LATENCY["mean_ms"] = args.latency_ms
+    LATENCY["jitter_ms"] = args.jitter_ms
+    LATENCY["per_inflight_ms"] = args.per_inflight_ms
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
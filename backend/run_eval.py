@@ -1,24 +1,31 @@
+import argparse
 import json
 import os
 import sys
+from pathlib import Path
 
 sys.path.insert(0, os.path.dirname(__file__))
 
+from utils.catalog import get_catalog
 from utils.eval_framework import GoldenDataset, run_eval
 from utils.retriever import retrieve_top_k
 from utils.llm import generate_answer
 from utils.citation_verifier import verify_citations
-from utils.vector_store import get_collection
+from utils.vector_store import collection_count
 
 PDF_NAME = "1810.04805v2.pdf"
 CHROMA_DIR = "../data/chroma"
 DATA_DIR = "../data"
 
+parser = argparse.ArgumentParser(description="Run the BERT golden Q&A eval.")
+parser.add_argument("--checkpoint", default=None,
+                    help="JSONL checkpoint to resume from; rows from a different config are ignored.")
+args = parser.parse_args()
+
 ds = GoldenDataset("data/eval/bert_golden_qa.json")
 print(f"Loaded {len(ds)} questions")
 
-c = get_collection(PDF_NAME, persist_dir=CHROMA_DIR)
-print(f"ChromaDB chunks: {c.count()}")
+print(f"Vector store chunks: {collection_count(PDF_NAME, persist_dir=CHROMA_DIR)}")
 
 def retrieve_fn(query, top_k=5, mode="hybrid"):
     return retrieve_top_k(
@@ -39,6 +46,13 @@ report = run_eval(
     retrieval_mode="hybrid",
     chunk_strategy="sentence",
     run_label="bert_hybrid_sentence_v1",
+    max_workers=int(os.getenv("EVAL_WORKERS", "4")),
+    cache_dir="data/eval/cache",
+    checkpoint_path=args.checkpoint,
+    config={
+        "document": get_catalog(Path(DATA_DIR)).get_document(PDF_NAME),
+        "collection_count": collection_count(PDF_NAME, persist_dir=CHROMA_DIR),
+    },
 )
 
 os.makedirs("data/eval", exist_ok=True)
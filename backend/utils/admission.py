@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+from utils.tracing import record_admission
+
+# Raw setting; unset means "on only when API keys are configured". Use `admission_enabled` for the flag.
+_ADMISSION_ENV = os.getenv("SECRAG_ADMISSION", "").strip().lower()
+
+KEY_RATE = float(os.getenv("SECRAG_KEY_RATE", "20"))
+KEY_BURST = float(os.getenv("SECRAG_KEY_BURST", "40"))
+KEY_CONCURRENCY = int(os.getenv("SECRAG_KEY_CONCURRENCY", "16"))
+EXPENSIVE_COST = float(os.getenv("SECRAG_EXPENSIVE_COST", "5"))
+
+CHEAP_CONCURRENCY = int(os.getenv("SECRAG_CHEAP_CONCURRENCY", "64"))
+CHEAP_QUEUE = int(os.getenv("SECRAG_CHEAP_QUEUE", "256"))
+EXPENSIVE_CONCURRENCY = int(os.getenv("SECRAG_EXPENSIVE_CONCURRENCY", "8"))
+EXPENSIVE_QUEUE = int(os.getenv("SECRAG_EXPENSIVE_QUEUE", "16"))
+QUEUE_TIMEOUT_MS = float(os.getenv("SECRAG_QUEUE_TIMEOUT_MS", "2000"))
+
+MAX_TRACKED_CLIENTS = 10_000
+
+EXEMPT_PATHS = frozenset({"/health", "/metrics", "/docs", "/openapi.json"})
+EXPENSIVE_PATHS = frozenset({"/answer", "/summarize", "/upload", "/search"})
+
+
+def admission_enabled(has_keys: bool) -> bool:
+    """SECRAG_ADMISSION when set; otherwise only with API keys.
+
+    Without keys the limits fall back to one bucket per client address,
+    which would silently cap a keyless deployment and everyone behind a
+    shared NAT or proxy.
+    """
+    if not _ADMISSION_ENV:
+        return has_keys
+    return _ADMISSION_ENV not in {"0", "false", "no"}
+
+
+class KeyLimits:
+    def __init__(self, name: str, rate: float = KEY_RATE, burst: float = KEY_BURST,
+                 concurrency: int = KEY_CONCURRENCY):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+
+
+def parse_api_keys(spec: str, legacy_key: str = "") -> dict[str, KeyLimits]:
+    """Parse `name:key[:rate/burst/concurrency]` entries, comma-separated.
+
+    Omitted limits use the SECRAG_KEY_* defaults. A legacy single
+    SECRAG_API_KEY is accepted as the key named "default".
+    """
+    keys: dict[str, KeyLimits] = {}
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split(":")
+        if len(parts) not in (2, 3) or not parts[0] or not parts[1]:
+            raise ValueError(f"SECRAG_API_KEYS entries must be name:key[:rate/burst/concurrency], got {entry!r}")
+        limits = KeyLimits(parts[0])
+        if len(parts) == 3:
+            rate, burst, concurrency = (parts[2].split("/") + ["", ""])[:3]
+            limits.rate = float(rate) if rate else KEY_RATE
+            limits.burst = float(burst) if burst else max(KEY_BURST, limits.rate)
+            limits.concurrency = int(concurrency) if concurrency else KEY_CONCURRENCY
+        keys[parts[1]] = limits
+    if legacy_key and legacy_key not in keys:
+        keys[legacy_key] = KeyLimits("default")
+    return keys
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Spend `cost` tokens; returns 0 on success, else the seconds until they would be available."""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return 60.0
+        return (cost - self.tokens) / self.rate
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class Lane:
+    """Bounded concurrency with a bounded FIFO queue; full queue or long wait means rejection, not more waiting."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int, timeout_ms: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.timeout_s = timeout_ms / 1000.0
+        self.active = 0
+        self.waiters: deque[asyncio.Future] = deque()
+        self.service_s = 0.5
+
+    def retry_after(self) -> float:
+        return self.service_s * (len(self.waiters) + 1) / max(1, self.concurrency)
+
+    async def acquire(self):
+        if self.active < self.concurrency and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.max_queue:
+            raise Rejected(503, "queue_full", self.retry_after())
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append(fut)
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.timeout_s)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # The slot was handed over just as the wait expired; keep it.
+                return
+            fut.cancel()
+            self._discard(fut)
+            raise Rejected(503, "queue_timeout", self.retry_after())
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self.release()
+            else:
+                fut.cancel()
+                self._discard(fut)
+            raise
+
+    def _discard(self, fut: asyncio.Future):
+        try:
+            self.waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def release(self, service_s: float | None = None):
+        if service_s is not None:
+            self.service_s = 0.8 * self.service_s + 0.2 * service_s
+        while self.waiters:
+            fut = self.waiters.popleft()
+            if not fut.done():
+                # Hand the slot straight to the next waiter; `active` is unchanged.
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+class Ticket:
+    def __init__(self, controller: "AdmissionController", identity: str | None, lane: Lane):
+        self.controller = controller
+        self.identity = identity
+        self.lane = lane
+        self.started = time.monotonic()
+
+    def release(self):
+        self.controller._release(self)
+
+
+class AdmissionController:
+    """Per-key token buckets and concurrency caps in front of a cheap and an expensive lane.
+
+    State lives in the event loop of one server process, so with several
+    workers each limit applies per worker.
+    """
+
+    def __init__(self, keys: dict[str, KeyLimits] | None = None,
+                 cheap: tuple[int, int] = (CHEAP_CONCURRENCY, CHEAP_QUEUE),
+                 expensive: tuple[int, int] = (EXPENSIVE_CONCURRENCY, EXPENSIVE_QUEUE),
+                 queue_timeout_ms: float = QUEUE_TIMEOUT_MS):
+        self.keys = keys or {}
+        self.lanes = {
+            "cheap": Lane("cheap", cheap[0], cheap[1], queue_timeout_ms),
+            "expensive": Lane("expensive", expensive[0], expensive[1], queue_timeout_ms),
+        }
+        self._buckets: dict[str, TokenBucket] = {}
+        self._in_flight: dict[str, int] = {}
+
+    def authenticate(self, api_key: str) -> KeyLimits | None:
+        return self.keys.get(api_key)
+
+    @staticmethod
+    def lane_for(path: str) -> str | None:
+        if path in EXEMPT_PATHS:
+            return None
+        return "expensive" if path in EXPENSIVE_PATHS else "cheap"
+
+    async def admit(self, identity: str, limits: KeyLimits, path: str, trusted: bool = False) -> Ticket | None:
+        """Admit a request or raise `Rejected`; exempt paths return None.
+
+        `trusted` callers (a coordinator presenting the shard key, whose
+        request was already admitted there) skip the per-key limits but
+        still wait for a lane slot.
+        """
+        lane_name = self.lane_for(path)
+        if lane_name is None:
+            return None
+        lane = self.lanes[lane_name]
+
+        if trusted:
+            try:
+                await lane.acquire()
+            except Rejected as e:
+                record_admission(lane_name, e.reason)
+                raise
+            record_admission(lane_name, "admitted")
+            return Ticket(self, None, lane)
+
+        if self._in_flight.get(identity, 0) >= limits.concurrency:
+            record_admission(lane_name, "concurrency_limited")
+            raise Rejected(429, "concurrency_limited", lane.service_s)
+        bucket = self._buckets.get(identity)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._prune()
+            bucket = self._buckets[identity] = TokenBucket(limits.rate, limits.burst)
+        wait_s = bucket.take(EXPENSIVE_COST if lane_name == "expensive" else 1.0)
+        if wait_s > 0:
+            record_admission(lane_name, "rate_limited")
+            raise Rejected(429, "rate_limited", wait_s)
+
+        # Counted before queueing, so one key cannot fill a lane's queue past its own cap.
+        self._in_flight[identity] = self._in_flight.get(identity, 0) + 1
+        try:
+            await lane.acquire()
+        except Rejected as e:
+            self._dec(identity)
+            record_admission(lane_name, e.reason)
+            raise
+        except BaseException:
+            self._dec(identity)
+            raise
+        record_admission(lane_name, "admitted")
+        return Ticket(self, identity, lane)
+
+    def _prune(self):
+        # A bucket that has refilled completely carries no state worth keeping.
+        now = time.monotonic()
+        for identity, b in list(self._buckets.items()):
+            if identity not in self._in_flight and b.tokens + (now - b.updated) * b.rate >= b.burst:
+                del self._buckets[identity]
+
+    def _dec(self, identity: str):
+        n = self._in_flight.get(identity, 0) - 1
+        if n > 0:
+            self._in_flight[identity] = n
+        else:
+            self._in_flight.pop(identity, None)
+
+    def _release(self, ticket: Ticket):
+        ticket.lane.release(time.monotonic() - ticket.started)
+        if ticket.identity is not None:
+            self._dec(ticket.identity)
+
+    def snapshot(self) -> dict:
+        return {
+            name: {"active": lane.active, "queued": len(lane.waiters), "concurrency": lane.concurrency}
+            for name, lane in self.lanes.items()
+        }
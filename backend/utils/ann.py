@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from utils.tracing import record_cache
+
+logger = logging.getLogger("secrag.ann")
+
+ANN_MIN_ROWS = int(os.getenv("SECRAG_ANN_MIN_ROWS", "20000"))
+ANN_NPROBE = int(os.getenv("SECRAG_ANN_NPROBE", "32"))
+_ASSIGN_BLOCK = 65536
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return (x / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK):
+        block = np.asarray(vectors[start:start + _ASSIGN_BLOCK], dtype=np.float32)
+        out[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = 12, seed: int = 0,
+                    max_train: int = 256_000) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    n = len(vectors)
+    sample_idx = rng.choice(n, size=min(n, max(nlist * 64, 1), max_train), replace=False)
+    sample = np.asarray(vectors[np.sort(sample_idx)], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        empty = ~filled
+        if empty.any():
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, ids: np.ndarray, meta: dict):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.ids = ids
+        self.meta = meta
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: int | None = None, iters: int = 12, seed: int = 0) -> "IVFIndex":
+        n = len(vectors)
+        nlist = nlist or max(1, min(n, int(4 * np.sqrt(n))))
+        centroids = train_centroids(vectors, nlist, iters=iters, seed=seed)
+        labels = _assign(vectors, centroids)
+        ids = np.argsort(labels, kind="stable").astype(np.int32)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))]).astype(np.int64)
+        return cls(centroids, offsets, ids, {"rows": n, "dim": int(vectors.shape[1])})
+
+    def search(self, vectors: np.ndarray, query: np.ndarray, top_k: int, nprobe: int | None = None
+               ) -> tuple[np.ndarray, np.ndarray]:
+        q = np.atleast_2d(query).astype(np.float32)
+        nprobe = max(1, min(nprobe or ANN_NPROBE, self.nlist))
+        coarse = q @ self.centroids.T
+        probes = np.argpartition(-coarse, nprobe - 1, axis=1)[:, :nprobe]
+
+        all_idx = np.full((len(q), top_k), -1, dtype=np.int64)
+        all_scores = np.full((len(q), top_k), -np.inf, dtype=np.float32)
+        for row, lists in enumerate(probes):
+            cand = np.concatenate([self.ids[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+            if len(cand) == 0:
+                continue
+            cand.sort()
+            scores = np.asarray(vectors[cand], dtype=np.float32) @ q[row]
+            k = min(top_k, len(cand))
+            part = np.argpartition(-scores, k - 1)[:k]
+            part = part[np.argsort(-scores[part])]
+            all_idx[row, :k] = cand[part]
+            all_scores[row, :k] = scores[part]
+        return all_idx, all_scores
+
+    def save(self, path: Path, source: Path | None = None):
+        if source is not None:
+            st = source.stat()
+            self.meta.update({"source_size": st.st_size, "source_mtime": st.st_mtime})
+        meta = self.meta
+        tmp = path.with_name(path.name + ".tmp.npz")
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            offsets=self.offsets,
+            ids=self.ids,
+            meta=np.array([meta.get("rows", 0), meta.get("dim", 0), meta.get("source_size", -1)], dtype=np.int64),
+            source_mtime=np.array([meta.get("source_mtime", -1.0)], dtype=np.float64),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as data:
+            rows, dim, source_size = (int(v) for v in data["meta"])
+            meta = {"rows": rows, "dim": dim, "source_size": source_size,
+                    "source_mtime": float(data["source_mtime"][0])}
+            return cls(data["centroids"], data["offsets"], data["ids"], meta)
+
+    def matches(self, source: Path) -> bool:
+        st = source.stat()
+        return self.meta.get("source_size") == st.st_size and self.meta.get("source_mtime") == st.st_mtime
+
+
+def ann_path_for(embeddings_path: Path) -> Path:
+    name = embeddings_path.name
+    stem = name[: -len("_embedding.npy")] if name.endswith("_embedding.npy") else embeddings_path.stem
+    return embeddings_path.with_name(f"{stem}_ivf.npz")
+
+
+_cache: dict[str, IVFIndex] = {}
+_building: set[str] = set()
+_lock = threading.Lock()
+
+
+def invalidate(ann_path: Path):
+    with _lock:
+        _cache.pop(str(ann_path), None)
+
+
+def build_index_for(embeddings_path: Path, ann_path: Path, vectors: np.ndarray | None = None) -> IVFIndex:
+    if vectors is None:
+        vectors = np.load(embeddings_path, mmap_mode="r")
+    index = IVFIndex.build(vectors)
+    index.save(ann_path, source=embeddings_path)
+    logger.info(f"ANN: built IVF index with {index.nlist} lists over {len(vectors)} rows -> {ann_path.name}")
+    return index
+
+
+def _build_in_background(embeddings_path: Path, ann_path: Path, on_built: Callable[[Path], None] | None):
+    key = str(ann_path)
+    with _lock:
+        if key in _building:
+            return
+        _building.add(key)
+
+    def run():
+        try:
+            index = build_index_for(embeddings_path, ann_path)
+            with _lock:
+                _cache[key] = index
+            if on_built is not None:
+                on_built(ann_path)
+        except Exception as e:
+            logger.warning(f"ANN: background build of {ann_path.name} failed: {e}")
+        finally:
+            with _lock:
+                _building.discard(key)
+
+    threading.Thread(target=run, name="ann-build", daemon=True).start()
+
+
+def get_index(embeddings_path: Path, ann_path: Path, rows: int, build_missing: bool = True,
+              on_built: Callable[[Path], None] | None = None) -> IVFIndex | None:
+    """The document's IVF index, or None when it is too small for one or the index is not built yet.
+
+    Indexes are normally built at upload. A missing or stale one is never
+    trained inside the request: with `build_missing` it is built on a
+    background thread (then `on_built(ann_path)` runs) and callers search
+    exactly until it is ready.
+    """
+    if rows < ANN_MIN_ROWS:
+        return None
+    key = str(ann_path)
+    index = _cache.get(key)
+    if index is not None and index.matches(embeddings_path):
+        record_cache("ann_index", True)
+        return index
+    record_cache("ann_index", False)
+    with _lock:
+        index = None
+        if ann_path.exists():
+            try:
+                index = IVFIndex.load(ann_path)
+            except Exception as e:
+                logger.warning(f"ANN: failed to load {ann_path.name} ({e}), rebuilding")
+            if index is not None and not index.matches(embeddings_path):
+                index = None
+        if index is not None:
+            _cache[key] = index
+            return index
+    if build_missing:
+        _build_in_background(embeddings_path, ann_path, on_built)
+    return None
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from utils.bm25 import BM25Index, build_bm25
+from utils.filters import ChunkColumns
+from utils.tracing import record_cache
+
+ARTIFACT_CACHE_SIZE = int(os.getenv("SECRAG_ARTIFACT_CACHE", "32"))
+
+
+def load_chunks(chunks_path: Path) -> list[dict]:
+    with open(chunks_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, list):
+        raise ValueError("Chunks JSON must be a list")
+    return data
+
+
+def load_embeddings(embeddings_path: Path) -> np.ndarray:
+    emb = np.load(embeddings_path, mmap_mode="r")
+    if emb.ndim != 2:
+        raise ValueError("Embeddings must be 2D (num_chunks, dim)")
+    if emb.dtype != np.float32:
+        emb = emb.astype(np.float32)
+    return emb
+
+
+def save_npy_atomic(path: Path, array: np.ndarray):
+    """Write via a temp file + rename so hard-linked copies of `path` are never modified in place."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path)
+
+
+def _signature(*paths: Path) -> tuple:
+    out = []
+    for p in paths:
+        st = p.stat()
+        out.append((st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+
+def document_version(chunks_path: Path, embeddings_path: Path) -> tuple:
+    """Changes whenever a document's artifacts are rewritten (re-upload, re-embed)."""
+    return _signature(chunks_path, embeddings_path)
+
+
+class DocumentArtifacts:
+    """Parsed chunks, memory-mapped embeddings and derived indexes for one `.npy` document.
+
+    Instances are immutable once built and are shared by every request (and,
+    when warmed before fork, by every worker process).
+    """
+
+    def __init__(self, chunks_path: Path, embeddings_path: Path):
+        self.chunks_path = chunks_path
+        self.embeddings_path = embeddings_path
+        self.signature = _signature(chunks_path, embeddings_path)
+        self.chunks = load_chunks(chunks_path)
+        self.embeddings = load_embeddings(embeddings_path)
+        self._bm25: BM25Index | None = None
+        self._columns: ChunkColumns | None = None
+        self._quantized = None
+        self._lock = threading.Lock()
+
+    @property
+    def bm25(self) -> BM25Index:
+        if self._bm25 is None:
+            with self._lock:
+                if self._bm25 is None:
+                    self._bm25 = build_bm25(self.chunks)
+        return self._bm25
+
+    @property
+    def columns(self) -> ChunkColumns:
+        if self._columns is None:
+            with self._lock:
+                if self._columns is None:
+                    self._columns = ChunkColumns(self.chunks)
+        return self._columns
+
+
+    @property
+    def quantized(self):
+        """The int8/float16 scan copy (`QuantizedEmbeddings`), or None when there is none for these embeddings.
+
+        A missing copy is looked up again on the next call, since upload
+        writes it just after the embeddings.
+        """
+        if self._quantized is None:
+            from utils.quantization import load_quantized
+
+            with self._lock:
+                if self._quantized is None:
+                    self._quantized = load_quantized(self.embeddings_path)
+        return self._quantized
+
+
+_cache: OrderedDict[str, DocumentArtifacts] = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_artifacts(chunks_path: Path, embeddings_path: Path) -> DocumentArtifacts:
+    key = str(chunks_path)
+    signature = _signature(chunks_path, embeddings_path)
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry.signature == signature:
+            _cache.move_to_end(key)
+            record_cache("artifacts", True)
+            return entry
+    record_cache("artifacts", False)
+    entry = DocumentArtifacts(chunks_path, embeddings_path)
+    with _lock:
+        _cache[key] = entry
+        _cache.move_to_end(key)
+        while len(_cache) > ARTIFACT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return entry
+
+
+def invalidate(chunks_path: Path):
+    with _lock:
+        _cache.pop(str(chunks_path), None)
@@ -1,14 +1,116 @@
-from rank_bm25 import BM25Okapi
+from __future__ import annotations
 
+import numpy as np
 
-def tokenize(text: str):
-    return [t for t in text.lower().split() if t.strip()]
+from utils.tokenizer import Tokenizer, Vocabulary, get_tokenizer
+
+
+def tokenize(text: str, tokenizer: Tokenizer | None = None):
+    return (tokenizer or get_tokenizer()).tokenize(text)
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25, tokenizer: Tokenizer | None = None):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.vocab = Vocabulary()
+        self.num_docs = 0
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.term_ptr = np.zeros(1, dtype=np.int64)
+        self.post_docs = np.zeros(0, dtype=np.int32)
+        self.post_tf = np.zeros(0, dtype=np.float32)
+        self.idf = np.zeros(0, dtype=np.float32)
+        self._norm = np.zeros(0, dtype=np.float32)
+
+    def fit(self, texts: list[str]) -> "BM25Index":
+        n = len(texts)
+        encoded = [self.vocab.add(self.tokenizer.tokenize(text or "")) for text in texts]
+        doc_len = np.fromiter((len(ids) for ids in encoded), dtype=np.float32, count=n)
+        vocab_size = len(self.vocab)
+
+        if vocab_size:
+            term_ids = np.concatenate(encoded).astype(np.int64)
+            doc_ids = np.repeat(np.arange(n, dtype=np.int64), doc_len.astype(np.int64))
+            keys, counts = np.unique(term_ids * n + doc_ids, return_counts=True)
+            terms = keys // n
+            docs = (keys % n).astype(np.int32)
+            tfs = counts.astype(np.float32)
+            df = np.bincount(terms, minlength=vocab_size)
+        else:
+            docs = np.zeros(0, dtype=np.int32)
+            tfs = np.zeros(0, dtype=np.float32)
+            df = np.zeros(0, dtype=np.int64)
+
+        self.num_docs = n
+        self.doc_len = doc_len
+        self.term_ptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.post_docs = docs
+        self.post_tf = tfs
+
+        idf = np.log((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        if len(idf):
+            eps = self.epsilon * float(idf.mean())
+            idf[idf < 0] = eps
+        self.idf = idf
+
+        avgdl = float(doc_len.mean()) if n else 0.0
+        if avgdl > 0:
+            self._norm = (self.k1 * (1.0 - self.b + self.b * doc_len / avgdl)).astype(np.float32)
+        else:
+            self._norm = np.full(n, self.k1, dtype=np.float32)
+        return self
+
+    def query_ids(self, query: str) -> np.ndarray:
+        return self.vocab.lookup(self.tokenizer.tokenize(query or ""))
+
+    def get_scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for tid in self.query_ids(query):
+            lo, hi = self.term_ptr[tid], self.term_ptr[tid + 1]
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tf[lo:hi]
+            scores[docs] += self.idf[tid] * tf * (self.k1 + 1.0) / (tf + self._norm[docs])
+        return scores
+
+    def top_k(self, query: str, k: int, allowed: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        tids = self.query_ids(query)
+        if len(tids) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        doc_parts, contrib_parts = [], []
+        for tid in tids:
+            lo, hi = self.term_ptr[tid], self.term_ptr[tid + 1]
+            if hi == lo:
+                continue
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tf[lo:hi]
+            if allowed is not None:
+                keep = allowed[docs]
+                docs, tf = docs[keep], tf[keep]
+                if len(docs) == 0:
+                    continue
+            doc_parts.append(docs)
+            contrib_parts.append(self.idf[tid] * tf * (self.k1 + 1.0) / (tf + self._norm[docs]))
+        if not doc_parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        touched, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(contrib_parts)).astype(np.float32)
+        k = min(k, len(touched))
+        part = np.argpartition(-scores, k - 1)[:k]
+        part = part[np.argsort(-scores[part], kind="stable")]
+        return touched[part].astype(np.int32), scores[part]
+
+    def nbytes(self) -> int:
+        return int(
+            self.doc_len.nbytes + self.term_ptr.nbytes + self.post_docs.nbytes
+            + self.post_tf.nbytes + self.idf.nbytes + self._norm.nbytes
+        )
 
 
 def build_bm25(chunks: list):
-    tokenized_corpus = [tokenize(c.get("content", "")) for c in chunks]
-    return BM25Okapi(tokenized_corpus)
+    return BM25Index().fit([c.get("content", "") for c in chunks])
 
 
-def bm25_scores(bm25: BM25Okapi, query: str):
-    return bm25.get_scores(tokenize(query))
\ No newline at end of file
+def bm25_scores(bm25: BM25Index, query: str):
+    return bm25.get_scores(query)
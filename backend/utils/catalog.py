@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+import numpy as np
+
+from utils.naming import get_all_related_paths, get_artifact_paths
+
+_INGESTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS ingestions (
+    filename       TEXT    PRIMARY KEY,
+    sha256         TEXT    NOT NULL,
+    chunk_strategy TEXT    NOT NULL,
+    chunk_size     INTEGER NOT NULL,
+    stats_json     TEXT    NOT NULL,
+    created_at     REAL    NOT NULL
+)"""
+
+_SCHEMA = _INGESTIONS_TABLE + """;
+CREATE INDEX IF NOT EXISTS ingestions_content ON ingestions (sha256, chunk_strategy, chunk_size);
+CREATE TABLE IF NOT EXISTS documents (
+    filename         TEXT PRIMARY KEY,
+    sha256           TEXT,
+    chunk_strategy   TEXT,
+    chunk_size       INTEGER,
+    total_chunks     INTEGER NOT NULL,
+    embedding_dim    INTEGER NOT NULL,
+    total_characters INTEGER,
+    total_pages      INTEGER,
+    size_bytes       INTEGER,
+    artifacts_json   TEXT    NOT NULL,
+    timings_json     TEXT    NOT NULL,
+    ingested_at      REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_DOCUMENT_COLUMNS = (
+    "filename", "sha256", "chunk_strategy", "chunk_size", "total_chunks", "embedding_dim",
+    "total_characters", "total_pages", "size_bytes", "artifacts_json", "timings_json", "ingested_at",
+)
+
+
+def _document_from_row(row: sqlite3.Row) -> dict:
+    doc = {k: row[k] for k in _DOCUMENT_COLUMNS if not k.endswith("_json")}
+    doc["artifacts"] = json.loads(row["artifacts_json"])
+    doc["timings_ms"] = json.loads(row["timings_json"])
+    return doc
+
+
+class Catalog:
+    """SQLite registry of ingested documents, shared by every worker process.
+
+    `ingestions` records the content hash + chunking config behind each
+    filename's artifacts, so an identical upload can reuse any of them;
+    `documents` holds one row per servable document so listing, stats and
+    deletion never touch the data directory.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._migrate_ingestions(conn)
+            conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _migrate_ingestions(conn: sqlite3.Connection):
+        """Re-key `ingestions` by filename; it used to hold one filename per content hash."""
+        conn.execute("BEGIN IMMEDIATE")
+        pk = [r["name"] for r in conn.execute("PRAGMA table_info(ingestions)") if r["pk"]]
+        if pk and pk != ["filename"]:
+            conn.execute("DROP INDEX IF EXISTS ingestions_filename")
+            conn.execute("ALTER TABLE ingestions RENAME TO ingestions_v1")
+            conn.execute(_INGESTIONS_TABLE)
+            conn.execute(
+                "INSERT OR REPLACE INTO ingestions "
+                "(filename, sha256, chunk_strategy, chunk_size, stats_json, created_at) "
+                "SELECT filename, sha256, chunk_strategy, chunk_size, stats_json, created_at FROM ingestions_v1"
+            )
+            conn.execute("DROP TABLE ingestions_v1")
+        conn.commit()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def find_ingestion(self, sha256: str, chunk_strategy: str, chunk_size: int) -> dict | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT filename, stats_json, created_at FROM ingestions "
+                "WHERE sha256 = ? AND chunk_strategy = ? AND chunk_size = ? ORDER BY created_at LIMIT 1",
+                (sha256, chunk_strategy, chunk_size),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"filename": row["filename"], "stats": json.loads(row["stats_json"]), "created_at": row["created_at"]}
+
+    def record_ingestion(self, sha256: str, chunk_strategy: str, chunk_size: int, filename: str, stats: dict):
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingestions "
+                "(filename, sha256, chunk_strategy, chunk_size, stats_json, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (filename, sha256, chunk_strategy, chunk_size, json.dumps(stats), time.time()),
+            )
+
+    def forget_filename(self, filename: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM ingestions WHERE filename = ?", (filename,))
+
+    def upsert_document(self, doc: dict):
+        values = {k: doc.get(k) for k in _DOCUMENT_COLUMNS if not k.endswith("_json")}
+        values["artifacts_json"] = json.dumps(doc.get("artifacts", []))
+        values["timings_json"] = json.dumps(doc.get("timings_ms", {}))
+        values["ingested_at"] = doc.get("ingested_at") or time.time()
+        cols = ", ".join(_DOCUMENT_COLUMNS)
+        marks = ", ".join("?" for _ in _DOCUMENT_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO documents ({cols}) VALUES ({marks})",
+                tuple(values[k] for k in _DOCUMENT_COLUMNS),
+            )
+
+    def add_artifact(self, filename: str, path: Path) -> bool:
+        """Attach a file created after ingestion to a document; False if the document is not in the catalog."""
+        path = Path(path)
+        entry = {"name": path.name, "path": str(path), "bytes": path.stat().st_size}
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT artifacts_json FROM documents WHERE filename = ?", (filename,)).fetchone()
+            if row is None:
+                return False
+            artifacts = [a for a in json.loads(row["artifacts_json"]) if a["name"] != path.name]
+            conn.execute(
+                "UPDATE documents SET artifacts_json = ? WHERE filename = ?",
+                (json.dumps(artifacts + [entry]), filename),
+            )
+        return True
+
+    def get_document(self, filename: str) -> dict | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return _document_from_row(row) if row is not None else None
+
+    def list_documents(self, limit: int = 100, after: str | None = None) -> tuple[list[dict], str | None]:
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE filename > ? ORDER BY filename LIMIT ?",
+                (after or "", limit + 1),
+            ).fetchall()
+        docs = [_document_from_row(r) for r in rows[:limit]]
+        next_cursor = docs[-1]["filename"] if len(rows) > limit else None
+        return docs, next_cursor
+
+    def document_names(self) -> list[str]:
+        with closing(self._connect()) as conn:
+            return [r["filename"] for r in conn.execute("SELECT filename FROM documents ORDER BY filename")]
+
+    def count_documents(self) -> int:
+        with closing(self._connect()) as conn:
+            return int(conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0])
+
+    def delete_document(self, filename: str) -> dict | None:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+            conn.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+            conn.execute("DELETE FROM ingestions WHERE filename = ?", (filename,))
+        return _document_from_row(row) if row is not None else None
+
+    def get_meta(self, key: str) -> str | None:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row is not None else None
+
+    def set_meta(self, key: str, value: str):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+
+_catalogs: dict[str, Catalog] = {}
+_lock = threading.Lock()
+
+
+def get_catalog(data_dir: Path) -> Catalog:
+    path = Path(data_dir) / "catalog.sqlite3"
+    key = str(path)
+    with _lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = Catalog(path)
+        return catalog
+
+
+def build_document_record(filename: str, data_dir: Path, total_chunks: int | None = None,
+                          embedding_dim: int | None = None, **fields) -> dict:
+    data_dir = Path(data_dir)
+    artifacts = []
+    for path in get_all_related_paths(filename, data_dir):
+        if path.is_file():
+            artifacts.append({"name": path.name, "path": str(path), "bytes": path.stat().st_size})
+    chunk_path, emb_path = get_artifact_paths(filename, data_dir)
+    if total_chunks is None:
+        with open(chunk_path, "r", encoding="utf-8") as f:
+            total_chunks = len(json.load(f))
+    if embedding_dim is None:
+        emb = np.load(emb_path, mmap_mode="r")
+        embedding_dim = int(emb.shape[1]) if emb.ndim == 2 else 0
+    return {
+        **fields,
+        "filename": filename,
+        "total_chunks": int(total_chunks),
+        "embedding_dim": int(embedding_dim),
+        "artifacts": artifacts,
+        "ingested_at": fields.get("ingested_at") or max(chunk_path.stat().st_mtime, emb_path.stat().st_mtime),
+    }
+
+
+def backfill_documents(catalog: Catalog, data_dir: Path) -> int:
+    """One-time import of documents ingested before the catalog existed."""
+    if catalog.get_meta("documents_backfilled") is not None:
+        return 0
+    added = 0
+    for pdf in sorted(Path(data_dir).glob("*.pdf")):
+        if catalog.get_document(pdf.name) is not None:
+            continue
+        if not all(p.exists() for p in get_artifact_paths(pdf.name, data_dir)):
+            continue
+        catalog.upsert_document(build_document_record(pdf.name, data_dir, size_bytes=pdf.stat().st_size))
+        added += 1
+    catalog.set_meta("documents_backfilled", str(time.time()))
+    return added
+
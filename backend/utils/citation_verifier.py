@@ -3,12 +3,34 @@ from __future__ import annotations
 import os
 import re
 import json
+import time
 import logging
 
+import numpy as np
+
+from utils import inference_pool
+from utils.deadline import costs, current_deadline
+from utils.tokenizer import Tokenizer
+from utils.tracing import observe_batch, record_event, span
+
 logger = logging.getLogger("secrag.citation_verifier")
 
 _CITATION_RE = re.compile(r"\[(?:Chunk\s*)?(\d+)\]", re.IGNORECASE)
 
+VERIFIER_MODES = ("local", "llm")
+VERIFIER_MODE = os.getenv("SECRAG_CITATION_VERIFIER", "local").strip().lower()
+NLI_MODEL = os.getenv("SECRAG_NLI_MODEL", "cross-encoder/nli-deberta-v3-xsmall")
+LEXICAL_ACCEPT = float(os.getenv("SECRAG_VERIFY_LEXICAL_ACCEPT", "0.9"))
+AMBIGUOUS_MARGIN = float(os.getenv("SECRAG_VERIFY_AMBIGUOUS_MARGIN", "0.2"))
+PREMISE_CHARS = 1200
+
+if VERIFIER_MODE not in VERIFIER_MODES:
+    raise ValueError(f"SECRAG_CITATION_VERIFIER must be one of {VERIFIER_MODES}")
+
+_lexical = Tokenizer(use_stemming=True, remove_stopwords=True)
+_NEGATIONS = frozenset({"not", "no", "never", "none", "nor", "without", "cannot", "neither"})
+_SKIPPED = {"supported": True, "confidence": 0.5, "reason": "not verified: deadline", "method": "skipped"}
+
 
 def parse_citations(answer_text: str) -> list[dict]:
     sentences = re.split(r"(?<=[.!?])\s+", answer_text)
@@ -55,13 +77,187 @@ def _verify_single(claim: str, chunk_content: str, client) -> dict:
         return {"supported": True, "confidence": 0.5, "reason": "verification skipped"}
 
 
-def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
+_nli_model = None
+_nli_available = None
+
+
+def _get_nli_model():
+    global _nli_model, _nli_available
+    if _nli_available is None:
+        try:
+            from sentence_transformers import CrossEncoder
+            _nli_model = CrossEncoder(NLI_MODEL)
+            _nli_available = True
+            logger.info(f"Citation verifier: NLI model {NLI_MODEL} loaded")
+        except Exception as e:
+            _nli_available = False
+            logger.warning(f"Citation verifier: NLI model unavailable ({e}), escalating non-lexical claims to LLM")
+    return _nli_model if _nli_available else None
+
+
+def _label_index(model, name: str, default: int) -> int:
+    id2label = getattr(getattr(getattr(model, "model", None), "config", None), "id2label", None) or {}
+    for idx, label in id2label.items():
+        if str(label).lower().startswith(name):
+            return int(idx)
+    return default
+
+
+def nli_predict_local(pairs: list[tuple[str, str]]) -> np.ndarray:
+    """(premise, hypothesis) pairs -> (n, 2) array of [P(entailment), P(contradiction)]."""
+    model = _get_nli_model()
+    if model is None:
+        raise RuntimeError("NLI model unavailable")
+    observe_batch("nli", len(pairs))
+    logits = np.asarray(model.predict(pairs, apply_softmax=False), dtype=np.float32).reshape(len(pairs), -1)
+    if logits.shape[1] < 2:
+        raise RuntimeError(f"{NLI_MODEL} is not a multi-class NLI model")
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    probs /= probs.sum(axis=1, keepdims=True)
+    entail = _label_index(model, "entail", 1)
+    contra = _label_index(model, "contra", 0)
+    return np.stack([probs[:, entail], probs[:, contra]], axis=1)
+
+
+def _nli_scores(pairs: list[tuple[str, str]]) -> np.ndarray | None:
+    try:
+        if inference_pool.get_pool() is not None:
+            return inference_pool.nli(pairs)
+        if _get_nli_model() is None:
+            return None
+        return nli_predict_local(pairs)
+    except Exception as e:
+        logger.warning(f"Citation verifier: NLI scoring failed ({e})")
+        return None
+
+
+def _strip_citations(claim: str) -> str:
+    return _CITATION_RE.sub("", claim).strip()
+
+
+def lexical_support(claim: str, chunk_content: str) -> float:
+    """Fraction of the claim's content terms found in the chunk; 0 when a negation is not in the chunk."""
+    claim_terms = set(_lexical.tokenize(claim))
+    if len(claim_terms) < 3:
+        return 0.0
+    words = set(re.findall(r"[a-z']+", claim.lower()))
+    chunk_words = set(re.findall(r"[a-z']+", chunk_content.lower()))
+    if any((w in _NEGATIONS or w.endswith("n't")) and w not in chunk_words for w in words):
+        return 0.0
+    return len(claim_terms & set(_lexical.tokenize(chunk_content))) / len(claim_terms)
+
+
+def _llm_client():
     try:
         from openai import OpenAI
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
     except Exception as e:
         logger.error(f"Citation verifier: OpenAI unavailable ({e})")
-        return _passthrough(answer_text)
+        return None
+
+
+def _verify_local(pending: list[tuple[int, str, str]]) -> dict[int, dict]:
+    """Lexical fast path, one batched NLI call for the rest, LLM only for ambiguous pairs."""
+    verdicts: dict[int, dict] = {}
+    to_model = []
+    for i, claim, content in pending:
+        coverage = lexical_support(claim, content)
+        if coverage >= LEXICAL_ACCEPT:
+            verdicts[i] = {
+                "supported": True,
+                "confidence": round(coverage, 3),
+                "reason": f"{coverage:.0%} of claim terms appear in the source",
+                "method": "lexical",
+            }
+        else:
+            to_model.append((i, claim, content))
+
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.enter("verify_nli")
+        if to_model and deadline.affordable_units("verify_nli") < 1:
+            # Lexical verdicts only; the rest are reported unverified.
+            deadline.degrade("verification_sampled")
+            costs.relax("verify_nli")
+            for i, _, _ in to_model:
+                verdicts[i] = dict(_SKIPPED)
+            to_model = []
+
+    ambiguous = []
+    if to_model:
+        start = time.perf_counter()
+        with span("verify_nli"):
+            scores = _nli_scores([(content[:PREMISE_CHARS], claim) for _, claim, content in to_model])
+        costs.observe("verify_nli", (time.perf_counter() - start) * 1000.0)
+        for row, (i, claim, content) in enumerate(to_model):
+            if scores is None:
+                ambiguous.append((i, claim, content))
+                continue
+            entail, contra = float(scores[row, 0]), float(scores[row, 1])
+            supported = entail >= 0.5
+            verdicts[i] = {
+                "supported": supported,
+                "confidence": round(entail if supported else 1.0 - entail, 3),
+                "reason": f"entailment {entail:.2f}, contradiction {contra:.2f}",
+                "method": "nli",
+            }
+            if abs(entail - 0.5) < AMBIGUOUS_MARGIN:
+                ambiguous.append((i, claim, content))
+
+    if ambiguous and deadline is not None:
+        affordable = deadline.affordable_units("verify_llm")
+        if affordable < len(ambiguous):
+            # Escalate the closest calls first; the others keep their NLI verdict.
+            deadline.degrade("verification_sampled")
+            costs.relax("verify_llm")
+            ambiguous.sort(key=lambda a: abs(verdicts[a[0]]["confidence"] - 0.5) if a[0] in verdicts else 0.0)
+            for i, _, _ in ambiguous[affordable:]:
+                verdicts.setdefault(i, dict(_SKIPPED))
+            ambiguous = ambiguous[:affordable]
+
+    if ambiguous:
+        client = _llm_client()
+        if client is not None:
+            with span("verify_llm"):
+                for i, claim, content in ambiguous:
+                    record_event("citation_llm_escalation")
+                    verdicts[i] = {**_timed_verify(claim, content, client), "method": "llm"}
+        for i, claim, content in ambiguous:
+            verdicts.setdefault(i, {
+                "supported": True, "confidence": 0.5, "reason": "verification skipped", "method": "none",
+            })
+    return verdicts
+
+
+def _timed_verify(claim: str, chunk_content: str, client) -> dict:
+    start = time.perf_counter()
+    verdict = _verify_single(claim, chunk_content, client)
+    costs.observe("verify_llm", (time.perf_counter() - start) * 1000.0)
+    return verdict
+
+
+def _llm_sample(citations: list[dict]) -> set[int]:
+    """Indices of the citations the LLM verifier has time for, spread evenly over the answer."""
+    deadline = current_deadline()
+    if deadline is None:
+        return set(range(len(citations)))
+    deadline.enter("verify_nli")
+    affordable = deadline.affordable_units("verify_llm")
+    if affordable >= len(citations):
+        return set(range(len(citations)))
+    deadline.degrade("verification_sampled")
+    costs.relax("verify_llm")
+    if affordable <= 0:
+        return set()
+    return {int(round(x)) for x in np.linspace(0, len(citations) - 1, affordable)}
+
+
+def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
+    client = None
+    if VERIFIER_MODE == "llm":
+        client = _llm_client()
+        if client is None:
+            return _passthrough(answer_text)
 
     chunk_map = _build_chunk_map(retrieved)
     citations_found = parse_citations(answer_text)
@@ -73,10 +269,13 @@ def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
             "citations": [],
             "unsupported_count": 0,
             "total_citations": 0,
+            "verified_citations": 0,
         }
 
     citation_results = []
-    for cit in citations_found:
+    pending = []
+    sample = _llm_sample(citations_found) if client is not None else None
+    for n, cit in enumerate(citations_found):
         cid = cit["chunk_id"]
         content = chunk_map.get(cid, "")
         if not content:
@@ -87,13 +286,20 @@ def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
                 "confidence": 0.0,
                 "reason": "Referenced chunk not in retrieved context",
             })
-        else:
-            verdict = _verify_single(cit["claim"], content, client)
+        elif client is not None:
+            verdict = _timed_verify(cit["claim"], content, client) if n in sample else dict(_SKIPPED)
             citation_results.append({
                 "chunk_id": cid,
                 "claim": cit["claim"],
                 **verdict,
             })
+        else:
+            pending.append((len(citation_results), _strip_citations(cit["claim"]), content))
+            citation_results.append({"chunk_id": cid, "claim": cit["claim"]})
+
+    if pending:
+        for i, verdict in _verify_local(pending).items():
+            citation_results[i].update(verdict)
 
     unsupported_ids = {c["chunk_id"] for c in citation_results if not c["supported"]}
     verified_answer = answer_text
@@ -108,7 +314,9 @@ def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
 
     total = len(citation_results)
     supported = sum(1 for c in citation_results if c["supported"])
-    accuracy = round(supported / total, 3) if total else 1.0
+    checked = [c for c in citation_results if c.get("method") != "skipped"]
+    checked_supported = sum(1 for c in checked if c["supported"])
+    accuracy = round(checked_supported / len(checked), 3) if checked else 1.0
 
     return {
         "verified_answer": verified_answer,
@@ -116,6 +324,7 @@ def verify_citations(answer_text: str, retrieved: list[dict]) -> dict:
         "citations": citation_results,
         "unsupported_count": total - supported,
         "total_citations": total,
+        "verified_citations": len(checked),
     }
 
 
@@ -126,4 +335,5 @@ def _passthrough(answer_text: str) -> dict:
         "citations": [],
         "unsupported_count": 0,
         "total_citations": 0,
+        "verified_citations": 0,
     }
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from utils import inference_pool
+from utils.chunking_v2 import split_sentences_with_spans
+from utils.tracing import record_event
+
+logger = logging.getLogger("secrag.context")
+
+# Off by default: no token cap and no pruning, so prompts match plain concatenation apart from merged overlaps.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("SECRAG_CONTEXT_TOKEN_BUDGET", "0"))
+CONTEXT_MIN_RELEVANCE = float(os.getenv("SECRAG_CONTEXT_MIN_RELEVANCE", "0.15"))
+CONTEXT_PRUNE = os.getenv("SECRAG_CONTEXT_PRUNE", "").strip().lower() in {"1", "true", "yes"}
+CONTEXT_ENCODING = os.getenv("SECRAG_CONTEXT_ENCODING", "o200k_base")
+
+_GAP = "…"
+_WS_RE = re.compile(r"\s+")
+
+_encoder = None
+_encoder_loaded = False
+_encoder_lock = threading.Lock()
+
+
+def _get_encoder():
+    """tiktoken encoding for the answer model, or None when tiktoken (or its BPE file) is unavailable."""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        with _encoder_lock:
+            if not _encoder_loaded:
+                try:
+                    import tiktoken
+                    _encoder = tiktoken.get_encoding(CONTEXT_ENCODING)
+                except Exception as e:
+                    logger.warning(f"tiktoken unavailable ({e}), estimating prompt tokens")
+                    _encoder = None
+                _encoder_loaded = True
+    return _encoder
+
+
+def tokenizer_name() -> str:
+    return CONTEXT_ENCODING if _get_encoder() is not None else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def _norm(text: str) -> str:
+    return _WS_RE.sub(" ", text).strip().lower()
+
+
+class _Block:
+    def __init__(self, chunk: dict, label: str, rank: int):
+        self.chunk = chunk
+        self.label = label
+        self.rank = rank
+        self.text = chunk.get("content") or ""
+        meta = chunk.get("metadata") or {}
+        self.start = meta.get("char_start", chunk.get("char_start"))
+        self.end = meta.get("char_end", chunk.get("char_end"))
+        self.sentences: list[str] = []
+        self.keep: list[bool] = []
+        self.scores: np.ndarray | None = None
+
+    def render(self) -> str:
+        if all(self.keep):
+            return f"{self.label}\n{self.text}"
+        parts, gap = [], False
+        for sent, keep in zip(self.sentences, self.keep):
+            if keep:
+                if gap and parts:
+                    parts.append(_GAP)
+                parts.append(sent)
+                gap = False
+            else:
+                gap = True
+        return f"{self.label}\n{' '.join(parts)}"
+
+
+def _trim_overlap(prev: _Block, nxt: _Block, cut_next: bool) -> bool:
+    """Remove the text `prev` and `nxt` share (chunker overlap) from one of them; True if anything was cut."""
+    overlap = int(prev.end) - int(nxt.start)
+    if overlap <= 0:
+        return False
+    # Fixed-size chunks are raw slices, so the overlap is an exact character run.
+    head = nxt.text[:overlap].strip()
+    if head and len(head) < min(len(prev.text), len(nxt.text)) and prev.text.endswith(head):
+        if cut_next:
+            nxt.text = nxt.text[overlap:].lstrip()
+        else:
+            prev.text = prev.text[:-len(head)].rstrip()
+        return True
+    # Sentence chunks repeat whole sentences, re-joined with normalised whitespace.
+    prev_sents = split_sentences_with_spans(prev.text)
+    nxt_sents = split_sentences_with_spans(nxt.text)
+    if cut_next:
+        seen = {_norm(s) for _, _, s in prev_sents}
+        cut = 0
+        while cut < len(nxt_sents) - 1 and _norm(nxt_sents[cut][2]) in seen:
+            cut += 1
+        if cut:
+            nxt.text = nxt.text[nxt_sents[cut][0]:].lstrip()
+        return cut > 0
+    seen = {_norm(s) for _, _, s in nxt_sents}
+    keep = len(prev_sents)
+    while keep > 1 and _norm(prev_sents[keep - 1][2]) in seen:
+        keep -= 1
+    if keep < len(prev_sents):
+        prev.text = prev.text[:prev_sents[keep - 1][1]].rstrip()
+    return keep < len(prev_sents)
+
+
+def _merge_overlaps(blocks: list[_Block]) -> int:
+    by_file: dict[object, list[_Block]] = {}
+    for b in blocks:
+        if b.start is not None and b.end is not None:
+            by_file.setdefault(b.chunk.get("filename"), []).append(b)
+    merged = 0
+    for group in by_file.values():
+        group.sort(key=lambda b: (int(b.start), int(b.end)))
+        for prev, nxt in zip(group, group[1:]):
+            # The higher-ranked chunk keeps the shared text, so its citation label still covers it.
+            merged += _trim_overlap(prev, nxt, cut_next=prev.rank < nxt.rank)
+    return merged
+
+
+def _score_sentences(query: str, blocks: list[_Block]) -> bool:
+    """Score each sentence by MiniLM cosine to the query.
+
+    Stored vectors are per chunk, so sentences are embedded here: one extra
+    interactive embedding call per /answer. It is recorded under its own
+    `context-embedder` model label so it does not count as ingestion throughput.
+    """
+    from utils.embeddings import embed_query, embed_texts
+
+    texts = [s for b in blocks for s in b.sentences]
+    if not texts:
+        return False
+    try:
+        q = embed_query(query)
+        vectors = embed_texts(texts, priority=inference_pool.INTERACTIVE, label="context-embedder")
+    except Exception as e:
+        logger.warning(f"Context pruning skipped, embedding failed: {e}")
+        return False
+    scores = np.asarray(vectors, dtype=np.float32) @ np.asarray(q, dtype=np.float32)
+    pos = 0
+    for b in blocks:
+        b.scores = scores[pos:pos + len(b.sentences)]
+        pos += len(b.sentences)
+    return True
+
+
+def assemble_context(
+    chunks: list[dict],
+    query: str | None = None,
+    budget: int | None = None,
+    label=None,
+    stats: dict | None = None,
+) -> str:
+    """Build the LLM context from ranked chunks within a token budget.
+
+    Chunks keep their `[Chunk N]` labels and order. Text repeated by
+    overlapping neighbours is printed once, under the higher-ranked chunk;
+    with a query and pruning on, sentences far from it are dropped; then,
+    with a positive `budget`, the least useful sentences go until the
+    context fits that many tokens.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    label = label or (lambda c: f"[Chunk {c.get('chunk_id')}]")
+    blocks = [_Block(c, label(c), rank) for rank, c in enumerate(chunks)]
+    verbatim = "\n\n".join(f"{b.label}\n{b.text}" for b in blocks)
+    tokens_before = count_tokens(verbatim)
+
+    merged = _merge_overlaps(blocks)
+    for b in blocks:
+        b.sentences = [s for _, _, s in split_sentences_with_spans(b.text)]
+        b.keep = [True] * len(b.sentences)
+    blocks = [b for b in blocks if b.sentences]
+
+    dropped = 0
+    scored = bool(query) and CONTEXT_PRUNE and _score_sentences(query, blocks)
+    if scored:
+        for b in blocks:
+            best = int(np.argmax(b.scores))
+            for i, sc in enumerate(b.scores):
+                if i != best and sc < CONTEXT_MIN_RELEVANCE:
+                    b.keep[i] = False
+                    dropped += 1
+
+    sent_tokens = {(bi, si): count_tokens(s) + 1 for bi, b in enumerate(blocks) for si, s in enumerate(b.sentences)}
+    total = sum(count_tokens(b.label) + 2 for b in blocks)
+    total += sum(t for (bi, si), t in sent_tokens.items() if blocks[bi].keep[si])
+    if 0 < budget < total:
+        # Least relevant sentences go first; without a query, later-ranked chunks are trimmed from the end.
+        if scored:
+            order = sorted(sent_tokens, key=lambda k: float(blocks[k[0]].scores[k[1]]))
+        else:
+            order = sorted(sent_tokens, key=lambda k: (-blocks[k[0]].rank, -k[1]))
+        for bi, si in order:
+            if total <= budget:
+                break
+            b = blocks[bi]
+            if not b.keep[si] or (sum(b.keep) == 1 and bi == 0):
+                continue
+            b.keep[si] = False
+            total -= sent_tokens[(bi, si)]
+            dropped += 1
+            if not any(b.keep):
+                total -= count_tokens(b.label) + 2
+
+    kept = [b for b in blocks if any(b.keep)]
+    text = "\n\n".join(b.render() for b in kept)
+    tokens_after = count_tokens(text)
+    saved = max(0, tokens_before - tokens_after)
+    record_event("context_tokens_saved", saved)
+    if stats is not None:
+        stats.update({
+            "tokenizer": tokenizer_name(),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_after,
+            "tokens_saved": saved,
+            "chunks_in": len(chunks),
+            "chunks_out": len(kept),
+            "overlaps_merged": merged,
+            "sentences_dropped": dropped,
+        })
+    return text
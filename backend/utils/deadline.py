@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+
+from utils.tracing import record_event
+
+DEFAULT_DEADLINE_MS = float(os.getenv("SECRAG_DEFAULT_DEADLINE_MS", "0"))
+COST_EWMA = 0.2
+
+# Starting estimates (ms per unit); replaced by observed costs as requests run.
+_INITIAL_COSTS = {
+    "rerank_pair": 5.0,
+    "generate": 3000.0,
+    "verify_nli": 200.0,
+    "verify_llm": 800.0,
+}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CostModel:
+    """Per-stage cost estimates, as an exponentially weighted moving average of observed ms per unit."""
+
+    def __init__(self, initial: dict[str, float]):
+        self._initial = dict(initial)
+        self._ms = dict(initial)
+        self._lock = threading.Lock()
+
+    def estimate(self, stage: str, units: float = 1.0) -> float:
+        with self._lock:
+            return self._ms.get(stage, 0.0) * units
+
+    def observe(self, stage: str, ms: float, units: float = 1.0):
+        if units <= 0:
+            return
+        per_unit = ms / units
+        with self._lock:
+            prev = self._ms.get(stage)
+            self._ms[stage] = per_unit if prev is None else (1.0 - COST_EWMA) * prev + COST_EWMA * per_unit
+
+    def relax(self, stage: str):
+        """Move a stage's estimate one step back toward its initial value.
+
+        Called when a stage is skipped for lack of time, so an estimate
+        inflated by a burst of load cannot keep the stage switched off forever.
+        """
+        initial = self._initial.get(stage)
+        if initial is None:
+            return
+        with self._lock:
+            self._ms[stage] = (1.0 - COST_EWMA) * self._ms.get(stage, initial) + COST_EWMA * initial
+
+    def snapshot(self) -> dict[str, float]:
+        with self._lock:
+            return {k: round(v, 3) for k, v in self._ms.items()}
+
+
+costs = CostModel(_INITIAL_COSTS)
+
+
+class Deadline:
+    """Latency budget for one request.
+
+    `reserve` names the later stages whose estimated cost is held back when
+    an earlier stage sizes its work; a stage calls `enter` to release its
+    own reservation once it starts.
+    """
+
+    def __init__(self, budget_ms: float, reserve: tuple[str, ...] = ()):
+        self.budget_ms = float(budget_ms)
+        self.expires_at = time.perf_counter() + self.budget_ms / 1000.0
+        self.reserve = list(reserve)
+        self.degraded: list[str] = []
+
+    def remaining_ms(self) -> float:
+        return (self.expires_at - time.perf_counter()) * 1000.0
+
+    def expired(self) -> bool:
+        return self.remaining_ms() <= 0.0
+
+    def enter(self, stage: str):
+        if stage in self.reserve:
+            self.reserve.remove(stage)
+
+    def spendable_ms(self) -> float:
+        return self.remaining_ms() - sum(costs.estimate(s) for s in self.reserve)
+
+    def affordable_units(self, stage: str) -> int:
+        """How many units of `stage` fit in the time left after the reserved stages."""
+        per_unit = costs.estimate(stage)
+        spendable = self.spendable_ms()
+        if spendable <= 0:
+            return 0
+        if per_unit <= 0:
+            return 1 << 30
+        return int(spendable // per_unit)
+
+    def degrade(self, name: str):
+        if name not in self.degraded:
+            self.degraded.append(name)
+            record_event(f"degraded_{name}")
+
+
+_current: contextvars.ContextVar[Deadline | None] = contextvars.ContextVar("secrag_deadline", default=None)
+
+
+def start_deadline(budget_ms: float | None, reserve: tuple[str, ...] = ()) -> tuple[Deadline | None, contextvars.Token]:
+    """Install a deadline for the current request; `budget_ms` of None/0 falls back to the server default."""
+    budget_ms = budget_ms or DEFAULT_DEADLINE_MS
+    deadline = Deadline(budget_ms, reserve) if budget_ms and budget_ms > 0 else None
+    return deadline, _current.set(deadline)
+
+
+def end_deadline(token: contextvars.Token):
+    _current.reset(token)
+
+
+def current_deadline() -> Deadline | None:
+    return _current.get()
+
+
+def budget_bucket(deadline: Deadline | None) -> int | None:
+    """Budget rounded down to a power of two (ms), so requests whose work depends on it can share a key."""
+    if deadline is None:
+        return None
+    return 1 << max(0, int(deadline.budget_ms).bit_length() - 1)
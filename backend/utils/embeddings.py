@@ -1,23 +1,110 @@
-from sentence_transformers import SentenceTransformer
+import os
+import time
+
 import numpy as np
 
+from utils.tracing import observe_batch, observe_tokens, record_cache
+from utils import inference_pool
+from utils.onnx_models import INFERENCE_BACKEND
+
+EMBED_TOKEN_BUDGET = int(os.getenv("SECRAG_EMBED_TOKEN_BUDGET", "8192"))
+EMBED_MAX_BATCH = int(os.getenv("SECRAG_EMBED_MAX_BATCH", "128"))
+
 _model = None
 
 
 def get_model():
     global _model
+    record_cache("embedder_model", _model is not None)
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        if INFERENCE_BACKEND == "torch":
+            from sentence_transformers import SentenceTransformer
+            _model = SentenceTransformer("all-MiniLM-L6-v2")
+        else:
+            from utils.onnx_models import OnnxEmbedder
+            _model = OnnxEmbedder(quantize=INFERENCE_BACKEND == "onnx-int8")
     return _model
 
 
-def embed_texts(texts):
+def token_lengths(texts: list[str], model=None) -> np.ndarray:
+    """Token count per text, truncated like the model truncates; ~4 chars/token when no tokenizer is at hand."""
+    max_tokens = getattr(model, "max_seq_length", None) or getattr(model, "max_length", None) or 256
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is not None:
+        try:
+            ids = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_tokens)["input_ids"]
+            return np.fromiter((len(x) for x in ids), dtype=np.int64, count=len(texts))
+        except Exception:
+            pass
+    return np.fromiter((min(max_tokens, len(t) // 4 + 2) for t in texts), dtype=np.int64, count=len(texts))
+
+
+def token_batches(lengths: np.ndarray, budget: int = EMBED_TOKEN_BUDGET,
+                  max_batch: int = EMBED_MAX_BATCH) -> list[np.ndarray]:
+    """Longest-first batches whose padded size (rows x longest row) stays within `budget` tokens."""
+    order = np.argsort(-lengths, kind="stable")
+    batches, start = [], 0
+    while start < len(order):
+        longest = max(1, int(lengths[order[start]]))
+        size = max(1, min(max_batch, budget // longest))
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def _record(stats: dict | None, texts: int, tokens: int, padded: int, seconds: float, label: str):
+    observe_tokens(label, tokens, padded, seconds)
+    if stats is not None:
+        stats.update({
+            "texts": texts,
+            "tokens": tokens,
+            "padded_tokens": padded,
+            "seconds": round(seconds, 4),
+            "tokens_per_s": round(tokens / seconds, 1) if seconds > 0 else 0.0,
+        })
+
+
+def encode_local(texts, stats: dict | None = None, label: str = "embedder") -> np.ndarray:
     model = get_model()
-    vectors = model.encode(texts, normalize_embeddings=True)
-    return vectors.astype(np.float32)
+    texts = list(texts)
+    if len(texts) <= 1:
+        observe_batch(label, len(texts))
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    start = time.perf_counter()
+    lengths = token_lengths(texts, model)
+    out, padded = None, 0
+    for idx in token_batches(lengths):
+        observe_batch(label, len(idx))
+        vectors = model.encode([texts[i] for i in idx], batch_size=len(idx), normalize_embeddings=True)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+        out[idx] = vectors
+        padded += len(idx) * int(lengths[idx[0]])
+    _record(stats, len(texts), int(lengths.sum()), padded, time.perf_counter() - start, label)
+    return out
+
+
+def embed_texts(texts, priority: int = inference_pool.BULK, stats: dict | None = None, label: str = "embedder"):
+    """Embed `texts` in input order; `label` is the `model` label their batch and token metrics are recorded under."""
+    if inference_pool.get_pool() is None:
+        return encode_local(texts, stats, label)
+    texts = list(texts)
+    if len(texts) <= 1:
+        return inference_pool.embed(texts, priority)
+    # Sort before the pool slices the work, so each slice holds similar lengths.
+    start = time.perf_counter()
+    lengths = token_lengths(texts)
+    order = np.argsort(-lengths, kind="stable")
+    vectors = inference_pool.embed([texts[i] for i in order], priority)
+    out = np.empty_like(vectors)
+    out[order] = vectors
+    step = inference_pool.BULK_CHUNK if priority >= inference_pool.BULK else len(texts)
+    padded = sum(len(order[i:i + step]) * int(lengths[order[i]]) for i in range(0, len(texts), step))
+    _record(stats, len(texts), int(lengths.sum()), padded, time.perf_counter() - start, label)
+    return out
 
 
 def embed_query(query: str) -> np.ndarray:
-    model = get_model()
-    vec = model.encode([query], normalize_embeddings=True)
-    return vec[0].astype(np.float32)
+    return embed_texts([query], priority=inference_pool.INTERACTIVE)[0]
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import threading
+import time
 import uuid
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from typing import Callable
 
+from utils.tracing import record_cache
+
 logger = logging.getLogger("secrag.eval")
 
 
@@ -54,6 +60,10 @@ class GoldenDataset:
     def __len__(self):
         return len(self._data)
 
+
+_JUDGE_FALLBACK_REASONS = {"OpenAI unavailable — skipped scoring", "Scoring error"}
+
+
 def _score_answer(question: str, expected: str, actual: str) -> dict:
 
     try:
@@ -96,61 +106,250 @@ def _score_retrieval(expected_chunks: list[str], retrieved_chunks: list[dict]) -
     return round(hits / len(expected_chunks), 3)
 
 
-def run_eval(
-    dataset: GoldenDataset,
-    pdf_name: str,
+class EvalCache:
+    def __init__(self, cache_dir: str = "data/eval/cache"):
+        self.dir = Path(cache_dir)
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def key(*parts) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, namespace: str, key: str) -> dict | None:
+        path = self.dir / namespace / f"{key}.json"
+        if not path.exists():
+            record_cache(f"eval_{namespace}", False)
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            record_cache(f"eval_{namespace}", False)
+            return None
+        record_cache(f"eval_{namespace}", True)
+        return value
+
+    def put(self, namespace: str, key: str, value: dict):
+        path = self.dir / namespace / f"{key}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{uuid.uuid4().hex[:8]}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+
+class _Checkpoint:
+    """Finished rows of one run, appended as JSONL.
+
+    Rows are tagged with a hash of the run config, and only rows with the
+    current hash are resumed, so a checkpoint written before the model,
+    chunking or code changed is never replayed as a result.
+    """
+
+    def __init__(self, path: str | Path, config: dict):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.config_hash = EvalCache.key(config)
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[str, dict]:
+        done: dict[str, dict] = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                if row.get("config_hash") == self.config_hash:
+                    done[row["id"]] = row
+        return done
+
+    def append(self, row: dict):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({**row, "config_hash": self.config_hash}) + "\n")
+                f.flush()
+
+
+def source_fingerprint() -> str:
+    """Hash of the backend's Python sources and SECRAG_* settings; part of every run config."""
+    h = hashlib.sha256()
+    root = Path(__file__).resolve().parent.parent
+    for path in sorted([*root.glob("*.py"), *root.glob("utils/*.py")]):
+        h.update(path.relative_to(root).as_posix().encode("utf-8"))
+        h.update(path.read_bytes())
+    for name in sorted(k for k in os.environ if k.startswith("SECRAG_")):
+        h.update(f"{name}={os.environ[name]}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _timed(timings: dict, stage: str, fn: Callable, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _eval_item(
+    item: dict,
     retrieve_fn: Callable,
     answer_fn: Callable,
-    verify_fn: Callable | None = None,
-    retrieval_mode: str = "hybrid",
-    top_k: int = 5,
-    chunk_strategy: str = "sentence",
-    run_label: str | None = None,
+    verify_fn: Callable | None,
+    retrieval_mode: str,
+    top_k: int,
+    config: dict,
+    cache: EvalCache | None,
 ) -> dict:
-    label = run_label or f"{chunk_strategy}_{retrieval_mode}_{datetime.utcnow().strftime('%H%M%S')}"
-    results = []
-
-    for item in dataset.items:
-        q = item["question"]
-        expected = item["expected_answer"]
-
+    q = item["question"]
+    expected = item["expected_answer"]
+    timings: dict[str, float] = {}
+
+    answer_key = EvalCache.key(config, q) if cache else None
+    cached = cache.get("answers", answer_key) if cache else None
+
+    failed = False
+    if cached is not None:
+        answer = cached["answer"]
+        retrieval_score = cached["retrieval_relevance"]
+        retrieved_count = cached["retrieved_count"]
+        citation_accuracy = cached["citation_accuracy"]
+    else:
         try:
-            retrieved = retrieve_fn(query=q, top_k=top_k, mode=retrieval_mode)
+            retrieved = _timed(timings, "retrieve_ms", retrieve_fn, query=q, top_k=top_k, mode=retrieval_mode)
         except Exception as e:
             logger.warning(f"Retrieval failed for '{q[:50]}': {e}")
             retrieved = []
+            failed = True
 
         try:
-            answer = answer_fn(q, retrieved) if retrieved else "No relevant context found."
+            answer = _timed(timings, "answer_ms", answer_fn, q, retrieved) if retrieved else "No relevant context found."
         except Exception as e:
             logger.warning(f"Answer failed for '{q[:50]}': {e}")
             answer = ""
-
-        quality = _score_answer(q, expected, answer)
+            failed = True
 
         retrieval_score = _score_retrieval(item.get("source_chunks", []), retrieved)
+        retrieved_count = len(retrieved)
 
         citation_accuracy = None
         if verify_fn and retrieved:
             try:
-                vr = verify_fn(answer, retrieved)
+                vr = _timed(timings, "verify_ms", verify_fn, answer, retrieved)
                 citation_accuracy = vr.get("citation_accuracy")
             except Exception:
                 pass
 
-        results.append({
-            "id": item["id"],
-            "question": q,
-            "expected_answer": expected,
-            "actual_answer": answer,
-            "answer_score": quality.get("score", 0),
-            "answer_reasoning": quality.get("reasoning", ""),
-            "retrieval_relevance": retrieval_score,
-            "citation_accuracy": citation_accuracy,
-            "difficulty": item.get("difficulty", ""),
-            "category": item.get("category", ""),
-            "retrieved_count": len(retrieved),
-        })
+        if cache and not failed:
+            cache.put("answers", answer_key, {
+                "answer": answer,
+                "retrieval_relevance": retrieval_score,
+                "retrieved_count": retrieved_count,
+                "citation_accuracy": citation_accuracy,
+            })
+
+    judge_key = EvalCache.key(q, expected, answer) if cache else None
+    quality = cache.get("judge", judge_key) if cache else None
+    if quality is None:
+        quality = _timed(timings, "judge_ms", _score_answer, q, expected, answer)
+        if quality.get("reasoning") in _JUDGE_FALLBACK_REASONS:
+            failed = True
+        elif cache:
+            cache.put("judge", judge_key, quality)
+
+    return {
+        "id": item["id"],
+        "question": q,
+        "expected_answer": expected,
+        "actual_answer": answer,
+        "answer_score": quality.get("score", 0),
+        "answer_reasoning": quality.get("reasoning", ""),
+        "retrieval_relevance": retrieval_score,
+        "citation_accuracy": citation_accuracy,
+        "difficulty": item.get("difficulty", ""),
+        "category": item.get("category", ""),
+        "retrieved_count": retrieved_count,
+        "cached": cached is not None,
+        "failed": failed,
+        "timings_ms": timings,
+    }
+
+
+def _stage_timings(results: list[dict]) -> dict:
+    stages: dict[str, list[float]] = {}
+    for r in results:
+        for stage, ms in (r.get("timings_ms") or {}).items():
+            stages.setdefault(stage, []).append(ms)
+    out = {}
+    for stage, values in stages.items():
+        values = sorted(values)
+        out[stage] = {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 1),
+            "p50": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+            "total": round(sum(values), 1),
+        }
+    return out
+
+
+def run_eval(
+    dataset: GoldenDataset,
+    pdf_name: str,
+    retrieve_fn: Callable,
+    answer_fn: Callable,
+    verify_fn: Callable | None = None,
+    retrieval_mode: str = "hybrid",
+    top_k: int = 5,
+    chunk_strategy: str = "sentence",
+    run_label: str | None = None,
+    max_workers: int = 4,
+    cache_dir: str | None = None,
+    checkpoint_path: str | None = None,
+    config: dict | None = None,
+) -> dict:
+    label = run_label or f"{chunk_strategy}_{retrieval_mode}_{datetime.utcnow().strftime('%H%M%S')}"
+    run_config = {
+        "pdf_name": pdf_name,
+        "retrieval_mode": retrieval_mode,
+        "top_k": top_k,
+        "chunk_strategy": chunk_strategy,
+        "verify": verify_fn is not None,
+        "source": source_fingerprint(),
+        **(config or {}),
+    }
+    cache = EvalCache(cache_dir) if cache_dir else None
+    checkpoint = _Checkpoint(checkpoint_path, run_config) if checkpoint_path else None
+
+    done = checkpoint.load() if checkpoint else {}
+    if done:
+        logger.info(f"Resuming '{label}': {len(done)} questions already checkpointed")
+    pending = [item for item in dataset.items if item["id"] not in done]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            pool.submit(
+                _eval_item, item, retrieve_fn, answer_fn, verify_fn,
+                retrieval_mode, top_k, run_config, cache,
+            ): item
+            for item in pending
+        }
+        for fut in as_completed(futures):
+            row = fut.result()
+            done[row["id"]] = row
+            # Failed rows are reported but not checkpointed, so a resumed run retries them.
+            if checkpoint and not row["failed"]:
+                checkpoint.append(row)
+    wall_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    results = [done[item["id"]] for item in dataset.items if item["id"] in done]
 
     scores = [r["answer_score"] for r in results]
     retrieval_scores = [r["retrieval_relevance"] for r in results]
@@ -169,6 +368,11 @@ def run_eval(
         },
         "per_difficulty": _group_scores(results, "difficulty"),
         "per_category": _group_scores(results, "category"),
+        "stage_timings_ms": _stage_timings(results),
+        "wall_time_ms": wall_ms,
+        "resumed_from_checkpoint": len(dataset.items) - len(pending),
+        "answers_from_cache": sum(1 for r in results if r.get("cached")),
+        "failed_questions": sum(1 for r in results if r.get("failed")),
         "timestamp": datetime.utcnow().isoformat(),
     }
 
@@ -188,23 +392,38 @@ def compare_chunking_strategies(
     pdf_name: str,
     retrieve_fn_factory: Callable,
     answer_fn: Callable,
+    max_workers: int = 4,
+    cache_dir: str | None = None,
+    checkpoint_dir: str | None = None,
+    config: dict | None = None,
 ) -> dict:
     comparison = {}
     from utils.chunking_strategies import STRATEGIES
-    for strategy in STRATEGIES:
-        try:
-            retrieve_fn = retrieve_fn_factory(strategy)
-            report = run_eval(
-                dataset=dataset,
-                pdf_name=pdf_name,
-                retrieve_fn=retrieve_fn,
-                answer_fn=answer_fn,
-                chunk_strategy=strategy,
-                run_label=strategy,
-            )
-            comparison[strategy] = report["summary"]
-        except Exception as e:
-            comparison[strategy] = {"error": str(e)}
+
+    def _run(strategy: str) -> dict:
+        retrieve_fn = retrieve_fn_factory(strategy)
+        checkpoint_path = str(Path(checkpoint_dir) / f"{strategy}.jsonl") if checkpoint_dir else None
+        return run_eval(
+            dataset=dataset,
+            pdf_name=pdf_name,
+            retrieve_fn=retrieve_fn,
+            answer_fn=answer_fn,
+            chunk_strategy=strategy,
+            run_label=strategy,
+            max_workers=max_workers,
+            cache_dir=cache_dir,
+            checkpoint_path=checkpoint_path,
+            config=config,
+        )
+
+    with ThreadPoolExecutor(max_workers=len(STRATEGIES)) as pool:
+        futures = {pool.submit(_run, strategy): strategy for strategy in STRATEGIES}
+        for fut in as_completed(futures):
+            strategy = futures[fut]
+            try:
+                comparison[strategy] = fut.result()["summary"]
+            except Exception as e:
+                comparison[strategy] = {"error": str(e)}
 
     strategies_with_data = [s for s in STRATEGIES if "error" not in comparison.get(s, {})]
     if strategies_with_data:
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+FILTER_FIELDS = (
+    "page_start", "page_end", "char_start", "char_end",
+    "chunk_strategy", "created_after", "created_before",
+)
+
+
+def to_timestamp(value) -> float | None:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def page_offsets(pages: list[str]) -> np.ndarray:
+    lengths = np.fromiter((len(p) for p in pages), dtype=np.int64, count=len(pages))
+    return np.concatenate([[0], np.cumsum(lengths)[:-1]]) if len(pages) else np.zeros(0, dtype=np.int64)
+
+
+def pages_for_spans(offsets: np.ndarray, starts, ends) -> tuple[np.ndarray, np.ndarray]:
+    if len(offsets) == 0:
+        zeros = np.zeros(len(starts), dtype=np.int64)
+        return zeros, zeros
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.maximum(np.asarray(ends, dtype=np.int64) - 1, starts)
+    first = np.searchsorted(offsets, starts, side="right")
+    last = np.searchsorted(offsets, ends, side="right")
+    return first, last
+
+
+class ChunkColumns:
+    """Column view of chunk metadata so filters evaluate as vectorised masks."""
+
+    def __init__(self, chunks: list[dict]):
+        def _meta(c: dict) -> dict:
+            return c.get("metadata") or c
+
+        def _int_col(name: str) -> np.ndarray:
+            vals = (_meta(c).get(name) for c in chunks)
+            return np.fromiter((-1 if v is None or v == "" else int(v) for v in vals),
+                               dtype=np.int64, count=len(chunks))
+
+        self.page_start = _int_col("page_start")
+        self.page_end = _int_col("page_end")
+        self.char_start = _int_col("char_start")
+        self.char_end = _int_col("char_end")
+
+        created = np.full(len(chunks), np.nan, dtype=np.float64)
+        for i, c in enumerate(chunks):
+            meta = _meta(c)
+            ts = meta.get("created_ts")
+            if ts in (None, ""):
+                try:
+                    ts = to_timestamp(meta.get("created_at"))
+                except ValueError:
+                    ts = None
+            if ts is not None:
+                created[i] = float(ts)
+        self.created_ts = created
+        self.chunk_strategy = np.array([_meta(c).get("chunk_strategy") or "" for c in chunks], dtype=object)
+
+    def __len__(self):
+        return len(self.page_start)
+
+
+class ChunkFilter:
+    """Structured restriction on page range, char range, chunk strategy and ingestion time.
+
+    Ranges are inclusive and match any chunk that overlaps them. Pages are 1-based,
+    so chunks ingested before page tracking never match a page filter.
+    """
+
+    def __init__(
+        self,
+        page_start: int | None = None,
+        page_end: int | None = None,
+        char_start: int | None = None,
+        char_end: int | None = None,
+        chunk_strategy: str | list[str] | None = None,
+        created_after=None,
+        created_before=None,
+    ):
+        if page_start is not None and page_end is not None and page_start > page_end:
+            raise ValueError("page_start must be <= page_end")
+        if char_start is not None and char_end is not None and char_start > char_end:
+            raise ValueError("char_start must be <= char_end")
+        if page_end is not None and page_start is None:
+            page_start = 1
+        self.page_start = page_start
+        self.page_end = page_end
+        self.char_start = char_start
+        self.char_end = char_end
+        if isinstance(chunk_strategy, str):
+            chunk_strategy = [chunk_strategy]
+        self.chunk_strategy = list(chunk_strategy) if chunk_strategy else None
+        try:
+            self.created_after = to_timestamp(created_after)
+            self.created_before = to_timestamp(created_before)
+        except ValueError:
+            raise ValueError("created_after/created_before must be ISO-8601 strings or epoch seconds")
+
+    @classmethod
+    def from_dict(cls, spec: dict | None) -> "ChunkFilter | None":
+        if not spec:
+            return None
+        unknown = set(spec) - set(FILTER_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown filter fields: {sorted(unknown)}. Choose from: {FILTER_FIELDS}")
+        f = cls(**spec)
+        return None if f.is_empty() else f
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, name) is None for name in FILTER_FIELDS)
+
+    def to_where(self) -> dict | None:
+        clauses = []
+        if self.page_start is not None:
+            clauses.append({"page_end": {"$gte": int(self.page_start)}})
+        if self.page_end is not None:
+            clauses.append({"page_start": {"$lte": int(self.page_end)}})
+        if self.char_start is not None:
+            clauses.append({"char_end": {"$gt": int(self.char_start)}})
+        if self.char_end is not None:
+            clauses.append({"char_start": {"$lte": int(self.char_end)}})
+        if self.chunk_strategy:
+            clauses.append({"chunk_strategy": {"$in": self.chunk_strategy}})
+        if self.created_after is not None:
+            clauses.append({"created_ts": {"$gte": self.created_after}})
+        if self.created_before is not None:
+            clauses.append({"created_ts": {"$lte": self.created_before}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def mask(self, cols: ChunkColumns) -> np.ndarray:
+        keep = np.ones(len(cols), dtype=bool)
+        if self.page_start is not None:
+            keep &= cols.page_end >= self.page_start
+        if self.page_end is not None:
+            keep &= cols.page_start <= self.page_end
+        if self.char_start is not None:
+            keep &= cols.char_end > self.char_start
+        if self.char_end is not None:
+            keep &= cols.char_start <= self.char_end
+        if self.chunk_strategy:
+            keep &= np.isin(cols.chunk_strategy, self.chunk_strategy)
+        if self.created_after is not None:
+            keep &= cols.created_ts >= self.created_after
+        if self.created_before is not None:
+            keep &= cols.created_ts <= self.created_before
+        return keep
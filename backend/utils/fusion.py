@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import numpy as np
+
+FUSION_METHODS = ("rrf", "linear", "combsum", "combmnz")
+
+
+def _as_batch(arr: np.ndarray) -> np.ndarray:
+    arr = np.asarray(arr)
+    return arr[None, :] if arr.ndim == 1 else arr
+
+
+def _scatter(n_docs: int, rankings: list[np.ndarray], values: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    batch = _as_batch(rankings[0]).shape[0]
+    totals = np.zeros(batch * n_docs, dtype=np.float64)
+    hits = np.zeros(batch * n_docs, dtype=np.int32)
+    for ranking, vals in zip(rankings, values):
+        ranking = _as_batch(ranking)
+        vals = np.broadcast_to(_as_batch(vals), ranking.shape)
+        valid = ranking >= 0
+        rows = np.broadcast_to(np.arange(batch)[:, None], ranking.shape)
+        flat = (rows[valid] * n_docs + ranking[valid]).astype(np.int64)
+        totals += np.bincount(flat, weights=vals[valid], minlength=batch * n_docs)
+        hits += np.bincount(flat, minlength=batch * n_docs).astype(np.int32)
+    return totals.reshape(batch, n_docs), hits.reshape(batch, n_docs)
+
+
+def rrf(rankings: list[np.ndarray], n_docs: int, k: int = 60, weights: list[float] | None = None) -> np.ndarray:
+    values = []
+    for i, ranking in enumerate(rankings):
+        width = _as_batch(ranking).shape[1]
+        w = 1.0 if weights is None else float(weights[i])
+        values.append(w / (k + np.arange(1, width + 1, dtype=np.float64)))
+    totals, hits = _scatter(n_docs, rankings, values)
+    totals[hits == 0] = -np.inf
+    return totals
+
+
+def linear(scores: list[np.ndarray], weights: list[float], candidates: list[np.ndarray] | None = None) -> np.ndarray:
+    fused = sum(float(w) * _as_batch(s).astype(np.float64) for s, w in zip(scores, weights))
+    if candidates is not None:
+        mask = np.zeros(fused.shape, dtype=bool)
+        for cand in candidates:
+            cand = _as_batch(cand)
+            rows = np.broadcast_to(np.arange(fused.shape[0])[:, None], cand.shape)
+            valid = cand >= 0
+            mask[rows[valid], cand[valid]] = True
+        fused = np.where(mask, fused, -np.inf)
+    return fused
+
+
+def _dense_normalized(ranking: np.ndarray, scores: np.ndarray, n_docs: int) -> np.ndarray:
+    """Per-document scores of one ranked list, min-max normalised per query; unranked documents score 0."""
+    ranking = _as_batch(ranking)
+    scores = np.broadcast_to(_as_batch(scores), ranking.shape).astype(np.float64)
+    valid = ranking >= 0
+    lo = np.where(valid, scores, np.inf).min(axis=1, keepdims=True)
+    hi = np.where(valid, scores, -np.inf).max(axis=1, keepdims=True)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    norm = np.where(hi > lo, (scores - lo) / span, 1.0)
+    out = np.zeros((ranking.shape[0], n_docs), dtype=np.float64)
+    rows = np.broadcast_to(np.arange(ranking.shape[0])[:, None], ranking.shape)
+    out[rows[valid], ranking[valid]] = norm[valid]
+    return out
+
+
+def combsum(rankings: list[np.ndarray], rank_scores: list[np.ndarray], n_docs: int) -> np.ndarray:
+    totals, hits = _scatter(n_docs, rankings, rank_scores)
+    totals[hits == 0] = -np.inf
+    return totals
+
+
+def combmnz(rankings: list[np.ndarray], rank_scores: list[np.ndarray], n_docs: int) -> np.ndarray:
+    totals, hits = _scatter(n_docs, rankings, rank_scores)
+    out = totals * hits
+    out[hits == 0] = -np.inf
+    return out
+
+
+def top_k(fused: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    fused = _as_batch(fused)
+    n = fused.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        empty = np.zeros((fused.shape[0], 0))
+        return empty.astype(np.int64), empty
+    part = np.argpartition(-fused, k - 1, axis=1)[:, :k]
+    part.sort(axis=1)
+    part_scores = np.take_along_axis(fused, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    idx = np.take_along_axis(part, order, axis=1)
+    vals = np.take_along_axis(part_scores, order, axis=1)
+    return idx, vals
+
+
+def fuse(
+    method: str,
+    rankings: list[np.ndarray],
+    n_docs: int,
+    rank_scores: list[np.ndarray] | None = None,
+    weights: list[float] | None = None,
+    k: int = 60,
+) -> np.ndarray:
+    method = (method or "rrf").lower().strip()
+    if method == "rrf":
+        return rrf(rankings, n_docs, k=k, weights=weights)
+    if rank_scores is None:
+        raise ValueError(f"fusion method '{method}' needs rank_scores")
+    if method == "combsum":
+        return combsum(rankings, rank_scores, n_docs)
+    if method == "combmnz":
+        return combmnz(rankings, rank_scores, n_docs)
+    if method == "linear":
+        # Same score mixing as the retriever's hybrid path: normalised raw scores, weighted.
+        w = weights or [1.0 / len(rankings)] * len(rankings)
+        dense = [_dense_normalized(r, sc, n_docs) for r, sc in zip(rankings, rank_scores)]
+        return linear(dense, w, candidates=rankings)
+    raise ValueError(f"Unknown fusion method '{method}'. Choose from: {FUSION_METHODS}")
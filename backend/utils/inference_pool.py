@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from utils.tracing import observe_batch, record_event
+
+logger = logging.getLogger("secrag.inference")
+
+INFERENCE_WORKERS = int(os.getenv("SECRAG_INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS = int(os.getenv("SECRAG_INFERENCE_THREADS", "0")) or max(
+    1, (os.cpu_count() or 1) // max(1, INFERENCE_WORKERS)
+)
+MAX_BATCH = int(os.getenv("SECRAG_INFERENCE_MAX_BATCH", "64"))
+BULK_CHUNK = int(os.getenv("SECRAG_INFERENCE_BULK_CHUNK", "32"))
+
+INTERACTIVE = 0
+BULK = 10
+
+
+def _init_worker(threads: int):
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+
+
+def _run_embed(texts: list[str]) -> np.ndarray:
+    from utils.embeddings import encode_local
+
+    return encode_local(texts)
+
+
+def _run_rerank(pairs: list[tuple[str, str]]) -> np.ndarray:
+    from utils.reranker import predict_local
+
+    return np.asarray(predict_local(pairs), dtype=np.float32)
+
+
+def _run_nli(pairs: list[tuple[str, str]]) -> np.ndarray:
+    from utils.citation_verifier import nli_predict_local
+
+    return nli_predict_local(pairs)
+
+
+_TASKS = {"embed": _run_embed, "rerank": _run_rerank, "nli": _run_nli}
+
+
+class _Job:
+    __slots__ = ("kind", "items", "future")
+
+    def __init__(self, kind: str, items: list):
+        self.kind = kind
+        self.items = items
+        self.future: Future = Future()
+
+
+class InferencePool:
+    """Model inference in dedicated processes, fed from one priority queue.
+
+    Jobs wait in the queue until a worker is free, so a small interactive job
+    only ever waits behind the batch already running, never behind a whole
+    upload. Queued interactive jobs of the same kind are coalesced into one
+    model call of up to `max_batch` items; bulk work is pre-split into
+    `BULK_CHUNK`-sized jobs, which bounds how long an interactive job can wait.
+    """
+
+    def __init__(self, workers: int, threads: int, max_batch: int = MAX_BATCH):
+        self.workers = workers
+        self.threads = threads
+        self.max_batch = max_batch
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._slots = threading.Semaphore(workers)
+        self._restart_lock = threading.Lock()
+        self._executor = self._new_executor()
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="inference-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads,),
+        )
+
+    def submit(self, kind: str, items: list, priority: int = INTERACTIVE) -> Future:
+        job = _Job(kind, items)
+        self._queue.put((priority, next(self._seq), job))
+        return job.future
+
+    def _take_batch(self) -> tuple[int, list[_Job]]:
+        priority, _, first = self._queue.get()
+        if first is None:
+            return priority, [None]
+        jobs, size = [first], len(first.items)
+        while priority < BULK and size < self.max_batch:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            nxt = entry[2]
+            if nxt is None or entry[0] != priority or nxt.kind != first.kind \
+                    or size + len(nxt.items) > self.max_batch:
+                self._queue.put(entry)
+                break
+            jobs.append(nxt)
+            size += len(nxt.items)
+        return priority, jobs
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            priority, jobs = self._take_batch()
+            if jobs[0] is None:
+                self._slots.release()
+                return
+            kind = jobs[0].kind
+            items = [it for job in jobs for it in job.items]
+            observe_batch(f"{kind}-pool", len(items))
+            executor = self._executor
+            try:
+                fut = executor.submit(_TASKS[kind], items)
+            except Exception as e:
+                self._slots.release()
+                self._restart_if_broken(e, executor)
+                for job in jobs:
+                    job.future.set_exception(e)
+                continue
+            fut.add_done_callback(lambda f, jobs=jobs, ex=executor: self._complete(f, jobs, ex))
+
+    def _restart_if_broken(self, error: BaseException, executor: ProcessPoolExecutor):
+        if not isinstance(error, BrokenProcessPool) or self._closed:
+            return
+        with self._restart_lock:
+            if self._executor is executor:
+                logger.error("Inference pool worker died, restarting pool")
+                record_event("inference_pool_restart")
+                self._executor = self._new_executor()
+
+    def _complete(self, fut: Future, jobs: list[_Job], executor: ProcessPoolExecutor):
+        self._slots.release()
+        try:
+            result = fut.result()
+        except BaseException as e:
+            self._restart_if_broken(e, executor)
+            for job in jobs:
+                job.future.set_exception(e)
+            return
+        offset = 0
+        for job in jobs:
+            n = len(job.items)
+            job.future.set_result(result[offset:offset + n])
+            offset += n
+
+    def run(self, kind: str, items: list, priority: int = INTERACTIVE, chunk: int | None = None) -> np.ndarray:
+        if not items:
+            return np.zeros(0, dtype=np.float32)
+        step = chunk or len(items)
+        futures = [self.submit(kind, items[i:i + step], priority) for i in range(0, len(items), step)]
+        parts = [f.result() for f in futures]
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def shutdown(self):
+        self._closed = True
+        self._queue.put((float("inf"), next(self._seq), None))
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool: InferencePool | None = None
+_pool_pid: int | None = None
+_lock = threading.Lock()
+
+
+def get_pool() -> InferencePool | None:
+    global _pool, _pool_pid
+    if INFERENCE_WORKERS <= 0:
+        return None
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = InferencePool(INFERENCE_WORKERS, INFERENCE_THREADS)
+            _pool_pid = os.getpid()
+            atexit.register(_pool.shutdown)
+            logger.info(f"Inference pool: {INFERENCE_WORKERS} workers x {INFERENCE_THREADS} torch threads")
+    return _pool
+
+
+def embed(texts: list[str], priority: int) -> np.ndarray:
+    chunk = BULK_CHUNK if priority >= BULK else None
+    return get_pool().run("embed", list(texts), priority, chunk=chunk)
+
+
+def predict(pairs: list[tuple[str, str]], priority: int = INTERACTIVE) -> np.ndarray:
+    return get_pool().run("rerank", list(pairs), priority)
+
+
+def nli(pairs: list[tuple[str, str]], priority: int = INTERACTIVE) -> np.ndarray:
+    return get_pool().run("nli", list(pairs), priority)
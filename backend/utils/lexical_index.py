@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from utils.bm25 import BM25Index
+from utils.catalog import get_catalog
+from utils.filters import ChunkColumns, ChunkFilter
+from utils.tracing import record_cache
+from utils.vector_store import collection_count, get_all_chunks
+
+_cache: dict[tuple[str, str], tuple[object, BM25Index, list[dict], ChunkColumns]] = {}
+_locks: dict[tuple[str, str], threading.Lock] = {}
+_guard = threading.Lock()
+
+
+def _lock_for(key: tuple[str, str]) -> threading.Lock:
+    with _guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def _version(pdf_name: str, persist_dir: str) -> object:
+    """What the cached index must match to be served.
+
+    The catalog row changes on every (re-)ingestion and is shared by all
+    worker processes, so a re-upload in one worker retires the index cached
+    in the others, even when the chunk count is unchanged. Stores without a
+    catalog (standalone scripts) fall back to the collection size.
+    """
+    catalog_path = Path(persist_dir).parent / "catalog.sqlite3"
+    if catalog_path.exists():
+        doc = get_catalog(catalog_path.parent).get_document(pdf_name)
+        if doc is not None:
+            return (doc["sha256"], doc["chunk_strategy"], doc["chunk_size"], doc["ingested_at"])
+    return collection_count(pdf_name, persist_dir)
+
+
+def get_lexical_index(
+    pdf_name: str, persist_dir: str = "./data/chroma"
+) -> tuple[BM25Index, list[dict], ChunkColumns]:
+    key = (persist_dir, pdf_name)
+    version = _version(pdf_name, persist_dir)
+
+    entry = _cache.get(key)
+    if entry is not None and entry[0] == version:
+        record_cache("lexical_index", True)
+        return entry[1:]
+
+    with _lock_for(key):
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            record_cache("lexical_index", True)
+            return entry[1:]
+        record_cache("lexical_index", False)
+        items = get_all_chunks(pdf_name, persist_dir)
+        index = BM25Index().fit([it.get("content", "") for it in items])
+        columns = ChunkColumns(items)
+        _cache[key] = (version, index, items, columns)
+        return index, items, columns
+
+
+def invalidate(pdf_name: str, persist_dir: str = "./data/chroma"):
+    _cache.pop((persist_dir, pdf_name), None)
+
+
+def sparse_search(
+    pdf_name: str,
+    query: str,
+    top_k: int,
+    persist_dir: str = "./data/chroma",
+    chunk_filter: ChunkFilter | None = None,
+) -> list[dict]:
+    index, items, columns = get_lexical_index(pdf_name, persist_dir)
+    allowed = chunk_filter.mask(columns) if chunk_filter is not None else None
+    idx, scores = index.top_k(query, top_k, allowed=allowed)
+    if len(idx) == 0:
+        return []
+    top = float(scores[0])
+    norm = scores / top if top > 0 else np.zeros_like(scores)
+    return [{**items[int(i)], "score": float(s)} for i, s in zip(idx, norm)]
@@ -1,7 +1,11 @@
 import os
 import json
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APITimeoutError, OpenAI
+
+from utils.context import assemble_context
+from utils.deadline import DeadlineExceeded, costs, current_deadline
 
 load_dotenv()
 
@@ -13,13 +17,10 @@ def _get_client() -> OpenAI:
     return OpenAI(api_key=api_key)
 
 
-def generate_answer(query: str, retrieved_chunks: list):
+def generate_answer(query: str, retrieved_chunks: list, context_stats: dict | None = None):
     client = _get_client()
 
-    context = "\n\n".join(
-        f"[Chunk {c['chunk_id']}]\n{c['content']}"
-        for c in retrieved_chunks
-    )
+    context = assemble_context(retrieved_chunks, query=query, stats=context_stats)
 
     system_prompt = """You are a precise document assistant.
 Answer using ONLY the provided context chunks.
@@ -40,14 +41,29 @@ Question: {query}
 
 Answer with inline [Chunk N] citations after every claim:"""
 
-    response = client.responses.create(
-        model="gpt-4.1",
-        input=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt},
-        ],
-        max_output_tokens=500,
-    )
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.enter("generate")
+        if deadline.expired():
+            raise DeadlineExceeded("Deadline exceeded before answer generation")
+        # No retries: a second attempt cannot finish inside the budget either.
+        client = client.with_options(timeout=deadline.remaining_ms() / 1000.0, max_retries=0)
+
+    start = time.perf_counter()
+    try:
+        response = client.responses.create(
+            model="gpt-4.1",
+            input=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            max_output_tokens=500,
+        )
+    except APITimeoutError as e:
+        if deadline is None:
+            raise
+        raise DeadlineExceeded("Deadline exceeded during answer generation") from e
+    costs.observe("generate", (time.perf_counter() - start) * 1000.0)
 
     return response.output_text.strip()
 
@@ -12,6 +12,10 @@ def get_artifact_paths(filename: str, data_dir: Path):
     embedding_path = data_dir / f"{stem}_embedding.npy"
     return chunk_path, embedding_path
 
+def get_ann_path(filename: str, data_dir: Path) -> Path:
+    stem = Path(filename).stem
+    return data_dir / f"{stem}_ivf.npz"
+
 def get_all_related_paths(filename: str, data_dir: Path) -> list[Path]:
 
     pdf_name = safe_pdf_name(filename)
@@ -22,6 +26,10 @@ def get_all_related_paths(filename: str, data_dir: Path) -> list[Path]:
         data_dir / f"{stem}.txt",
         data_dir / f"{stem}_chunks.json",
         data_dir / f"{stem}_embedding.npy",
+        data_dir / f"{stem}_ivf.npz",
+        data_dir / f"{stem}_embedding_q8.npy",
+        data_dir / f"{stem}_embedding_q8_scales.npy",
+        data_dir / f"{stem}_embedding_f16.npy",
 
         data_dir / f"{stem}_meta.json",
         data_dir / f"{stem}_stats.json",
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from utils.artifacts import save_npy_atomic
+from utils.vector_store import VectorStore
+
+_COMPARATORS = {
+    "$eq": lambda col, v: col == v,
+    "$ne": lambda col, v: col != v,
+    "$gt": lambda col, v: col > v,
+    "$gte": lambda col, v: col >= v,
+    "$lt": lambda col, v: col < v,
+    "$lte": lambda col, v: col <= v,
+    "$in": lambda col, v: np.isin(col, list(v)),
+    "$nin": lambda col, v: ~np.isin(col, list(v)),
+}
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class _Collection:
+    def __init__(self, path: Path):
+        self.path = path
+        self.signature = None
+        self.ids: list[str] = []
+        self.documents: list[str] = []
+        self.metadatas: list[dict] = []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.positions: dict[str, int] = {}
+        self._columns: dict[str, np.ndarray] = {}
+        self.load()
+
+    def _records_path(self) -> Path:
+        return self.path / "records.json"
+
+    def _vectors_path(self) -> Path:
+        return self.path / "vectors.npy"
+
+    def current_signature(self):
+        try:
+            st = self._records_path().stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def load(self):
+        self.signature = self.current_signature()
+        if self.signature is None:
+            return
+        with open(self._records_path(), "r", encoding="utf-8") as f:
+            records = json.load(f)
+        self.ids = records["ids"]
+        self.documents = records["documents"]
+        self.metadatas = records["metadatas"]
+        self.vectors = np.load(self._vectors_path(), mmap_mode="r")
+        self.positions = {cid: i for i, cid in enumerate(self.ids)}
+        self._columns = {}
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        save_npy_atomic(self._vectors_path(), np.ascontiguousarray(self.vectors, dtype=np.float32))
+        tmp = self._records_path().with_name("records.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}, f)
+        os.replace(tmp, self._records_path())
+        self.vectors = np.load(self._vectors_path(), mmap_mode="r")
+        self.signature = self.current_signature()
+        self._columns = {}
+
+    def column(self, key: str) -> np.ndarray:
+        col = self._columns.get(key)
+        if col is None:
+            values = [m.get(key) for m in self.metadatas]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                col = np.asarray(values, dtype=np.float64)
+            else:
+                col = np.asarray(values, dtype=object)
+            self._columns[key] = col
+        return col
+
+    def mask(self, where: dict) -> np.ndarray:
+        n = len(self.ids)
+        out = np.ones(n, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    out &= self.mask(sub)
+            elif key == "$or":
+                any_of = np.zeros(n, dtype=bool)
+                for sub in cond:
+                    any_of |= self.mask(sub)
+                out &= any_of
+            else:
+                col = self.column(key)
+                ops = cond if isinstance(cond, dict) else {"$eq": cond}
+                for op, value in ops.items():
+                    if op not in _COMPARATORS:
+                        raise ValueError(f"Unsupported where operator '{op}'")
+                    if col.dtype == object and op in ("$gt", "$gte", "$lt", "$lte"):
+                        raise ValueError(f"Operator '{op}' needs a numeric metadata field, got '{key}'")
+                    out &= np.asarray(_COMPARATORS[op](col, value), dtype=bool)
+        return out
+
+
+class NumpyStore(VectorStore):
+    """Exact cosine search over normalised float32 matrices, one directory per collection.
+
+    Vectors are memory-mapped from `vectors.npy`; ids, documents and metadata
+    live in `records.json`. Both files are replaced atomically, and every
+    process reloads a collection when its `records.json` changes on disk.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._collections: dict[str, _Collection] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str) -> _Collection:
+        with self._lock:
+            coll = self._collections.get(name)
+            if coll is None:
+                coll = self._collections[name] = _Collection(self.root / name)
+            elif coll.signature != coll.current_signature():
+                coll.load()
+            return coll
+
+    def exists(self, name):
+        return (self.root / name / "records.json").exists()
+
+    def count(self, name):
+        return len(self._get(name).ids)
+
+    def upsert(self, name, ids, vectors, documents, metadatas):
+        vectors = _normalize(vectors)
+        coll = self._get(name)
+        with self._lock:
+            current = np.asarray(coll.vectors, dtype=np.float32)
+            if current.size == 0:
+                current = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            elif current.shape[1] != vectors.shape[1]:
+                raise ValueError(f"Embedding dim {vectors.shape[1]} does not match collection dim {current.shape[1]}")
+            new_rows = []
+            for i, cid in enumerate(ids):
+                pos = coll.positions.get(cid)
+                if pos is None:
+                    coll.positions[cid] = len(coll.ids)
+                    coll.ids.append(cid)
+                    coll.documents.append(documents[i])
+                    coll.metadatas.append(metadatas[i])
+                    new_rows.append(i)
+                else:
+                    coll.documents[pos] = documents[i]
+                    coll.metadatas[pos] = metadatas[i]
+                    if not current.flags.writeable:
+                        current = current.copy()
+                    current[pos] = vectors[i]
+            coll.vectors = np.vstack([current, vectors[new_rows]]) if new_rows else current
+            coll.save()
+
+    def query(self, name, vectors, top_k, where=None):
+        coll = self._get(name)
+        queries = _normalize(vectors)
+        n = len(coll.ids)
+        if n == 0:
+            return [[] for _ in range(len(queries))]
+        rows = np.flatnonzero(coll.mask(where)) if where else None
+        matrix = coll.vectors if rows is None else coll.vectors[rows]
+        if len(matrix) == 0:
+            return [[] for _ in range(len(queries))]
+        sims = queries @ matrix.T
+        k = min(top_k, sims.shape[1])
+        out = []
+        for row in sims:
+            idx = np.argpartition(-row, k - 1)[:k] if k < len(row) else np.arange(len(row))
+            idx = idx[np.argsort(-row[idx])]
+            hits = []
+            for j in idx:
+                pos = int(j) if rows is None else int(rows[j])
+                hits.append((coll.ids[pos], float(1.0 - row[j]), coll.documents[pos], coll.metadatas[pos]))
+            out.append(hits)
+        return out
+
+    def get_all(self, name, include_vectors=False):
+        coll = self._get(name)
+        if not coll.ids:
+            return [], [], [], None
+        vectors = np.asarray(coll.vectors, dtype=np.float32) if include_vectors else None
+        return list(coll.ids), list(coll.documents), list(coll.metadatas), vectors
+
+    def delete(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self.root / name, ignore_errors=True)
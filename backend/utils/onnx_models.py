@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import inspect
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger("secrag.onnx")
+
+INFERENCE_BACKENDS = ("torch", "onnx", "onnx-int8")
+INFERENCE_BACKEND = os.getenv("SECRAG_INFERENCE_BACKEND", "torch").strip().lower()
+
+if INFERENCE_BACKEND not in INFERENCE_BACKENDS:
+    raise ValueError(f"SECRAG_INFERENCE_BACKEND must be one of {INFERENCE_BACKENDS}")
+
+# Same default data directory as the app, so exports land in one place whatever the working directory.
+_DATA_DIR = Path(os.getenv("SECRAG_DATA_DIR") or Path(__file__).resolve().parent.parent.parent / "data")
+ONNX_DIR = Path(os.getenv("SECRAG_ONNX_DIR") or _DATA_DIR / "onnx").resolve()
+ONNX_THREADS = int(os.getenv("SECRAG_ONNX_THREADS", "0"))
+
+EMBEDDER_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """sentence-transformers mean pooling: average of the unpadded token states."""
+    mask = attention_mask[..., None].astype(np.float32)
+    return ((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)).astype(np.float32)
+
+
+def sigmoid(logits: np.ndarray) -> np.ndarray:
+    """CrossEncoder's default activation for a single-logit model, without overflow for large |logits|."""
+    x = np.asarray(logits, dtype=np.float64)
+    e = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1.0 / (1.0 + e), e / (1.0 + e)).astype(np.float32)
+
+
+def model_dir(model_id: str, quantize: bool, root: Path = ONNX_DIR) -> Path:
+    return Path(root) / f"{model_id.replace('/', '__')}__{'int8' if quantize else 'fp32'}"
+
+
+def export_model(model_id: str, task: str, quantize: bool, root: Path = ONNX_DIR) -> Path:
+    """Export a Hugging Face encoder to ONNX (optionally dynamic-int8) next to its tokenizer.
+
+    The export goes to a temp directory that is renamed into place, so
+    concurrent workers never load a half-written model.
+    """
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+
+    out_dir = model_dir(model_id, quantize, root)
+    tmp_dir = out_dir.with_name(f"{out_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    tokenizer.save_pretrained(tmp_dir)
+    cls = AutoModelForSequenceClassification if task == "rerank" else AutoModel
+    model = cls.from_pretrained(model_id).eval()
+    model.config.return_dict = False
+
+    sample = tokenizer(["export sample text"], ["paired passage"] if task == "rerank" else None, return_tensors="pt")
+    names = [n for n in _INPUTS if n in sample]
+    output = "logits" if task == "rerank" else "last_hidden_state"
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes[output] = {0: "batch"} if task == "rerank" else {0: "batch", 1: "seq"}
+    kwargs = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    fp32_path = tmp_dir / "model.onnx"
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), str(fp32_path),
+            input_names=names, output_names=[output], dynamic_axes=axes,
+            opset_version=17, do_constant_folding=True, **kwargs,
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(tmp_dir / "model.int8.onnx"), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+        (tmp_dir / "model.int8.onnx").rename(fp32_path)
+
+    try:
+        os.replace(tmp_dir, out_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(f"ONNX: exported {model_id} ({'int8' if quantize else 'fp32'}) to {out_dir}")
+    return out_dir
+
+
+class OnnxModel:
+    def __init__(self, model_id: str, task: str, quantize: bool, max_length: int, root: Path = ONNX_DIR):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = model_dir(model_id, quantize, root)
+        if not (path / "model.onnx").exists():
+            path = export_model(model_id, task, quantize, root)
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if ONNX_THREADS:
+            opts.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(str(path / "model.onnx"), opts, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+        self.quantized = quantize
+
+    def _run(self, first: list[str], second: list[str] | None = None) -> tuple[np.ndarray, np.ndarray]:
+        enc = self.tokenizer(
+            first, second, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feeds = {k: np.asarray(v, dtype=np.int64) for k, v in enc.items() if k in self.input_names}
+        return self.session.run(None, feeds)[0], feeds["attention_mask"]
+
+    @staticmethod
+    def _length_order(texts: list[str]) -> np.ndarray:
+        # Batch similar lengths together so padding stays small (same trick as sentence-transformers).
+        return np.argsort([-len(t) for t in texts], kind="stable")
+
+
+class OnnxEmbedder(OnnxModel):
+    """Drop-in for `SentenceTransformer.encode`: mean pooling + L2 normalisation."""
+
+    def __init__(self, model_id: str = EMBEDDER_MODEL, quantize: bool = False, max_length: int = 256, **kwargs):
+        super().__init__(model_id, "embed", quantize, max_length, **kwargs)
+
+    def encode(self, texts, batch_size: int = 32, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = self._length_order(texts)
+        parts = []
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            hidden, mask = self._run(batch)
+            parts.append(mean_pool(hidden, mask))
+        out = np.empty((len(texts), parts[0].shape[1]), dtype=np.float32)
+        out[order] = np.concatenate(parts)
+        if normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+
+class OnnxCrossEncoder(OnnxModel):
+    """Drop-in for `CrossEncoder.predict`: sigmoid of the single relevance logit."""
+
+    def __init__(self, model_id: str = CROSS_ENCODER_MODEL, quantize: bool = False, max_length: int = 512, **kwargs):
+        super().__init__(model_id, "rerank", quantize, max_length, **kwargs)
+
+    def predict(self, pairs, batch_size: int = 32, **kwargs) -> np.ndarray:
+        pairs = list(pairs)
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        order = self._length_order([q + d for q, d in pairs])
+        out = np.empty(len(pairs), dtype=np.float32)
+        for start in range(0, len(pairs), batch_size):
+            idx = order[start:start + batch_size]
+            logits, _ = self._run([pairs[i][0] for i in idx], [pairs[i][1] for i in idx])
+            out[idx] = sigmoid(logits[:, 0])
+        return out
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import gc
+import logging
+import os
+from pathlib import Path
+
+from utils.ann import ann_path_for, get_index as get_ann_index
+from utils.artifacts import get_artifacts
+from utils.inference_pool import INFERENCE_WORKERS
+from utils.naming import get_artifact_paths
+from utils.vector_store import collection_exists, reset_client
+
+logger = logging.getLogger("secrag.prefork")
+
+PRELOAD_MODELS = os.getenv("SECRAG_PRELOAD_MODELS", "1") == "1"
+PRELOAD_DOCUMENTS = os.getenv("SECRAG_PRELOAD_DOCUMENTS", "1") == "1"
+
+
+def _preload_models():
+    from utils.citation_verifier import VERIFIER_MODE, _get_nli_model
+    from utils.embeddings import get_model
+    from utils.reranker import _get_cross_encoder
+
+    get_model()
+    _get_cross_encoder()
+    if VERIFIER_MODE == "local":
+        _get_nli_model()
+
+
+def _preload_document(pdf_name: str, data_dir: Path, chroma_dir: str):
+    chunk_path, emb_path = get_artifact_paths(pdf_name, data_dir)
+    if chunk_path.exists() and emb_path.exists():
+        artifacts = get_artifacts(chunk_path, emb_path)
+        artifacts.bm25
+        artifacts.columns
+        artifacts.quantized
+        get_ann_index(emb_path, ann_path_for(emb_path), len(artifacts.chunks), build_missing=False)
+    if collection_exists(pdf_name, chroma_dir):
+        from utils.lexical_index import get_lexical_index
+        get_lexical_index(pdf_name, chroma_dir)
+
+
+def warm_parent(data_dir: Path, chroma_dir: str | None = None):
+    """Load models and per-document indexes once in the master process, before fork.
+
+    Model weights, NumPy index arrays and memory-mapped embeddings are then
+    shared copy-on-write by every worker. `gc.freeze()` moves everything
+    allocated so far into the permanent generation, so the collector in the
+    workers never writes to (and un-shares) those pages. `chroma_dir`
+    defaults to the app's layout, `data_dir/chroma`.
+    """
+    chroma_dir = chroma_dir or str(Path(data_dir) / "chroma")
+    if PRELOAD_MODELS and INFERENCE_WORKERS <= 0:
+        _preload_models()
+    if PRELOAD_DOCUMENTS:
+        pdfs = sorted(p.name for p in Path(data_dir).glob("*.pdf"))
+        for pdf_name in pdfs:
+            try:
+                _preload_document(pdf_name, Path(data_dir), chroma_dir)
+            except Exception as e:
+                logger.warning(f"Prefork: skipped {pdf_name} ({e})")
+        logger.info(f"Prefork: warmed {len(pdfs)} documents")
+    reset_client()
+    gc.collect()
+    gc.freeze()
+
+
+def init_worker(torch_threads: int | None = None):
+    reset_client()
+    if torch_threads:
+        try:
+            import torch
+            torch.set_num_threads(torch_threads)
+        except ImportError:
+            pass
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from utils.artifacts import save_npy_atomic
+
+STORAGE_MODES = ("float32", "float16", "int8")
+EMBEDDING_STORAGE = os.getenv("SECRAG_EMBEDDING_STORAGE", "float32").strip().lower()
+RESCORE_MULT = int(os.getenv("SECRAG_RESCORE_MULT", "4"))
+_SCORE_BLOCK = 2048
+
+if EMBEDDING_STORAGE not in STORAGE_MODES:
+    raise ValueError(f"SECRAG_EMBEDDING_STORAGE must be one of {STORAGE_MODES}")
+
+
+def quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class QuantizedEmbeddings:
+    def __init__(self, mode: str, data: np.ndarray, scales: np.ndarray | None = None):
+        self.mode = mode
+        self.data = data
+        self.scales = scales
+
+    @property
+    def shape(self) -> tuple:
+        return self.data.shape
+
+    def __len__(self):
+        return len(self.data)
+
+    def nbytes(self) -> int:
+        return int(self.data.nbytes + (self.scales.nbytes if self.scales is not None else 0))
+
+    def __getitem__(self, rows) -> np.ndarray:
+        block = np.asarray(self.data[rows], dtype=np.float32)
+        if self.scales is not None:
+            block *= np.asarray(self.scales[rows], dtype=np.float32)[..., None]
+        return block
+
+    def score(self, query: np.ndarray) -> np.ndarray:
+        q = np.asarray(query, dtype=np.float32)
+        out = np.empty(len(self.data), dtype=np.float32)
+        buf = np.empty((min(_SCORE_BLOCK, len(self.data)), self.data.shape[1]), dtype=np.float32)
+        for start in range(0, len(self.data), _SCORE_BLOCK):
+            stop = min(start + _SCORE_BLOCK, len(self.data))
+            block = buf[: stop - start]
+            np.copyto(block, self.data[start:stop], casting="unsafe")
+            out[start:stop] = block @ q
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+
+def quantized_paths(embeddings_path: Path, mode: str) -> tuple[Path, Path | None]:
+    base = embeddings_path.with_suffix("")
+    if mode == "int8":
+        return Path(f"{base}_q8.npy"), Path(f"{base}_q8_scales.npy")
+    return Path(f"{base}_f16.npy"), None
+
+
+def save_quantized(embeddings_path: Path, vectors: np.ndarray, mode: str = EMBEDDING_STORAGE):
+    if mode == "float32":
+        return
+    data_path, scales_path = quantized_paths(embeddings_path, mode)
+    if mode == "int8":
+        codes, scales = quantize_int8(vectors)
+        save_npy_atomic(scales_path, scales)
+        save_npy_atomic(data_path, codes)
+    else:
+        save_npy_atomic(data_path, np.asarray(vectors, dtype=np.float16))
+
+
+def load_quantized(embeddings_path: Path, mode: str = EMBEDDING_STORAGE) -> QuantizedEmbeddings | None:
+    if mode == "float32":
+        return None
+    data_path, scales_path = quantized_paths(embeddings_path, mode)
+    if not data_path.exists() or (scales_path is not None and not scales_path.exists()):
+        return None
+    if data_path.stat().st_mtime < embeddings_path.stat().st_mtime:
+        return None
+    data = np.load(data_path, mmap_mode="r")
+    scales = np.load(scales_path) if scales_path is not None else None
+    return QuantizedEmbeddings(mode, data, scales)
+
+
+def rescore(full: np.ndarray, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+    order = np.argsort(rows)
+    exact = np.empty(len(rows), dtype=np.float32)
+    exact[order] = np.asarray(full[rows[order]], dtype=np.float32) @ query
+    return exact
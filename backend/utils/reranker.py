@@ -1,11 +1,27 @@
 from __future__ import annotations
 
 import os
+import time
 import logging
 from typing import Any
 
+import numpy as np
+
+from utils.deadline import costs, current_deadline
+from utils.tracing import observe_batch, record_event, record_cache
+from utils import inference_pool
+from utils.onnx_models import INFERENCE_BACKEND
+
 logger = logging.getLogger("secrag.reranker")
 
+# Off by default: the skip/truncate tiers read margins off fusion scores, and RRF margins jump with
+# list overlap, not confidence.
+CASCADE = os.getenv("SECRAG_RERANK_CASCADE", "0") == "1"
+SKIP_GAP = float(os.getenv("SECRAG_RERANK_SKIP_GAP", "0.25"))
+TAIL_CUTOFF = float(os.getenv("SECRAG_RERANK_TAIL_CUTOFF", "0.2"))
+FIRST_STAGE_MODEL = os.getenv("SECRAG_RERANK_FIRST_STAGE", "").strip()
+FIRST_STAGE_KEEP = int(os.getenv("SECRAG_RERANK_FIRST_STAGE_KEEP", "0"))
+
 
 _ce_model = None
 _ce_available = None
@@ -13,22 +29,63 @@ _ce_available = None
 
 def _get_cross_encoder():
     global _ce_model, _ce_available
+    record_cache("cross_encoder_model", _ce_available is not None)
     if _ce_available is None:
         try:
-            from sentence_transformers import CrossEncoder
-            _ce_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+            if INFERENCE_BACKEND == "torch":
+                from sentence_transformers import CrossEncoder
+                _ce_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+            else:
+                from utils.onnx_models import OnnxCrossEncoder
+                _ce_model = OnnxCrossEncoder(quantize=INFERENCE_BACKEND == "onnx-int8")
             _ce_available = True
-            logger.info("Reranker: cross-encoder loaded")
+            logger.info(f"Reranker: cross-encoder loaded ({INFERENCE_BACKEND})")
         except Exception as e:
             _ce_available = False
             logger.warning(f"Reranker: cross-encoder unavailable ({e}), falling back to LLM-as-judge")
     return _ce_model if _ce_available else None
 
 
-def _rerank_cross_encoder(query: str, candidates: list[dict]) -> list[dict]:
+_fs_model = None
+_fs_available = None
+
+
+def _get_first_stage():
+    global _fs_model, _fs_available
+    if not FIRST_STAGE_MODEL:
+        return None
+    if _fs_available is None:
+        try:
+            if INFERENCE_BACKEND == "torch":
+                from sentence_transformers import CrossEncoder
+                _fs_model = CrossEncoder(FIRST_STAGE_MODEL)
+            else:
+                from utils.onnx_models import OnnxCrossEncoder
+                _fs_model = OnnxCrossEncoder(FIRST_STAGE_MODEL, quantize=INFERENCE_BACKEND == "onnx-int8")
+            _fs_available = True
+            logger.info(f"Reranker: first-stage model {FIRST_STAGE_MODEL} loaded")
+        except Exception as e:
+            _fs_available = False
+            logger.warning(f"Reranker: first-stage model unavailable ({e}), using the full cross-encoder only")
+    return _fs_model if _fs_available else None
+
+
+def predict_local(pairs: list[tuple[str, str]]):
     model = _get_cross_encoder()
+    if model is None:
+        raise RuntimeError("cross-encoder unavailable")
+    observe_batch("cross-encoder", len(pairs))
+    return model.predict(pairs)
+
+
+def _rerank_cross_encoder(query: str, candidates: list[dict]) -> list[dict]:
     pairs = [(query, c["content"]) for c in candidates]
-    scores = model.predict(pairs)
+    start = time.perf_counter()
+    if inference_pool.get_pool() is not None:
+        scores = inference_pool.predict(pairs)
+    else:
+        scores = predict_local(pairs)
+    costs.observe("rerank_pair", (time.perf_counter() - start) * 1000.0, len(pairs))
     for c, score in zip(candidates, scores):
         c["rerank_score"] = float(score)
         c["rerank_method"] = "cross-encoder"
@@ -80,13 +137,83 @@ def _rerank_llm(query: str, candidates: list[dict]) -> list[dict]:
     return sorted(candidates, key=lambda x: x["rerank_score"], reverse=True)
 
 
+def plan_cascade(scores, top_k: int) -> tuple[str, int]:
+    """Decide from the first-stage score distribution how much reranking a query needs.
+
+    Scores are rescaled to [0, 1] over the candidate range. A gap of at least
+    `SKIP_GAP` right after position `top_k` means the fusion ranking already
+    settles the top-k set ("skip"). Otherwise candidates scoring below
+    `TAIL_CUTOFF` are dropped ("truncate"), keeping at least `top_k`.
+    """
+    scores = np.sort(np.asarray(scores, dtype=np.float64))[::-1]
+    n = len(scores)
+    if n <= top_k:
+        return "full", n
+    spread = scores[0] - scores[-1]
+    if spread <= 1e-12:
+        return "full", n
+    if (scores[top_k - 1] - scores[top_k]) / spread >= SKIP_GAP:
+        return "skip", top_k
+    keep = max(top_k, int(np.count_nonzero((scores - scores[-1]) / spread >= TAIL_CUTOFF)))
+    return ("truncate", keep) if keep < n else ("full", n)
+
+
+def _first_stage(query: str, candidates: list[dict], keep: int) -> list[dict]:
+    model = _get_first_stage()
+    if model is None or len(candidates) <= keep:
+        return candidates
+    pairs = [(query, c["content"]) for c in candidates]
+    observe_batch("first-stage", len(pairs))
+    scores = np.asarray(model.predict(pairs), dtype=np.float32)
+    order = np.argsort(-scores, kind="stable")[:keep]
+    record_event("rerank_tier_first_stage")
+    return [candidates[int(i)] for i in order]
+
+
 def rerank(query: str, candidates: list[dict], top_k: int = 5) -> list[dict]:
 
     if not candidates:
         return []
 
-    model = _get_cross_encoder()
-    if model is not None:
+    if CASCADE:
+        candidates = sorted(candidates, key=lambda c: c.get("score", 0.0), reverse=True)
+        tier, n = plan_cascade([c.get("score", 0.0) for c in candidates], top_k)
+        record_event(f"rerank_tier_{tier}")
+        if tier == "skip":
+            # No model scored these, so rerank_score stays None and `score` keeps the fusion value.
+            for c in candidates[:top_k]:
+                c["rerank_score"] = None
+                c["rerank_method"] = "skipped"
+            return candidates[:top_k]
+        candidates = _first_stage(query, candidates[:n], FIRST_STAGE_KEEP or 2 * top_k)
+
+    deadline = current_deadline()
+    if deadline is not None:
+        affordable = deadline.affordable_units("rerank_pair")
+        if affordable < min(top_k, len(candidates)):
+            # Not enough time left to rerank even the final top_k: keep the fusion order.
+            deadline.degrade("rerank_skipped")
+            costs.relax("rerank_pair")
+            ranked = sorted(candidates, key=lambda c: c.get("score", 0.0), reverse=True)[:top_k]
+            for c in ranked:
+                c["rerank_score"] = None
+                c["rerank_method"] = "skipped"
+            return ranked
+        if affordable < len(candidates):
+            deadline.degrade("rerank_truncated")
+            costs.relax("rerank_pair")
+            candidates = sorted(candidates, key=lambda c: c.get("score", 0.0), reverse=True)[:affordable]
+
+    if CASCADE:
+        record_event("rerank_pairs_scored", len(candidates))
+
+    if inference_pool.get_pool() is not None:
+        try:
+            ranked = _rerank_cross_encoder(query, candidates)
+        except Exception as e:
+            logger.warning(f"Reranker: inference pool failed ({e}), falling back to LLM-as-judge")
+            ranked = _rerank_llm(query, candidates)
+    elif _get_cross_encoder() is not None:
         ranked = _rerank_cross_encoder(query, candidates)
     else:
         ranked = _rerank_llm(query, candidates)
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import math
+
+
+def recall_at_k(ranked_ids: list, relevant: dict, k: int) -> float:
+    if not relevant:
+        return 1.0
+    hits = sum(1 for cid in ranked_ids[:k] if relevant.get(str(cid), 0) > 0)
+    return hits / len(relevant)
+
+
+def mrr(ranked_ids: list, relevant: dict) -> float:
+    for rank, cid in enumerate(ranked_ids, start=1):
+        if relevant.get(str(cid), 0) > 0:
+            return 1.0 / rank
+    return 0.0
+
+
+def ndcg_at_k(ranked_ids: list, relevant: dict, k: int) -> float:
+    dcg = 0.0
+    for rank, cid in enumerate(ranked_ids[:k], start=1):
+        gain = relevant.get(str(cid), 0)
+        if gain:
+            dcg += (2 ** gain - 1) / math.log2(rank + 1)
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum((2 ** g - 1) / math.log2(i + 2) for i, g in enumerate(ideal))
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = (len(ordered) - 1) * p / 100.0
+    lo, hi = math.floor(idx), math.ceil(idx)
+    if lo == hi:
+        return float(ordered[lo])
+    return float(ordered[lo] + (ordered[hi] - ordered[lo]) * (idx - lo))
+
+
+def latency_summary(latencies_ms: list[float], wall_seconds: float | None = None) -> dict:
+    total_s = wall_seconds if wall_seconds is not None else sum(latencies_ms) / 1000.0
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "qps": round(len(latencies_ms) / total_s, 1) if total_s > 0 else 0.0,
+    }
+
+
+def score_run(runs: dict[str, list], qrels: dict[str, dict], ks: tuple = (1, 5, 10)) -> dict:
+    out = {f"recall@{k}": 0.0 for k in ks}
+    out.update({"mrr": 0.0, "ndcg@10": 0.0})
+    if not qrels:
+        return out
+    for qid, relevant in qrels.items():
+        ranked = runs.get(qid, [])
+        for k in ks:
+            out[f"recall@{k}"] += recall_at_k(ranked, relevant, k)
+        out["mrr"] += mrr(ranked, relevant)
+        out["ndcg@10"] += ndcg_at_k(ranked, relevant, 10)
+    return {k: round(v / len(qrels), 4) for k, v in out.items()}
@@ -1,34 +1,27 @@
 from __future__ import annotations
 
-import json
 import logging
 from pathlib import Path
 
 import numpy as np
 
 from utils.embeddings import embed_query
-from utils.bm25 import build_bm25, bm25_scores
+from utils.bm25 import bm25_scores
+from utils.artifacts import get_artifacts
+from utils.ann import ann_path_for, get_index as get_ann_index
+from utils.catalog import get_catalog
+from utils.quantization import RESCORE_MULT, rescore
+from utils.fusion import linear, rrf, top_k as fusion_top_k
+from utils.filters import ChunkFilter
 from utils.vector_store import query_collection
+from utils.lexical_index import sparse_search
+from utils.deadline import current_deadline
+from utils.tracing import span
 
 logger = logging.getLogger("secrag.retriever")
 
 
 
-def load_chunks(chunks_path: Path) -> list[dict]:
-    with open(chunks_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    if not isinstance(data, list):
-        raise ValueError("Chunks JSON must be a list")
-    return data
-
-
-def load_embeddings(embeddings_path: Path) -> np.ndarray:
-    emb = np.load(embeddings_path).astype(np.float32)
-    if emb.ndim != 2:
-        raise ValueError("Embeddings must be 2D (num_chunks, dim)")
-    return emb
-
-
 def _minmax_norm(arr: np.ndarray) -> np.ndarray:
     mn, mx = float(np.min(arr)), float(np.max(arr))
     if mx - mn < 1e-9:
@@ -36,13 +29,14 @@ def _minmax_norm(arr: np.ndarray) -> np.ndarray:
     return ((arr - mn) / (mx - mn)).astype(np.float32)
 
 
-def _build_results(chunks: list, indices: np.ndarray, scores: np.ndarray, min_score=None) -> list[dict]:
+def _build_results(chunks: list, indices: np.ndarray, scores: np.ndarray, min_score=None,
+                   rows: np.ndarray | None = None) -> list[dict]:
     results = []
     for idx in indices:
         sc = float(scores[int(idx)])
         if min_score is not None and sc < float(min_score):
             continue
-        ch = chunks[int(idx)]
+        ch = chunks[int(rows[idx]) if rows is not None else int(idx)]
         results.append({
             "score": sc,
             "chunk_id": ch.get("chunk_id"),
@@ -53,36 +47,46 @@ def _build_results(chunks: list, indices: np.ndarray, scores: np.ndarray, min_sc
                 "created_at": ch.get("created_at"),
                 "char_start": ch.get("char_start"),
                 "char_end": ch.get("char_end"),
+                "page_start": ch.get("page_start"),
+                "page_end": ch.get("page_end"),
+                "chunk_strategy": ch.get("chunk_strategy"),
             },
         })
     return results
 
 
 
-def _rrf_fuse(dense_ranked: list[dict], sparse_ranked: list[dict], k: int = 60) -> list[dict]:
+def merge_ranked(ranked_lists: list[list[dict]], k: int = 60, limit: int | None = None) -> list[dict]:
+    """RRF over any number of ranked result lists; items are keyed by (filename, chunk_id)."""
+    positions: dict[tuple, int] = {}
+    items: list[dict] = []
 
-    scores: dict[str, float] = {}
-    chunk_map: dict[str, dict] = {}
+    def _encode(ranked: list[dict]) -> np.ndarray:
+        out = np.empty(len(ranked), dtype=np.int64)
+        for rank, item in enumerate(ranked):
+            key = (item.get("filename"), str(item["chunk_id"]))
+            pos = positions.get(key)
+            if pos is None:
+                pos = positions[key] = len(items)
+                items.append(item)
+            out[rank] = pos
+        return out
 
-    for rank, item in enumerate(dense_ranked, start=1):
-        cid = str(item["chunk_id"])
-        scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
-        chunk_map[cid] = item
+    rankings = [_encode(ranked) for ranked in ranked_lists]
+    if not items:
+        return []
 
-    for rank, item in enumerate(sparse_ranked, start=1):
-        cid = str(item["chunk_id"])
-        scores[cid] = scores.get(cid, 0.0) + 1.0 / (k + rank)
-        if cid not in chunk_map:
-            chunk_map[cid] = item
+    scores = rrf(rankings, len(items), k=k)
+    idx, vals = fusion_top_k(scores, limit or len(items))
 
-    fused = []
-    for cid, rrf_score in sorted(scores.items(), key=lambda x: x[1], reverse=True):
-        item = dict(chunk_map[cid])
-        item["score"] = round(rrf_score, 6)
-        item["fusion_method"] = "rrf"
-        fused.append(item)
+    return [
+        {**items[int(i)], "score": round(float(v), 6), "fusion_method": "rrf"}
+        for i, v in zip(idx[0], vals[0])
+    ]
 
-    return fused
+
+def _rrf_fuse(dense_ranked: list[dict], sparse_ranked: list[dict], k: int = 60, limit: int | None = None) -> list[dict]:
+    return merge_ranked([dense_ranked, sparse_ranked], k=k, limit=limit)
 
 
 def retrieve_top_k(
@@ -97,12 +101,17 @@ def retrieve_top_k(
     chunks_path: Path | None = None,
     embeddings_path: Path | None = None,
     candidate_mult: int = 4,
+    nprobe: int | None = None,
+    filters: ChunkFilter | dict | None = None,
 ) -> list[dict]:
 
     if not query or not query.strip():
         raise ValueError("Query cannot be empty")
     if top_k <= 0:
         raise ValueError("top_k must be > 0")
+    chunk_filter = filters if isinstance(filters, ChunkFilter) else ChunkFilter.from_dict(filters)
+    if chunk_filter is not None and chunk_filter.is_empty():
+        chunk_filter = None
 
     mode = (mode or "hybrid").lower().strip()
     if mode not in {"hybrid", "semantic", "bm25"}:
@@ -118,6 +127,7 @@ def retrieve_top_k(
             use_reranker=use_reranker,
             candidate_mult=candidate_mult,
             chroma_dir=chroma_dir,
+            chunk_filter=chunk_filter,
         )
 
     if chunks_path is None or embeddings_path is None:
@@ -131,6 +141,8 @@ def retrieve_top_k(
         mode=mode,
         alpha=alpha,
         candidate_mult=candidate_mult,
+        nprobe=nprobe,
+        chunk_filter=chunk_filter,
     )
 
 
@@ -143,38 +155,42 @@ def _retrieve_chromadb(
     use_reranker: bool,
     candidate_mult: int,
     chroma_dir: str = "./data/chroma",
+    chunk_filter: ChunkFilter | None = None,
 ) -> list[dict]:
-    query_vec = embed_query(query)
+    deadline = current_deadline()
+    if deadline is not None and use_reranker:
+        # Fetch only as many candidates as the reranker can score in the time left.
+        affordable = deadline.affordable_units("rerank_pair") // top_k
+        if affordable < candidate_mult:
+            candidate_mult = max(1, affordable)
+            deadline.degrade("candidates_reduced")
     candidate_k = top_k * candidate_mult
+    where = chunk_filter.to_where() if chunk_filter is not None else None
 
     dense_results: list[dict] = []
     sparse_results: list[dict] = []
 
     if mode in {"semantic", "hybrid"}:
-        dense_results = query_collection(pdf_name, query_vec, top_k=candidate_k, persist_dir=chroma_dir)
+        with span("embed_query"):
+            query_vec = embed_query(query)
+        with span("query_collection"):
+            dense_results = query_collection(
+                pdf_name, query_vec, top_k=candidate_k, persist_dir=chroma_dir, where=where
+            )
 
     if mode in {"bm25", "hybrid"}:
-        if dense_results:
-            bm25_corpus = dense_results
-        else:
-            bm25_corpus = query_collection(pdf_name, query_vec, top_k=min(200, candidate_k * 5), persist_dir=chroma_dir)
-
-        if bm25_corpus:
-            bm25 = build_bm25(bm25_corpus)
-            bm25_raw = np.array(bm25_scores(bm25, query), dtype=np.float32)
-            bm25_norm = _minmax_norm(bm25_raw)
-            sparse_results = [
-                {**bm25_corpus[i], "score": float(bm25_norm[i])}
-                for i in np.argsort(-bm25_norm)[:candidate_k]
-            ]
-
- 
+        with span("bm25_search"):
+            sparse_results = sparse_search(
+                pdf_name, query, top_k=candidate_k, persist_dir=chroma_dir, chunk_filter=chunk_filter
+            )
+
     if mode == "semantic":
         candidates = dense_results[:candidate_k]
     elif mode == "bm25":
         candidates = sparse_results[:candidate_k]
     else:
-        candidates = _rrf_fuse(dense_results, sparse_results)[:candidate_k]
+        with span("fuse"):
+            candidates = _rrf_fuse(dense_results, sparse_results, limit=candidate_k)
 
     if min_score is not None:
         candidates = [c for c in candidates if c["score"] >= min_score]
@@ -182,7 +198,8 @@ def _retrieve_chromadb(
     if use_reranker and candidates:
         try:
             from utils.reranker import rerank
-            candidates = rerank(query, candidates, top_k=top_k)
+            with span("rerank"):
+                candidates = rerank(query, candidates, top_k=top_k)
         except Exception as e:
             logger.warning(f"Reranker failed ({e}), using fusion order")
             candidates = candidates[:top_k]
@@ -192,6 +209,38 @@ def _retrieve_chromadb(
     return candidates
 
 
+def _register_ann_index(ann_path: Path):
+    """Record an index built after upload with its document, so deletion removes it."""
+    if not (ann_path.parent / "catalog.sqlite3").exists():
+        return
+    filename = ann_path.name[: -len("_ivf.npz")] + ".pdf"
+    if not get_catalog(ann_path.parent).add_artifact(filename, ann_path):
+        # The document was deleted while the index was being built.
+        ann_path.unlink(missing_ok=True)
+
+
+def _dense_scores(embeddings, compact, ann, q: np.ndarray, k_dense: int, nprobe: int | None):
+    if ann is None and compact is None:
+        return (embeddings @ q).astype(np.float32), True
+
+    fetch = min(len(embeddings), k_dense * RESCORE_MULT if compact is not None else k_dense)
+    if ann is not None:
+        idx, scores = ann.search(compact if compact is not None else embeddings, q, fetch, nprobe=nprobe)
+        keep = idx[0] >= 0
+        idx, scores = idx[0][keep], scores[0][keep]
+    else:
+        approx = compact.score(q)
+        idx = np.argpartition(-approx, fetch - 1)[:fetch]
+        scores = approx[idx]
+
+    if compact is not None:
+        scores = rescore(embeddings, idx, q)
+
+    out = np.full(len(embeddings), -1.0, dtype=np.float32)
+    out[idx] = scores
+    return out, False
+
+
 def _retrieve_legacy(
     chunks_path: Path,
     embeddings_path: Path,
@@ -201,49 +250,78 @@ def _retrieve_legacy(
     mode: str,
     alpha: float,
     candidate_mult: int,
+    nprobe: int | None = None,
+    chunk_filter: ChunkFilter | None = None,
 ) -> list[dict]:
-    chunks = load_chunks(chunks_path)
-    n = len(chunks)
-    if n == 0:
+    with span("load_artifacts"):
+        artifacts = get_artifacts(chunks_path, embeddings_path)
+    chunks = artifacts.chunks
+    total = len(chunks)
+    if total == 0:
         return []
 
+    rows = None
+    if chunk_filter is not None:
+        with span("filter"):
+            rows = np.flatnonzero(chunk_filter.mask(artifacts.columns))
+        if len(rows) == 0:
+            return []
+    n = total if rows is None else len(rows)
+
     bm25_norm = None
     if mode in {"bm25", "hybrid"}:
-        bm25 = build_bm25(chunks)
-        bm25_raw = np.array(bm25_scores(bm25, query), dtype=np.float32)
+        with span("load_bm25"):
+            bm25 = artifacts.bm25
+        with span("bm25_score"):
+            bm25_raw = np.asarray(bm25_scores(bm25, query), dtype=np.float32)
+            if rows is not None:
+                bm25_raw = bm25_raw[rows]
         bm25_norm = _minmax_norm(bm25_raw)
 
     emb_norm = None
     if mode in {"semantic", "hybrid"}:
-        embeddings = load_embeddings(embeddings_path)
-        if n != embeddings.shape[0]:
+        with span("load_embeddings"):
+            embeddings = artifacts.embeddings
+            compact = artifacts.quantized
+        if total != embeddings.shape[0]:
             raise ValueError("Mismatch: chunks count != embeddings rows")
-        q = embed_query(query)
-        emb_scores = (embeddings @ q).astype(np.float32)
+        with span("embed_query"):
+            q = embed_query(query)
+        if rows is not None:
+            with span("dense_score"):
+                embeddings = np.asarray(embeddings[rows], dtype=np.float32)
+                emb_scores, dense_exact = embeddings @ q, True
+        else:
+            with span("load_ann_index"):
+                ann = get_ann_index(embeddings_path, ann_path_for(embeddings_path), n, on_built=_register_ann_index)
+            with span("dense_score"):
+                k_dense = min(n, top_k if mode == "semantic" else top_k * candidate_mult)
+                emb_scores, dense_exact = _dense_scores(embeddings, compact, ann, q, k_dense, nprobe)
         emb_norm = ((emb_scores + 1.0) / 2.0).clip(0.0, 1.0).astype(np.float32)
 
     if mode == "semantic":
         k = min(top_k, n)
         idx = np.argpartition(-emb_norm, k - 1)[:k]
         idx = idx[np.argsort(-emb_norm[idx])]
-        return _build_results(chunks, idx, emb_norm, min_score=min_score)
+        return _build_results(chunks, idx, emb_norm, min_score=min_score, rows=rows)
 
     if mode == "bm25":
         k = min(top_k, n)
         idx = np.argpartition(-bm25_norm, k - 1)[:k]
         idx = idx[np.argsort(-bm25_norm[idx])]
-        return _build_results(chunks, idx, bm25_norm, min_score=min_score)
+        return _build_results(chunks, idx, bm25_norm, min_score=min_score, rows=rows)
 
     if not (0.0 <= alpha <= 1.0):
         raise ValueError("alpha must be between 0 and 1")
     k_candidates = min(n, top_k * candidate_mult)
-    idx_emb = np.argpartition(-emb_norm, k_candidates - 1)[:k_candidates]
-    idx_bm = np.argpartition(-bm25_norm, k_candidates - 1)[:k_candidates]
-    candidate_set = set(map(int, idx_emb)) | set(map(int, idx_bm))
-    candidate_idx = np.array(list(candidate_set), dtype=np.int32)
-    final_scores = alpha * emb_norm[candidate_idx] + (1.0 - alpha) * bm25_norm[candidate_idx]
-    order = np.argsort(-final_scores)
-    chosen = candidate_idx[order][: min(top_k, len(order))]
-    final_full = np.zeros((n,), dtype=np.float32)
-    final_full[candidate_idx] = final_scores.astype(np.float32)
-    return _build_results(chunks, chosen, final_full, min_score=min_score)
+    with span("fuse"):
+        idx_emb = np.argpartition(-emb_norm, k_candidates - 1)[:k_candidates]
+        idx_bm = np.argpartition(-bm25_norm, k_candidates - 1)[:k_candidates]
+        if not dense_exact:
+            bm_rows = np.sort(idx_bm)
+            emb_norm[bm_rows] = ((np.asarray(embeddings[bm_rows]) @ q + 1.0) / 2.0).clip(0.0, 1.0)
+        fused = linear([emb_norm, bm25_norm], [alpha, 1.0 - alpha], candidates=[idx_emb, idx_bm])
+        chosen, chosen_scores = fusion_top_k(fused, top_k)
+    chosen = chosen[0][np.isfinite(chosen_scores[0])]
+    final_full = np.where(np.isfinite(fused[0]), fused[0], 0.0).astype(np.float32)
+    return _build_results(chunks, chosen, final_full, min_score=min_score, rows=rows)
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from urllib.parse import quote
+
+import httpx
+
+from utils.catalog import get_catalog
+from utils.filters import ChunkFilter
+from utils.naming import get_artifact_paths
+from utils.retriever import merge_ranked, retrieve_top_k
+from utils.tracing import record_event, span
+
+logger = logging.getLogger("secrag.sharding")
+
+SHARD_URLS = [u.strip().rstrip("/") for u in os.getenv("SECRAG_SHARDS", "").split(",") if u.strip()]
+SHARD_TIMEOUT_MS = float(os.getenv("SECRAG_SHARD_TIMEOUT_MS", "2000"))
+SHARD_UPLOAD_TIMEOUT = float(os.getenv("SECRAG_SHARD_UPLOAD_TIMEOUT", "600"))
+SHARD_DELETE_TIMEOUT = float(os.getenv("SECRAG_SHARD_DELETE_TIMEOUT", "60"))
+SHARD_REQUEST_TIMEOUT = float(os.getenv("SECRAG_SHARD_REQUEST_TIMEOUT", "120"))
+
+
+def shard_for(filename: str, shards: list[str] | None = None) -> str:
+    """Rendezvous hashing: adding or removing a shard only moves the documents it owns."""
+    shards = shards or SHARD_URLS
+    if not shards:
+        raise ValueError("No shards configured")
+    return max(shards, key=lambda url: hashlib.blake2b(f"{url}|{filename}".encode(), digest_size=8).digest())
+
+
+def local_search(
+    query: str,
+    data_dir: Path,
+    filenames: list[str] | None = None,
+    top_k: int = 5,
+    mode: str = "hybrid",
+    alpha: float = 0.7,
+    filters: dict | None = None,
+) -> list[dict]:
+    """Shard-side search: retrieve from each local document, then RRF-merge across documents."""
+    if filenames is None:
+        filenames = get_catalog(data_dir).document_names()
+    ranked = []
+    for name in filenames:
+        chunk_path, emb_path = get_artifact_paths(name, data_dir)
+        if not chunk_path.exists() or not emb_path.exists():
+            continue
+        ranked.append(retrieve_top_k(
+            query=query,
+            top_k=top_k,
+            mode=mode,
+            alpha=alpha,
+            chunks_path=chunk_path,
+            embeddings_path=emb_path,
+            filters=filters,
+        ))
+    if len(ranked) == 1:
+        return ranked[0][:top_k]
+    return merge_ranked(ranked, limit=top_k)
+
+
+_client: httpx.Client | None = None
+_executor: ThreadPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def _http() -> tuple[httpx.Client, ThreadPoolExecutor]:
+    global _client, _executor
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _executor = ThreadPoolExecutor(max_workers=max(8, 4 * len(SHARD_URLS)), thread_name_prefix="shard")
+                _client = httpx.Client(limits=httpx.Limits(max_keepalive_connections=4 * max(1, len(SHARD_URLS))))
+    return _client, _executor
+
+
+SHARD_KEY_HEADER = "X-SHARD-KEY"
+
+
+def _auth_headers() -> dict:
+    headers = {}
+    key = os.getenv("SECRAG_API_KEY", "").strip()
+    if key:
+        headers["X-API-KEY"] = key
+    # Marks the call as coordinator traffic, already admitted there, so the shard skips per-key limits.
+    shard_key = os.getenv("SECRAG_SHARD_KEY", "").strip()
+    if shard_key:
+        headers[SHARD_KEY_HEADER] = shard_key
+    return headers
+
+
+def _search_shard(url: str, payload: dict, timeout_s: float) -> tuple[list[dict], float]:
+    client, _ = _http()
+    t0 = time.perf_counter()
+    resp = client.post(f"{url}/shard/search", json=payload, headers=_auth_headers(), timeout=timeout_s)
+    resp.raise_for_status()
+    return resp.json()["results"], (time.perf_counter() - t0) * 1000.0
+
+
+def scatter_gather(
+    query: str,
+    top_k: int = 5,
+    mode: str = "hybrid",
+    alpha: float = 0.7,
+    filters: dict | None = None,
+    filenames: list[str] | None = None,
+    shards: list[str] | None = None,
+    candidate_mult: int = 4,
+    use_reranker: bool = True,
+    timeout_ms: float | None = None,
+) -> tuple[list[dict], dict]:
+    """Fan a query out to every shard that can hold a match, merge, rerank globally.
+
+    Shards that miss the deadline or fail are reported and skipped, so the
+    caller gets partial results rather than waiting on the slowest node.
+    """
+    if not query or not query.strip():
+        raise ValueError("Query cannot be empty")
+    if top_k <= 0:
+        raise ValueError("top_k must be > 0")
+    if (mode or "").lower().strip() not in {"hybrid", "semantic", "bm25"}:
+        raise ValueError("mode must be one of: hybrid, semantic, bm25")
+    ChunkFilter.from_dict(filters)
+    shards = shards or SHARD_URLS
+    if not shards:
+        raise ValueError("No shards configured")
+
+    if filenames:
+        targets: dict[str, list[str] | None] = {}
+        for name in filenames:
+            targets.setdefault(shard_for(name, shards), []).append(name)
+    else:
+        targets = {url: None for url in shards}
+
+    timeout_s = (timeout_ms or SHARD_TIMEOUT_MS) / 1000.0
+    candidate_k = top_k * candidate_mult
+    _, executor = _http()
+    with span("scatter"):
+        futures = {
+            executor.submit(_search_shard, url, {
+                "query": query, "filenames": names, "top_k": candidate_k,
+                "mode": mode, "alpha": alpha, "filters": filters,
+            }, timeout_s): url
+            for url, names in targets.items()
+        }
+        _, pending = wait(futures, timeout=timeout_s)
+
+    report: dict[str, dict] = {}
+    ranked: list[list[dict]] = []
+    for fut, url in futures.items():
+        if fut in pending:
+            fut.cancel()
+            record_event("shard_timeout")
+            report[url] = {"status": "timeout"}
+            continue
+        try:
+            results, ms = fut.result()
+        except httpx.TimeoutException:
+            record_event("shard_timeout")
+            report[url] = {"status": "timeout"}
+            continue
+        except Exception as e:
+            record_event("shard_error")
+            logger.warning(f"Shard {url} failed: {e}")
+            report[url] = {"status": "error", "error": str(e)}
+            continue
+        ranked.append(results)
+        report[url] = {"status": "ok", "results": len(results), "ms": round(ms, 2)}
+
+    with span("merge"):
+        candidates = merge_ranked(ranked, limit=candidate_k)
+
+    if use_reranker and candidates:
+        try:
+            from utils.reranker import rerank
+            with span("rerank"):
+                candidates = rerank(query, candidates, top_k=top_k)
+        except Exception as e:
+            logger.warning(f"Reranker failed ({e}), using fusion order")
+            candidates = candidates[:top_k]
+    else:
+        candidates = candidates[:top_k]
+    return candidates, report
+
+
+def _body(resp: httpx.Response) -> dict:
+    """JSON body of a shard response; proxies and crashed workers can answer 5xx with plain text."""
+    try:
+        body = resp.json()
+    except ValueError:
+        return {"detail": resp.text[:500] or resp.reason_phrase}
+    return body if isinstance(body, dict) else {"detail": body}
+
+
+def forward_upload(shard: str, path: Path, filename: str, params: dict) -> tuple[int, dict]:
+    client, _ = _http()
+    with open(path, "rb") as f:
+        resp = client.post(
+            f"{shard}/upload",
+            params=params,
+            files={"file": (filename, f, "application/pdf")},
+            headers=_auth_headers(),
+            timeout=SHARD_UPLOAD_TIMEOUT,
+        )
+    return resp.status_code, _body(resp)
+
+
+def forward_delete(shard: str, filename: str) -> tuple[int, dict]:
+    client, _ = _http()
+    resp = client.delete(
+        f"{shard}/documents/{quote(filename, safe='')}", headers=_auth_headers(), timeout=SHARD_DELETE_TIMEOUT
+    )
+    return resp.status_code, _body(resp)
+
+
+def forward_request(shard: str, path: str, payload: dict) -> tuple[int, dict]:
+    """Replay a single-document request (/retrieve, /answer, /summarize) on the shard that owns the document."""
+    client, _ = _http()
+    resp = client.post(f"{shard}{path}", json=payload, headers=_auth_headers(), timeout=SHARD_REQUEST_TIMEOUT)
+    return resp.status_code, _body(resp)
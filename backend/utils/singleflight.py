@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+from typing import Any, Callable
+
+from utils.tracing import record_singleflight, span
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return _WS_RE.sub(" ", query or "").strip().casefold()
+
+
+def request_key(version: Any, **params) -> str:
+    """Stable key for a request: its parameters (query normalised) plus the document version."""
+    if "query" in params:
+        params["query"] = normalize_query(params["query"])
+    return json.dumps({"v": version, **params}, sort_keys=True, default=str)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """At most one in-flight computation per key; concurrent callers with the same key share its outcome.
+
+    Nothing is cached: once the leader finishes, the next caller starts a
+    new computation. Results are shared objects, so callers must not mutate
+    them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float | None = None) -> tuple[Any, bool]:
+        """Return `(result, coalesced)`; exceptions from the leader are re-raised in every caller.
+
+        A coalesced caller waits at most `timeout` seconds for the leader and
+        then raises `TimeoutError`; the leader itself is never interrupted.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        record_singleflight(self.name, not leader)
+
+        if not leader:
+            with span("singleflight_wait"):
+                finished = call.done.wait(timeout)
+            if not finished:
+                raise TimeoutError("Deadline exceeded waiting for an identical request in flight")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -2,19 +2,24 @@ import os
 from dotenv import load_dotenv
 from openai import OpenAI
 
+from utils.context import assemble_context
+
 load_dotenv()
 
 
-def summarize_from_chunks(filename: str, chunks: list, max_output_tokens: int = 350) -> str:
+def summarize_from_chunks(filename: str, chunks: list, max_output_tokens: int = 350,
+                          context_stats: dict | None = None) -> str:
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise ValueError("OPENAI_API_KEY not set.")
 
     client = OpenAI(api_key=api_key)
 
-    context = "\n\n".join(
-        f"[Chunk {c.get('chunk_id')} | Score {round(float(c.get('score', 0.0)), 3)}]\n{c.get('content','')}"
-        for c in chunks
+    # No query here: overlaps are merged and the budget trims the lowest-ranked chunks first.
+    context = assemble_context(
+        chunks,
+        label=lambda c: f"[Chunk {c.get('chunk_id')} | Score {round(float(c.get('score', 0.0)), 3)}]",
+        stats=context_stats,
     )
 
     prompt = f"""
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a about above after again against all am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her
+here hers herself him himself his how i if in into is it its itself just me more most my myself no nor not
+now of off on once only or other our ours ourselves out over own same she should so some such than that the
+their theirs them themselves then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours yourself yourselves s t
+""".split())
+
+_STEP1_SUFFIXES = (
+    ("sses", "ss"), ("ies", "i"), ("ss", "ss"), ("s", ""),
+)
+_STEP2_SUFFIXES = (
+    ("ational", "ate"), ("tional", "tion"), ("ization", "ize"), ("fulness", "ful"), ("ousness", "ous"),
+    ("iveness", "ive"), ("biliti", "ble"), ("ation", "ate"), ("alism", "al"), ("aliti", "al"),
+    ("iviti", "ive"), ("ement", ""), ("ment", ""), ("ness", ""), ("ator", "ate"), ("izer", "ize"),
+    ("able", ""), ("ible", ""), ("ance", ""), ("ence", ""), ("ful", ""), ("ous", ""), ("ive", ""),
+)
+_VOWELS = set("aeiouy")
+
+
+def _has_vowel(s: str) -> bool:
+    return any(ch in _VOWELS for ch in s)
+
+
+@lru_cache(maxsize=200_000)
+def stem(token: str) -> str:
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    w = token
+    for suf, rep in _STEP1_SUFFIXES:
+        if w.endswith(suf):
+            if suf == "s" and (w.endswith("us") or w.endswith("is")):
+                break
+            w = w[: len(w) - len(suf)] + rep
+            break
+    for suf in ("eed", "ed", "ing"):
+        if w.endswith(suf):
+            base = w[: len(w) - len(suf)]
+            if suf == "eed":
+                w = base + "ee"
+            elif _has_vowel(base) and len(base) >= 3:
+                w = base
+                if len(w) > 2 and w[-1] == w[-2] and w[-1] not in "lsz":
+                    w = w[:-1]
+            break
+    for suf, rep in _STEP2_SUFFIXES:
+        if w.endswith(suf) and len(w) - len(suf) >= 3:
+            w = w[: len(w) - len(suf)] + rep
+            break
+    if w.endswith("y") and len(w) > 3 and w[-2] not in _VOWELS:
+        w = w[:-1] + "i"
+    elif w.endswith("e") and len(w) > 4:
+        w = w[:-1]
+    return w
+
+
+class Tokenizer:
+    def __init__(self, use_stemming: bool = True, remove_stopwords: bool = True, min_len: int = 1):
+        self.use_stemming = use_stemming
+        self.remove_stopwords = remove_stopwords
+        self.min_len = min_len
+
+    def tokenize(self, text: str) -> list[str]:
+        toks = _TOKEN_RE.findall(text.lower())
+        if self.remove_stopwords:
+            toks = [t for t in toks if t not in STOPWORDS]
+        if self.min_len > 1:
+            toks = [t for t in toks if len(t) >= self.min_len]
+        if self.use_stemming:
+            toks = [stem(t) for t in toks]
+        return toks
+
+    def config(self) -> dict:
+        return {
+            "use_stemming": self.use_stemming,
+            "remove_stopwords": self.remove_stopwords,
+            "min_len": self.min_len,
+        }
+
+
+class Vocabulary:
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, tokens: list[str]) -> np.ndarray:
+        ids = self._ids
+        out = np.empty(len(tokens), dtype=np.int32)
+        for i, t in enumerate(tokens):
+            tid = ids.get(t)
+            if tid is None:
+                tid = ids[t] = len(ids)
+            out[i] = tid
+        return out
+
+    def lookup(self, tokens: list[str]) -> np.ndarray:
+        ids = self._ids
+        return np.fromiter((ids[t] for t in tokens if t in ids), dtype=np.int32)
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    val = os.getenv(name)
+    if val is None or not val.strip():
+        return default
+    return val.strip().lower() in {"1", "true", "yes", "on"}
+
+
+_default: Tokenizer | None = None
+
+
+def get_tokenizer() -> Tokenizer:
+    global _default
+    if _default is None:
+        _default = Tokenizer(
+            use_stemming=_env_flag("SECRAG_BM25_STEM", True),
+            remove_stopwords=_env_flag("SECRAG_BM25_STOPWORDS", True),
+        )
+    return _default
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+_LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("secrag_trace", default=None)
+_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, labels: dict | None = None):
+        key = tuple(sorted((labels or {}).items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {k: (list(v[0]), v[1], v[2]) for k, v in self._series.items()}
+        for key, (counts, total, n) in sorted(series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_labels(key, le=_fmt(bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(key, le='+Inf')} {n}")
+            lines.append(f"{self.name}_sum{_labels(key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(key)} {n}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._series: dict[tuple, float] = {}
+
+    def inc(self, labels: dict | None = None, amount: float = 1.0):
+        key = tuple(sorted((labels or {}).items()))
+        with _lock:
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with _lock:
+            series = dict(self._series)
+        for key, v in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(key)} {_fmt(v)}")
+        return lines
+
+
+def _fmt(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _labels(key: tuple, **extra) -> str:
+    pairs = list(key) + list(extra.items())
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+STAGE_LATENCY = Histogram("secrag_stage_duration_ms", "Pipeline stage latency in milliseconds.", _LATENCY_BUCKETS_MS)
+REQUEST_LATENCY = Histogram("secrag_request_duration_ms", "HTTP request latency in milliseconds.", _LATENCY_BUCKETS_MS)
+BATCH_SIZE = Histogram("secrag_model_batch_size", "Items per model inference call.", _SIZE_BUCKETS)
+CACHE_REQUESTS = Counter("secrag_cache_requests_total", "Cache lookups by cache and result.")
+EVENTS = Counter("secrag_events_total", "Named pipeline events.")
+MODEL_TOKENS = Counter("secrag_model_tokens_total", "Tokens fed to a model, real and as padded batch size.")
+MODEL_SECONDS = Counter("secrag_model_seconds_total", "Wall time spent in bulk model calls.")
+ADMISSION = Counter("secrag_admission_requests_total", "Admission decisions by lane and result.")
+SINGLEFLIGHT = Counter("secrag_singleflight_requests_total", "Requests that ran a computation (leader) or joined one in flight (coalesced).")
+
+_METRICS = [REQUEST_LATENCY, STAGE_LATENCY, BATCH_SIZE, CACHE_REQUESTS, EVENTS, MODEL_TOKENS, MODEL_SECONDS, SINGLEFLIGHT, ADMISSION]
+
+
+class Trace:
+    __slots__ = ("spans",)
+
+    def __init__(self):
+        self.spans: list[tuple[str, float]] = []
+
+    def add(self, name: str, ms: float):
+        self.spans.append((name, ms))
+
+    def totals(self) -> dict[str, float]:
+        out: dict[str, float] = {}
+        for name, ms in self.spans:
+            out[name] = out.get(name, 0.0) + ms
+        return {k: round(v, 2) for k, v in out.items()}
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.totals().items())
+
+
+def start_trace() -> tuple[Trace, contextvars.Token]:
+    trace = Trace()
+    return trace, _current_trace.set(trace)
+
+
+def end_trace(token: contextvars.Token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - start) * 1000.0
+        STAGE_LATENCY.observe(ms, {"stage": name})
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, ms)
+
+
+def observe_request(path: str, status: int, ms: float):
+    REQUEST_LATENCY.observe(ms, {"path": path, "status": str(status)})
+
+
+def observe_batch(model: str, size: int):
+    BATCH_SIZE.observe(float(size), {"model": model})
+
+
+def observe_tokens(model: str, tokens: int, padded: int, seconds: float):
+    MODEL_TOKENS.inc({"model": model, "kind": "real"}, tokens)
+    MODEL_TOKENS.inc({"model": model, "kind": "padded"}, padded)
+    MODEL_SECONDS.inc({"model": model}, seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc({"cache": cache, "result": "hit" if hit else "miss"})
+
+
+def record_admission(lane: str, result: str):
+    ADMISSION.inc({"lane": lane, "result": result})
+
+
+def record_singleflight(endpoint: str, coalesced: bool):
+    SINGLEFLIGHT.inc({"endpoint": endpoint, "role": "coalesced" if coalesced else "leader"})
+
+
+def record_event(name: str, amount: float = 1.0):
+    EVENTS.inc({"event": name}, amount)
+
+
+def event_counts(prefix: str = "") -> dict[str, float]:
+    with _lock:
+        series = dict(EVENTS._series)
+    return {dict(k)["event"]: v for k, v in series.items() if dict(k)["event"].startswith(prefix)}
+
+
+def render_prometheus() -> str:
+    lines: list[str] = []
+    for m in _METRICS:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
@@ -2,15 +2,23 @@ from __future__ import annotations
 
 import os
 import json
+import shutil
 import numpy as np
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
 
 from pypdf import PdfReader
 
 from utils.chunking_strategies import chunk_text
 from utils.embeddings import embed_texts
-from utils.vector_store import upsert_chunks, collection_exists
+from utils.vector_store import upsert_chunks, collection_exists, copy_collection
+from utils.lexical_index import invalidate as invalidate_lexical_index
+from utils.tracing import span
+from utils.ann import ANN_MIN_ROWS, build_index_for, invalidate as invalidate_ann
+from utils.naming import get_ann_path, get_all_related_paths, get_artifact_paths
+from utils.quantization import save_quantized
+from utils.artifacts import save_npy_atomic, invalidate as invalidate_artifacts
+from utils.filters import page_offsets, pages_for_spans
 
 
 def process_pdf_upload(
@@ -25,18 +33,26 @@ def process_pdf_upload(
     data_dir = Path(data_dir)
     chroma_dir = chroma_dir or str(data_dir / "chroma")
 
-    reader = PdfReader(str(file_path))
-    extracted_text = ""
-    for page in reader.pages:
-        extracted_text += page.extract_text() or ""
+    with span("extract_text"):
+        reader = PdfReader(str(file_path))
+        pages = [page.extract_text() or "" for page in reader.pages]
+        extracted_text = "".join(pages)
 
     text_path = data_dir / (file_path.stem + ".txt")
     text_path.parent.mkdir(parents=True, exist_ok=True)
-    text_path.write_text(extracted_text, encoding="utf-8")
-
-    raw_chunks = chunk_text(extracted_text, strategy=chunk_strategy, chunk_size=chunk_size)
-    created_at = datetime.utcnow().isoformat()
+    tmp_text = text_path.with_name(text_path.name + ".tmp")
+    tmp_text.write_text(extracted_text, encoding="utf-8")
+    os.replace(tmp_text, text_path)
+
+    with span("chunk_text"):
+        raw_chunks = chunk_text(extracted_text, strategy=chunk_strategy, chunk_size=chunk_size)
+    now = datetime.now(timezone.utc)
+    created_at = now.replace(tzinfo=None).isoformat()
+    created_ts = now.timestamp()
     pdf_name = file_path.name
+    first_pages, last_pages = pages_for_spans(
+        page_offsets(pages), [c[0] for c in raw_chunks], [c[1] for c in raw_chunks]
+    )
 
     chunk_data = []
     for index, (char_start, char_end, chunk_content, strategy_name) in enumerate(raw_chunks):
@@ -45,41 +61,119 @@ def process_pdf_upload(
             "filename": pdf_name,
             "source_path": str(file_path),
             "created_at": created_at,
+            "created_ts": created_ts,
             "char_start": char_start,
             "char_end": char_end,
+            "page_start": int(first_pages[index]),
+            "page_end": int(last_pages[index]),
             "content": chunk_content,
             "chunk_strategy": strategy_name,
         })
 
 
     texts = [c["content"] for c in chunk_data]
-    vectors = embed_texts(texts)
-
-    inserted_count = upsert_chunks(
-        pdf_name=pdf_name,
-        chunk_data=chunk_data,
-        vectors=vectors,
-        persist_dir=chroma_dir,
-    )
+    embed_stats: dict = {}
+    with span("embed_texts"):
+        vectors = embed_texts(texts, stats=embed_stats)
+
+    with span("upsert_chunks"):
+        inserted_count = upsert_chunks(
+            pdf_name=pdf_name,
+            chunk_data=chunk_data,
+            vectors=vectors,
+            persist_dir=chroma_dir,
+        )
+    invalidate_lexical_index(pdf_name, chroma_dir)
     dedup_skipped = len(chunk_data) - inserted_count
 
-    chunk_filename = file_path.stem + "_chunks.json"
-    chunk_path = data_dir / chunk_filename
-    with open(chunk_path, "w", encoding="utf-8") as f:
-        json.dump(chunk_data, f, indent=2)
+    with span("write_artifacts"):
+        chunk_filename = file_path.stem + "_chunks.json"
+        chunk_path = data_dir / chunk_filename
+        with open(chunk_path, "w", encoding="utf-8") as f:
+            json.dump(chunk_data, f, indent=2)
+
+        emb_filename = file_path.stem + "_embedding.npy"
+        emb_path = data_dir / emb_filename
+        save_npy_atomic(emb_path, vectors)
+        save_quantized(emb_path, vectors)
 
-    emb_filename = file_path.stem + "_embedding.npy"
-    emb_path = data_dir / emb_filename
-    np.save(str(emb_path), vectors)
+    if len(vectors) >= ANN_MIN_ROWS:
+        with span("build_ann_index"):
+            build_index_for(emb_path, get_ann_path(pdf_name, data_dir), vectors)
 
     return {
         "filename": pdf_name,
         "total_characters": len(extracted_text),
+        "total_pages": len(pages),
         "total_chunks_raw": len(chunk_data),
         "chunks_inserted_to_chroma": inserted_count,
         "chunks_dedup_skipped": dedup_skipped,
         "chunk_strategy": chunk_strategy,
         "embedding_dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0,
+        "embed_tokens_per_s": embed_stats.get("tokens_per_s"),
         "first_chunk_preview": chunk_data[0]["content"][:200] if chunk_data else "",
         "chroma_dir": chroma_dir,
     }
+
+
+def _link_or_copy(src: Path, dst: Path):
+    tmp = dst.with_name(dst.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copy2(src, tmp)
+    os.replace(tmp, dst)
+
+
+def link_existing_upload(
+    source_name: str,
+    file_path: str,
+    data_dir: str,
+    chroma_dir: str | None = None,
+) -> int:
+    """Reuse the artifacts of an identical, already-ingested PDF for a new filename.
+
+    The chunk JSON is rewritten with the new filename, the binary artifacts are
+    hard-linked (copied across filesystems) and the Chroma collection is copied
+    with its stored vectors, so nothing is re-extracted or re-embedded.
+    """
+    file_path = Path(file_path)
+    data_dir = Path(data_dir)
+    chroma_dir = chroma_dir or str(data_dir / "chroma")
+    pdf_name = file_path.name
+    if pdf_name == source_name:
+        return 0
+
+    src_paths = get_all_related_paths(source_name, data_dir)
+    dst_paths = get_all_related_paths(pdf_name, data_dir)
+    for src, dst in zip(src_paths, dst_paths):
+        if src.suffix.lower() == ".pdf":
+            continue
+        if not src.exists():
+            # A quantized copy or index left from an earlier upload under this name would be
+            # read against the newly linked embeddings, whose mtime is the source's (older) one.
+            dst.unlink(missing_ok=True)
+            continue
+        if src.name.endswith("_chunks.json"):
+            with open(src, "r", encoding="utf-8") as f:
+                chunk_data = json.load(f)
+            for chunk in chunk_data:
+                chunk["filename"] = pdf_name
+                chunk["source_path"] = str(file_path)
+            tmp = dst.with_name(dst.name + ".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(chunk_data, f, indent=2)
+            os.replace(tmp, dst)
+        else:
+            _link_or_copy(src, dst)
+
+    copied = 0
+    if collection_exists(source_name, chroma_dir):
+        copied = copy_collection(source_name, pdf_name, persist_dir=chroma_dir)
+    invalidate_artifacts(get_artifact_paths(pdf_name, data_dir)[0])
+    invalidate_ann(get_ann_path(pdf_name, data_dir))
+    invalidate_lexical_index(pdf_name, chroma_dir)
+    return copied
+
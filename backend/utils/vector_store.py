@@ -1,18 +1,158 @@
-import hashlib
+from __future__ import annotations
+
+import os
+import threading
+from abc import ABC, abstractmethod
 from pathlib import Path
 
-import chromadb
 import numpy as np
 
-_client: chromadb.ClientAPI | None = None
+from utils.tracing import record_cache
+
+VECTOR_BACKENDS = ("chroma", "numpy")
+VECTOR_BACKEND = os.getenv("SECRAG_VECTOR_BACKEND", "chroma").strip().lower()
+
+if VECTOR_BACKEND not in VECTOR_BACKENDS:
+    raise ValueError(f"SECRAG_VECTOR_BACKEND must be one of {VECTOR_BACKENDS}")
+
+
+class VectorStore(ABC):
+    """One collection per document. Distances are cosine distances (0 = identical)."""
+
+    @abstractmethod
+    def exists(self, name: str) -> bool:
+        ...
+
+    @abstractmethod
+    def count(self, name: str) -> int:
+        ...
+
+    @abstractmethod
+    def upsert(self, name: str, ids: list[str], vectors: np.ndarray, documents: list[str], metadatas: list[dict]):
+        ...
+
+    @abstractmethod
+    def query(self, name: str, vectors: np.ndarray, top_k: int, where: dict | None = None
+              ) -> list[list[tuple[str, float, str, dict]]]:
+        ...
+
+    @abstractmethod
+    def get_all(self, name: str, include_vectors: bool = False
+                ) -> tuple[list[str], list[str], list[dict], np.ndarray | None]:
+        ...
+
+    @abstractmethod
+    def delete(self, name: str):
+        ...
+
+    def close(self):
+        pass
 
 
-def _get_client(persist_dir: str = "./data/chroma") -> chromadb.Client:
-    global _client
-    if _client is None:
+class ChromaStore(VectorStore):
+    def __init__(self, persist_dir: str):
+        import chromadb
+
         Path(persist_dir).mkdir(parents=True, exist_ok=True)
-        _client = chromadb.PersistentClient(path=persist_dir)
-    return _client
+        self.client = chromadb.PersistentClient(path=persist_dir)
+
+    def collection(self, name: str):
+        return self.client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+    def exists(self, name: str) -> bool:
+        try:
+            self.client.get_collection(name)
+            return True
+        except Exception:
+            return False
+
+    def count(self, name: str) -> int:
+        return self.collection(name).count()
+
+    def upsert(self, name, ids, vectors, documents, metadatas):
+        self.collection(name).upsert(
+            ids=ids,
+            embeddings=np.asarray(vectors, dtype=np.float32),
+            documents=documents,
+            metadatas=metadatas,
+        )
+
+    def query(self, name, vectors, top_k, where=None):
+        collection = self.collection(name)
+        count = collection.count()
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if count == 0:
+            return [[] for _ in range(len(vectors))]
+        result = collection.query(
+            query_embeddings=vectors,
+            n_results=min(top_k, count),
+            where=where,
+            include=["documents", "metadatas", "distances"],
+        )
+        return [
+            list(zip(ids, (float(d) for d in dists), docs, metas))
+            for ids, dists, docs, metas in zip(
+                result["ids"], result["distances"], result["documents"], result["metadatas"]
+            )
+        ]
+
+    def get_all(self, name, include_vectors=False):
+        collection = self.collection(name)
+        if collection.count() == 0:
+            return [], [], [], None
+        include = ["documents", "metadatas"] + (["embeddings"] if include_vectors else [])
+        result = collection.get(include=include)
+        vectors = np.asarray(result["embeddings"], dtype=np.float32) if include_vectors else None
+        return result["ids"], result["documents"], result["metadatas"], vectors
+
+    def delete(self, name):
+        try:
+            self.client.delete_collection(name)
+        except Exception:
+            pass
+
+
+_stores: dict[tuple[str, str], VectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(persist_dir: str = "./data/chroma", backend: str | None = None) -> VectorStore:
+    backend = (backend or VECTOR_BACKEND).lower()
+    key = (backend, str(Path(persist_dir).resolve()))
+    store = _stores.get(key)
+    record_cache("vector_store", store is not None)
+    if store is not None:
+        return store
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            if backend == "chroma":
+                store = ChromaStore(persist_dir)
+            elif backend == "numpy":
+                from utils.numpy_store import NumpyStore
+                store = NumpyStore(Path(persist_dir) / "numpy")
+            else:
+                raise ValueError(f"Unknown vector backend '{backend}'. Choose from: {VECTOR_BACKENDS}")
+            _stores[key] = store
+        return store
+
+
+def reset_client():
+    """Drop every cached store and Chroma's per-path system cache.
+
+    Chroma keeps SQLite connections and background threads that must not
+    cross a fork, so pre-fork warm-up calls this before forking and each
+    worker calls it again before opening its own client.
+    """
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+    try:
+        from chromadb.api.client import SharedSystemClient
+        SharedSystemClient.clear_system_cache()
+    except Exception:
+        pass
 
 
 def _collection_name(pdf_name: str) -> str:
@@ -22,20 +162,11 @@ def _collection_name(pdf_name: str) -> str:
 
 
 def collection_exists(pdf_name: str, persist_dir: str = "./data/chroma") -> bool:
-    client = _get_client(persist_dir)
-    try:
-        client.get_collection(_collection_name(pdf_name))
-        return True
-    except Exception:
-        return False
+    return get_store(persist_dir).exists(_collection_name(pdf_name))
 
 
-def get_collection(pdf_name: str, persist_dir: str = "./data/chroma"):
-    client = _get_client(persist_dir)
-    return client.get_or_create_collection(
-        name=_collection_name(pdf_name),
-        metadata={"hnsw:space": "cosine"},
-    )
+def collection_count(pdf_name: str, persist_dir: str = "./data/chroma") -> int:
+    return get_store(persist_dir).count(_collection_name(pdf_name))
 
 
 def upsert_chunks(
@@ -45,17 +176,17 @@ def upsert_chunks(
     persist_dir: str = "./data/chroma",
 ):
 
-    collection = get_collection(pdf_name, persist_dir)
-
-    ids, embeddings, documents, metadatas = [], [], [], []
+    store = get_store(persist_dir)
+    name = _collection_name(pdf_name)
+    vectors = np.asarray(vectors, dtype=np.float32)
 
-    for idx, (chunk, vec) in enumerate(zip(chunk_data, vectors)):
-        if near_duplicate_exists_vec(collection, vec, threshold=0.95):
-            continue
+    similarity = _nearest_similarity(store, name, vectors)
+    keep = np.flatnonzero(similarity < 0.95)
 
-        chunk_id = str(chunk.get("chunk_id", idx))
-        ids.append(chunk_id)
-        embeddings.append(vec.tolist())
+    ids, documents, metadatas = [], [], []
+    for idx in keep:
+        chunk = chunk_data[int(idx)]
+        ids.append(str(chunk.get("chunk_id", int(idx))))
         documents.append(chunk.get("content", ""))
         metadatas.append({
             "filename": chunk.get("filename", pdf_name),
@@ -63,11 +194,14 @@ def upsert_chunks(
             "created_at": chunk.get("created_at", ""),
             "char_start": chunk.get("char_start", 0),
             "char_end": chunk.get("char_end", 0),
+            "page_start": chunk.get("page_start", 0),
+            "page_end": chunk.get("page_end", 0),
+            "created_ts": chunk.get("created_ts", 0.0),
             "chunk_strategy": chunk.get("chunk_strategy", "sentence"),
         })
 
     if ids:
-        collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        store.upsert(name, ids, vectors[keep], documents, metadatas)
 
     return len(ids)
 
@@ -77,41 +211,58 @@ def query_collection(
     query_vec: np.ndarray,
     top_k: int = 20,
     persist_dir: str = "./data/chroma",
+    where: dict | None = None,
 ) -> list[dict]:
+    return query_collection_batch(pdf_name, np.atleast_2d(query_vec), top_k, persist_dir, where)[0]
 
-    collection = get_collection(pdf_name, persist_dir)
-
-    count = collection.count()
-    if count == 0:
-        return []
-
-    k = min(top_k, count)
-    result = collection.query(
-        query_embeddings=[query_vec.tolist()],
-        n_results=k,
-        include=["documents", "metadatas", "distances"],
-    )
-
-    out = []
-    for i, (doc, meta, dist) in enumerate(zip(
-        result["documents"][0],
-        result["metadatas"][0],
-        result["distances"][0],
-    )):
-        score = float(1.0 - dist / 2.0)
-        out.append({
-            "score": score,
-            "chunk_id": result["ids"][0][i],
-            "filename": meta.get("filename", pdf_name),
-            "content": doc,
-            "metadata": {
-                "source_path": meta.get("source_path", ""),
-                "created_at": meta.get("created_at", ""),
-                "char_start": meta.get("char_start", 0),
-                "char_end": meta.get("char_end", 0),
-                "chunk_strategy": meta.get("chunk_strategy", "sentence"),
-            },
-        })
+
+def query_collection_batch(
+    pdf_name: str,
+    query_vecs: np.ndarray,
+    top_k: int = 20,
+    persist_dir: str = "./data/chroma",
+    where: dict | None = None,
+) -> list[list[dict]]:
+    hits = get_store(persist_dir).query(_collection_name(pdf_name), query_vecs, top_k, where=where)
+    return [
+        [_to_result(cid, doc, meta, pdf_name, float(1.0 - dist / 2.0)) for cid, dist, doc, meta in row]
+        for row in hits
+    ]
+
+
+def get_all_chunks(pdf_name: str, persist_dir: str = "./data/chroma") -> list[dict]:
+    ids, documents, metadatas, _ = get_store(persist_dir).get_all(_collection_name(pdf_name))
+    return [_to_result(cid, doc, meta, pdf_name, 0.0) for cid, doc, meta in zip(ids, documents, metadatas)]
+
+
+def _to_result(chunk_id, doc: str, meta: dict | None, pdf_name: str, score: float) -> dict:
+    meta = meta or {}
+    return {
+        "score": score,
+        "chunk_id": chunk_id,
+        "filename": meta.get("filename", pdf_name),
+        "content": doc,
+        "metadata": {
+            "source_path": meta.get("source_path", ""),
+            "created_at": meta.get("created_at", ""),
+            "char_start": meta.get("char_start", 0),
+            "char_end": meta.get("char_end", 0),
+            "page_start": meta.get("page_start", 0),
+            "page_end": meta.get("page_end", 0),
+            "created_ts": meta.get("created_ts", 0.0),
+            "chunk_strategy": meta.get("chunk_strategy", "sentence"),
+        },
+    }
+
+
+def _nearest_similarity(store: VectorStore, name: str, vectors: np.ndarray, batch_size: int = 512) -> np.ndarray:
+    out = np.full(len(vectors), -1.0, dtype=np.float32)
+    if len(vectors) == 0 or store.count(name) == 0:
+        return out
+    for start in range(0, len(vectors), batch_size):
+        for i, row in enumerate(store.query(name, vectors[start:start + batch_size], top_k=1), start):
+            if row:
+                out[i] = 1.0 - row[0][1] / 2.0
     return out
 
 
@@ -121,28 +272,25 @@ def near_duplicate_exists(
     threshold: float = 0.95,
     persist_dir: str = "./data/chroma",
 ) -> bool:
-    collection = get_collection(pdf_name, persist_dir)
-    return near_duplicate_exists_vec(collection, vector, threshold)
+    store = get_store(persist_dir)
+    return bool(_nearest_similarity(store, _collection_name(pdf_name), np.atleast_2d(vector))[0] >= threshold)
 
 
-def near_duplicate_exists_vec(collection, vector: np.ndarray, threshold: float = 0.95) -> bool:
-    if collection.count() == 0:
-        return False
-    result = collection.query(
-        query_embeddings=[vector.tolist()],
-        n_results=1,
-        include=["distances"],
-    )
-    if not result["distances"] or not result["distances"][0]:
-        return False
-    dist = result["distances"][0][0]
-    similarity = 1.0 - dist / 2.0
-    return similarity >= threshold
+def copy_collection(
+    src_pdf_name: str,
+    dst_pdf_name: str,
+    persist_dir: str = "./data/chroma",
+) -> int:
+    store = get_store(persist_dir)
+    ids, documents, metadatas, vectors = store.get_all(_collection_name(src_pdf_name), include_vectors=True)
+    # Replace, not merge: chunks left over from an earlier document under this name must not survive.
+    store.delete(_collection_name(dst_pdf_name))
+    if not ids:
+        return 0
+    metadatas = [{**(m or {}), "filename": dst_pdf_name} for m in metadatas]
+    store.upsert(_collection_name(dst_pdf_name), ids, vectors, documents, metadatas)
+    return len(ids)
 
 
 def delete_collection(pdf_name: str, persist_dir: str = "./data/chroma"):
-    client = _get_client(persist_dir)
-    try:
-        client.delete_collection(_collection_name(pdf_name))
-    except Exception:
-        pass
+    get_store(persist_dir).delete(_collection_name(pdf_name))